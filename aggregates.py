@@ -0,0 +1,131 @@
+# 州级聚合指标：机会指数、州KPI、地图数据和年度趋势（应用各标签页与JSON API共用）
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import PartitionSketches
+
+
+def state_aggregates(merged):
+    """按州聚合核心指标并计算机会指数
+
+    机会指数 = (州总出生数 / 最大州总出生数) * 州平均HPSA分数
+    """
+    # 先按州聚合核心指标
+    state_aggregated = merged.groupby('state').agg({
+        'total_births': 'sum',      # 计算每个州的总出生数
+        'gap_score': 'mean'         # 计算每个州的平均缺口分数
+    }).reset_index()
+
+    # 计算所有州的最大总出生数
+    max_births = state_aggregated['total_births'].max() if not state_aggregated['total_births'].empty else 1
+
+    # 用聚合后的指标重新计算州级机会指数
+    state_aggregated['opportunity_index'] = (state_aggregated['total_births'] / max_births) * state_aggregated['gap_score']
+    return state_aggregated
+
+
+def opportunity_ranking(merged, top_n=None):
+    """按机会指数从高到低排序的州列表，附带排名"""
+    ranking = state_aggregates(merged).sort_values('opportunity_index', ascending=False, kind='stable')
+    ranking.insert(0, 'rank', range(1, len(ranking) + 1))
+    if top_n is not None:
+        ranking = ranking.head(top_n)
+    return ranking.reset_index(drop=True)
+
+
+def state_kpis(merged):
+    """州级KPI：总出生数、平均缺口分数、平均产前检查次数、平均母亲年龄和覆盖年份数"""
+    agg_spec = {'total_births': 'sum', 'gap_score': 'mean'}
+    for col in ('prenatal_visits', 'mother_age'):
+        if col in merged.columns:
+            agg_spec[col] = 'mean'
+    kpis = merged.groupby('state').agg(agg_spec)
+    if 'year' in merged.columns:
+        kpis['years_covered'] = merged.groupby('state')['year'].nunique()
+    return kpis.reset_index()
+
+
+def choropleth_data(merged, metric_col='gap_score'):
+    """地图数据：每个州一条记录（指标均值、总出生数、平均缺口分数）"""
+    return merged.groupby('state').agg({
+        metric_col: 'mean',
+        'total_births': 'sum',
+        'gap_score': 'mean'
+    }).reset_index()
+
+
+def trend_series(merged):
+    """年度趋势：每年的总出生数、平均产前检查次数和平均缺口分数"""
+    # 过滤年份为0或空的值
+    trend_df = merged[(merged['year'] > 0) & (merged['year'] < 3000)]
+    agg_spec = {'total_births': 'sum', 'gap_score': 'mean'}
+    if 'prenatal_visits' in merged.columns:
+        agg_spec['prenatal_visits'] = 'mean'
+    return trend_df.groupby('year').agg(agg_spec).reset_index()
+
+
+def filter_selection(merged, states=None, years=None):
+    """按州和年份过滤（参数为空时不过滤）"""
+    if states:
+        merged = merged[merged['state'].isin(states)]
+    if years:
+        merged = merged[merged['year'].isin(years)]
+    return merged
+
+
+def top_share_mask(values, share=0.2, max_count=None):
+    """机会指数前share比例的掩码：不低于精确的(1-share)分位数（与pandas quantile一致）的值
+
+    参数:
+    values: 每个地区一个值（缺失值不入选）
+    share: 入选比例
+    max_count: 入选个数上限，超过时只保留值最高的max_count个
+
+    返回:
+    布尔数组
+    """
+    values = pd.Series(values, dtype='float64').reset_index(drop=True)
+    mask = (values >= values.quantile(1 - share)).to_numpy()
+    if max_count is not None and mask.sum() > max_count:
+        mask = np.zeros(len(values), dtype=bool)
+        mask[values.nlargest(max_count).index] = True
+    return mask
+
+
+def percentile_ranks(population, values):
+    """值在population中的精确百分位排名（0-1，不大于该值的比例，缺失值不计入）"""
+    population = np.sort(pd.Series(population, dtype='float64').dropna().to_numpy())
+    if len(population) == 0:
+        return np.full(len(values), np.nan)
+    return np.searchsorted(population, np.asarray(values, dtype='float64'), side='right') / len(population)
+
+
+def county_aggregates(county_merged):
+    """按县聚合核心指标并计算县级机会指数（公式与州级相同，出生数缺失时机会指数为NaN）"""
+    grouped = county_merged.groupby('county_fips')
+    county_aggregated = grouped.agg({
+        'state': 'first',
+        'gap_score': 'mean',
+        'active_designations': 'mean',
+    })
+    # 全部缺失时保留NaN（CDC数据没有县代码）
+    county_aggregated.insert(1, 'total_births', grouped['total_births'].sum(min_count=1))
+    county_aggregated = county_aggregated.reset_index()
+    max_births = county_aggregated['total_births'].max()
+    county_aggregated['opportunity_index'] = (county_aggregated['total_births'] / max_births) * county_aggregated['gap_score']
+    return county_aggregated
+
+
+def county_year_sketches(county_merged):
+    """县×年份机会指数的分区分位数摘要（按州×年份分区）；CDC数据没有县出生数时返回None
+
+    摘要记录 出生数 × 缺口分数，并记录每个分区的最大出生数；合并所选分区后除以其中的最大出生数，
+    即为县×年份机会指数（公式与州级相同）的分位数。
+    """
+    if county_merged.empty or county_merged['total_births'].isna().all():
+        return None
+    weighted = county_merged[['state', 'year', 'total_births']].assign(
+        weighted_births=county_merged['total_births'] * county_merged['gap_score']
+    )
+    return PartitionSketches(weighted, 'weighted_births', max_col='total_births')
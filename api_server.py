@@ -0,0 +1,272 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from aggregates import (
+    choropleth_data,
+    filter_selection,
+    opportunity_ranking,
+    state_kpis,
+    trend_series,
+)
+
+# 本地JSON聚合API：与Streamlit应用同进程运行，提供州级聚合、机会指数、地图数据和趋势
+#
+# 响应带ETag，客户端携带If-None-Match轮询时数据未变化直接返回304；
+# 支持gzip压缩。仅绑定本机地址，供嵌入和内部集成使用。
+
+API_HOST = os.environ.get('FEMTECH_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('FEMTECH_API_PORT', '8502'))
+API_ENABLED = os.environ.get('FEMTECH_API_ENABLED', '1') != '0'
+
+# 小于该字节数的响应不压缩
+GZIP_MIN_BYTES = 512
+# 每个数据集版本缓存的响应数量上限
+RESPONSE_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_current = None  # (version, merged_data)
+_responses = OrderedDict()  # etag -> (body, gzipped_body)
+_server = None
+
+
+def publish(version, merged, replace=True):
+    """发布当前数据集版本（整体替换，读取方不会看到部分更新的数据）
+
+    参数:
+    replace: 为False时只在尚未发布任何数据集时发布，不替换已发布的版本
+
+    返回:
+    该版本是否为当前发布的版本
+    """
+    global _current
+    with _lock:
+        if _current is not None and _current[0] == version:
+            return True
+        if _current is not None and not replace:
+            return False
+        _current = (version, merged)
+        _responses.clear()
+        return True
+
+
+def current_version():
+    """返回当前发布的数据集版本，未发布时返回None"""
+    current = _current
+    return current[0] if current is not None else None
+
+
+def _split_param(params, name):
+    """解析逗号分隔的查询参数"""
+    values = []
+    for raw in params.get(name, []):
+        values.extend(value.strip() for value in raw.split(',') if value.strip())
+    return values
+
+
+def _selection(merged, params):
+    """按查询参数 states / years 过滤"""
+    states = [state.upper() for state in _split_param(params, 'states')]
+    years = []
+    for value in _split_param(params, 'years'):
+        try:
+            years.append(float(value))
+        except ValueError:
+            raise ValueError(f"invalid year: {value}")
+    return filter_selection(merged, states, years)
+
+
+def _state_aggregates(merged, params):
+    return state_kpis(_selection(merged, params))
+
+
+def _opportunity(merged, params):
+    top_n = params.get('top', [None])[0]
+    return opportunity_ranking(_selection(merged, params), int(top_n) if top_n else None)
+
+
+def _choropleth(merged, params):
+    metric = params.get('metric', ['gap_score'])[0]
+    selected = _selection(merged, params)
+    if metric not in selected.columns:
+        raise ValueError(f"unknown metric: {metric}")
+    # 只接受数值列（文本列无法求均值）
+    if not pd.api.types.is_numeric_dtype(selected[metric]):
+        raise ValueError(f"metric is not numeric: {metric}")
+    return choropleth_data(selected, metric)
+
+
+def _trends(merged, params):
+    return trend_series(_selection(merged, params))
+
+
+# 路由：路径 -> 构建DataFrame的函数
+ROUTES = {
+    '/api/v1/state-aggregates': _state_aggregates,
+    '/api/v1/opportunity': _opportunity,
+    '/api/v1/choropleth': _choropleth,
+    '/api/v1/trends': _trends,
+}
+
+
+def _etag(version, path, params):
+    """根据数据集版本、路径和规范化后的查询参数计算ETag（无需生成响应体）"""
+    canonical = json.dumps([version, path, sorted((k, sorted(v)) for k, v in params.items())])
+    return 'W/"' + hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:24] + '"'
+
+
+def _etag_matches(header, etag):
+    """判断If-None-Match是否匹配（支持多个值和*）"""
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or etag in candidates or etag.replace('W/', '', 1) in candidates
+
+
+def render(path, params):
+    """生成响应，返回 (状态码, etag, body, gzipped_body)"""
+    current = _current
+    if path == '/api/v1/health':
+        body = json.dumps({'status': 'ok', 'version': current_version()}).encode('utf-8')
+        return 200, None, body, None
+    if path not in ROUTES:
+        return 404, None, json.dumps({'error': 'not found', 'routes': sorted(ROUTES)}).encode('utf-8'), None
+    if current is None:
+        return 503, None, json.dumps({'error': 'no dataset loaded'}).encode('utf-8'), None
+
+    version, merged = current
+    etag = _etag(version, path, params)
+    with _lock:
+        cached = _responses.get(etag)
+        if cached is not None:
+            _responses.move_to_end(etag)
+            return 200, etag, cached[0], cached[1]
+
+    try:
+        frame = ROUTES[path](merged, params)
+    except (ValueError, KeyError) as e:
+        return 400, None, json.dumps({'error': str(e)}).encode('utf-8'), None
+
+    # to_json会把NaN转换为null
+    body = ('{"version": %s, "rows": %d, "data": %s}' % (
+        json.dumps(version), len(frame), frame.to_json(orient='records')
+    )).encode('utf-8')
+    gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+
+    with _lock:
+        # 数据集版本在构建期间被替换时不写入缓存
+        if _current is current:
+            _responses[etag] = (body, gzipped)
+            while len(_responses) > RESPONSE_CACHE_SIZE:
+                _responses.popitem(last=False)
+    return 200, etag, body, gzipped
+
+
+class AggregatesHandler(BaseHTTPRequestHandler):
+    """聚合API请求处理"""
+
+    server_version = 'FemTechBI-API/1.0'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        path = url.path.rstrip('/') or '/'
+
+        # 数据未变化时直接返回304，不生成响应体
+        current = _current
+        if current is not None and path in ROUTES:
+            etag = _etag(current[0], path, params)
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self._send_common_headers()
+                self.end_headers()
+                return
+
+        status, etag, body, gzipped = render(path, params)
+        use_gzip = gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', '')
+        payload = gzipped if use_gzip else body
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        if etag:
+            self.send_header('ETag', etag)
+        self._send_common_headers()
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_common_headers(self):
+        # no-cache：允许缓存，但每次使用前必须用ETag重新验证
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+
+    def log_message(self, format, *args):
+        # 不在控制台输出每个请求的访问日志
+        pass
+
+
+def start_in_background(host=API_HOST, port=API_PORT):
+    """在后台线程启动API服务（每个进程只启动一次）；端口被占用时返回None"""
+    global _server
+    with _lock:
+        if _server is not None:
+            # 之前启动失败时记为False，避免每次重跑都重试绑定端口
+            return _server or None
+        try:
+            _server = ThreadingHTTPServer((host, port), AggregatesHandler)
+        except OSError:
+            _server = False
+            return None
+    thread = threading.Thread(target=_server.serve_forever, name='femtech-api', daemon=True)
+    thread.start()
+    return _server
+
+
+def main():
+    """独立运行：加载CDC/HRSA文件、关联后提供API（不启动Streamlit）"""
+    from data_pipeline import (
+        clean_and_map_cdc_data,
+        clean_and_map_hrsa_data,
+        content_hash,
+        file_type_for,
+        load_data,
+        merge_data,
+    )
+
+    parser = argparse.ArgumentParser(description="Serve FemTech BI aggregates as JSON")
+    parser.add_argument('--cdc', required=True, help="CDC data file (CSV or Excel)")
+    parser.add_argument('--hrsa', required=True, help="HRSA data file (CSV or Excel)")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    hashes = []
+    mapped = []
+    for path, dataset, clean_and_map in (
+        (args.cdc, 'cdc', clean_and_map_cdc_data),
+        (args.hrsa, 'hrsa', clean_and_map_hrsa_data),
+    ):
+        with open(path, 'rb') as f:
+            hashes.append(content_hash(f))
+            mapped.append(clean_and_map(load_data(f, file_type_for(path), dataset=dataset)))
+
+    publish(hashlib.sha1('|'.join(hashes).encode('utf-8')).hexdigest()[:16], merge_data(*mapped))
+    server = ThreadingHTTPServer((args.host, args.port), AggregatesHandler)
+    print(f"Serving aggregates API on http://{args.host}:{args.port}/api/v1/")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
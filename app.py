@@ -1,9 +1,14 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import base64
-import numpy as np
+import io
+import os
+import time
+import uuid
+import memory_report
+from lazy_imports import lazy_import
+
+# 本次重跑的内存统计起点（FEMTECH_TRACE_MEMORY=1 时记录峰值）
+rerun_memory_start = memory_report.start_rerun()
 
 # 页面配置
 st.set_page_config(
@@ -21,155 +26,6 @@ if 'form_completed' not in st.session_state:
 if 'page' not in st.session_state:
     st.session_state.page = 'Home'
 
-# 数据加载函数支持CSV/Excel文件上传
-@st.cache_data
-def load_data(uploaded_file, file_type):
-    try:
-        if file_type == 'csv':
-            # 尝试不同的编码格式读取CSV文件
-            encodings = ['utf-8', 'latin1', 'gbk', 'gb2312']
-            for encoding in encodings:
-                try:
-                    return pd.read_csv(uploaded_file, encoding=encoding)
-                except UnicodeDecodeError:
-                    uploaded_file.seek(0)  # 重置文件指针
-                    continue
-            # 如果所有编码都失败，使用errors='replace'
-            uploaded_file.seek(0)  # 重置文件指针
-            return pd.read_csv(uploaded_file, encoding='utf-8', errors='replace')
-        elif file_type == 'excel':
-            return pd.read_excel(uploaded_file)
-        else:
-            return pd.DataFrame()
-    except Exception as e:
-        st.sidebar.warning(f"⚠️ Error loading file: {e}")
-        return pd.DataFrame()
-
-# 州名映射字典：全称 -> 简称（仅深南部6州）
-STATE_MAPPING = {
-    'Alabama': 'AL',
-    'Florida': 'FL',
-    'Georgia': 'GA',
-    'Louisiana': 'LA',
-    'Mississippi': 'MS',
-    'South Carolina': 'SC'
-}
-
-# 标准化州名函数
-def standardize_state_name(state_name):
-    """将州名标准化为简称"""
-    if pd.isna(state_name):
-        return state_name
-    
-    # 转换为字符串并去除空格
-    state_str = str(state_name).strip()
-    
-    # 如果已经是简称（2个字符），直接返回
-    if len(state_str) == 2 and state_str.isalpha():
-        return state_str.upper()
-    
-    # 尝试从全称映射到简称
-    for full_name, abbreviation in STATE_MAPPING.items():
-        if full_name.lower() == state_str.lower():
-            return abbreviation
-    
-    # 如果无法映射，返回原始值
-    return state_str
-
-# 辅助函数：将值转换为数值类型
-def to_numeric(value):
-    """将字符串或其他类型的值转换为数值类型"""
-    if pd.isna(value):
-        return np.nan
-    
-    try:
-        # 转换为字符串
-        str_val = str(value)
-        # 去除千分位逗号
-        str_val = str_val.replace(',', '')
-        # 转换为浮点数
-        return float(str_val)
-    except (ValueError, TypeError):
-        # 如果转换失败，返回np.nan
-        return np.nan
-
-# 数据清理与字段映射函数
-def clean_and_map_cdc_data(df):
-    """清理并映射CDC数据字段"""
-    if df.empty:
-        return df
-    
-    # 创建映射后的DataFrame
-    mapped_df = pd.DataFrame()
-    
-    # 标准化列名（转为小写并去除空格）
-    df.columns = df.columns.str.lower().str.strip()
-    
-    # 映射Births字段
-    birth_cols = [col for col in df.columns if 'birth' in col and not 'rate' in col]
-    if birth_cols:
-        # 应用数值转换，处理千分位逗号
-        mapped_df['total_births'] = df[birth_cols[0]].apply(to_numeric)
-    
-    # 映射Prenatal Visits字段
-    prenatal_cols = [col for col in df.columns if 'prenatal' in col or 'visit' in col]
-    if prenatal_cols:
-        # 应用数值转换
-        mapped_df['prenatal_visits'] = df[prenatal_cols[0]].apply(to_numeric)
-    
-    # 映射State字段
-    state_cols = [col for col in df.columns if 'state' in col]
-    if state_cols:
-        # 标准化州名为简称
-        mapped_df['state'] = df[state_cols[0]].apply(standardize_state_name)
-    
-    # 映射Year字段
-    year_cols = [col for col in df.columns if 'year' in col]
-    if year_cols:
-        # 应用数值转换
-        mapped_df['year'] = df[year_cols[0]].apply(to_numeric)
-    
-    # 映射母亲年龄字段
-    age_cols = [col for col in df.columns if 'age' in col and 'mother' in col]
-    if not age_cols:
-        # 尝试更广泛的匹配
-        age_cols = [col for col in df.columns if 'age' in col]
-    if age_cols:
-        # 应用数值转换
-        mapped_df['mother_age'] = df[age_cols[0]].apply(to_numeric)
-    
-    # 映射Race字段
-    race_cols = [col for col in df.columns if 'race' in col]
-    if race_cols:
-        mapped_df['race'] = df[race_cols[0]]
-    
-    return mapped_df
-
-def clean_and_map_hrsa_data(df):
-    """清理并映射HRSA数据字段"""
-    if df.empty:
-        return df
-    
-    # 创建映射后的DataFrame
-    mapped_df = pd.DataFrame()
-    
-    # 标准化列名（转为小写并去除空格）
-    df.columns = df.columns.str.lower().str.strip()
-    
-    # 映射HPSA Score字段
-    hpsa_cols = [col for col in df.columns if 'hpsa' in col and 'score' in col]
-    if hpsa_cols:
-        # 应用数值转换，处理混合数据类型
-        mapped_df['gap_score'] = df[hpsa_cols[0]].apply(to_numeric)
-    
-    # 映射State字段
-    state_cols = [col for col in df.columns if 'state' in col]
-    if state_cols:
-        # 标准化州名为简称
-        mapped_df['state'] = df[state_cols[0]].apply(standardize_state_name)
-    
-    return mapped_df
-
 # 侧边栏添加数据上传功能
 with st.sidebar.expander("📁 Upload Data", expanded=True):
     st.markdown("Upload CSV or Excel files for custom data analysis")
@@ -180,48 +36,237 @@ with st.sidebar.expander("📁 Upload Data", expanded=True):
     cdc_file = st.file_uploader("Upload CDC Data File", type=["csv", "xlsx", "xls"])
     hrsa_file = st.file_uploader("Upload HRSA Data File", type=["csv", "xlsx", "xls"])
 
+# 首屏（页面配置和上传控件）发送到浏览器之后再导入数据处理依赖，
+# 冷启动时pandas等的导入不再让页面保持空白；图表库和只在部分标签页使用的模块第一次使用时才加载
+import pandas as pd  # noqa: E402
+import numpy as np  # noqa: E402
+import api_server  # noqa: E402
+from aggregates import (  # noqa: E402
+    choropleth_data,
+    county_aggregates,
+    county_year_sketches,
+    percentile_ranks,
+    state_aggregates,
+    top_share_mask,
+)
+from data_pipeline import (  # noqa: E402
+    DATASET_FIELDS,
+    MAPPING_RULES_VERSION,
+    clean_and_map_cdc_data,
+    clean_and_map_hrsa_data,
+    content_hash,
+    file_type_for,
+    load_data,
+    merge_county_data,
+    merge_data,
+)
+from data_quality import profile_dataset  # noqa: E402
+from data_watcher import start_watcher  # noqa: E402
+from dataset_cache import shared_cache, version_id  # noqa: E402
+from disparities import RATIO_METRICS, build_disparity_cube, default_reference, disparity_index, disparity_table  # noqa: E402
+from mapping_profiles import (  # noqa: E402
+    delete_profile,
+    get_profile,
+    header_signature,
+    profile_revision,
+    save_profile,
+)
+from partitions import PartitionIndex, sort_into_partitions, where_view  # noqa: E402
+from plot_decimation import decimate_points  # noqa: E402
+from quantile_sketch import RELATIVE_ACCURACY  # noqa: E402
+from regions import STATE_NAMES, region_names, region_states  # noqa: E402
+from snapshots import diff_snapshots, snapshot_store  # noqa: E402
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
+trends = lazy_import('trends')
+data_explorer = lazy_import('data_explorer')
+county_geo = lazy_import('county_geo')
+
+# 计算上传文件的内容指纹（按会话记录，避免每次重跑重新哈希大文件）
+def file_fingerprint(uploaded_file):
+    """返回上传文件内容的SHA-256哈希"""
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is None:
+        return content_hash(uploaded_file)
+    fingerprints = st.session_state.setdefault('file_fingerprints', {})
+    if file_id not in fingerprints:
+        fingerprints[file_id] = content_hash(uploaded_file)
+    return fingerprints[file_id]
+
+# 加载并映射数据集：同一文件内容 + 该表头的映射修订号在进程内只构建一次，各会话共享
+def load_mapped_dataset(uploaded_file, dataset):
+    """返回 (共享缓存键, 映射后的数据集视图)；加载失败时返回 (None, 空DataFrame)
+
+    修订号按表头签名计：固定/取消固定某个表头的映射只使该表头的文件重新加载。
+    表头签名在首次加载后按文件指纹记录在会话中，之后的重跑无需重新读取表头。
+    """
+    file_type = file_type_for(uploaded_file.name)
+    fingerprint = file_fingerprint(uploaded_file)
+    signatures = st.session_state.setdefault('mapping_signatures', {})
+    clean_and_map = clean_and_map_cdc_data if dataset == 'cdc' else clean_and_map_hrsa_data
+
+    def build():
+        return clean_and_map(load_data(uploaded_file, file_type, dataset=dataset))
+
+    try:
+        cache_key = ('mapped', dataset, fingerprint, profile_revision(signatures.get((fingerprint, dataset))))
+        mapped = shared_cache.get_or_build(cache_key, build)
+        # 首次加载时还不知道表头签名：按加载结果记录的修订号重新确定缓存键
+        current = profile_revision(mapped.attrs.get('mapping_signature'))
+        if cache_key[3] != current:
+            loaded = mapped
+            cache_key = ('mapped', dataset, fingerprint, current)
+            mapped = shared_cache.get_or_build(
+                cache_key, lambda: loaded if loaded.attrs.get('mapping_revision') == current else build()
+            )
+        signatures[(fingerprint, dataset)] = mapped.attrs.get('mapping_signature')
+    except Exception as e:
+        st.sidebar.warning(f"⚠️ Error loading file: {e}")
+        return None, pd.DataFrame()
+    return cache_key, mapped
+
 # 加载数据
-cdc_data = pd.DataFrame()
-hrsa_data = pd.DataFrame()
 merged_data = pd.DataFrame()
 mapped_cdc = pd.DataFrame()
 mapped_hrsa = pd.DataFrame()
+cdc_key = None
+hrsa_key = None
 
 # 加载CDC数据
 if cdc_file:
-    cdc_file_type = 'csv' if cdc_file.name.endswith('.csv') else 'excel'
-    cdc_data = load_data(cdc_file, cdc_file_type)
+    cdc_key, mapped_cdc = load_mapped_dataset(cdc_file, 'cdc')
 
 # 加载HRSA数据
 if hrsa_file:
-    hrsa_file_type = 'csv' if hrsa_file.name.endswith('.csv') else 'excel'
-    hrsa_data = load_data(hrsa_file, hrsa_file_type)
+    hrsa_key, mapped_hrsa = load_mapped_dataset(hrsa_file, 'hrsa')
+
+# 生产模式：配置了FEMTECH_DATA_DIR时由后台线程监听数据目录并构建数据集，
+# 未上传文件的会话直接使用当前已构建完成的版本（重建期间继续使用上一版本，不阻塞）
+data_watcher = start_watcher()
+watched_version = None
+if data_watcher is not None and not cdc_file and not hrsa_file:
+    watched_version = data_watcher.current
+    if watched_version is not None:
+        mapped_cdc = watched_version.mapped_cdc.copy(deep=False)
+        mapped_hrsa = watched_version.mapped_hrsa.copy(deep=False)
+
+if data_watcher is not None:
+    with st.sidebar.expander("📂 Auto-loaded Data", expanded=False):
+        watcher_status = data_watcher.status()
+        st.write(f"Watching: `{watcher_status['data_dir']}`")
+        if watcher_status['version']:
+            built_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(watcher_status['built_at']))
+            st.write(f"Dataset version `{watcher_status['version']}` (built {built_at})")
+            for dataset, path in watcher_status['sources'].items():
+                st.write(f"- {dataset.upper()}: {path}")
+        else:
+            st.info("ℹ️ No auto-loaded dataset available yet.")
+        if watcher_status['building']:
+            st.write("🔄 Rebuilding from changed files…")
+        if watcher_status['last_error']:
+            st.warning(f"⚠️ {watcher_status['last_error']}")
+        if cdc_file or hrsa_file:
+            st.caption("Uploaded files take precedence over auto-loaded data in this session.")
+
+# 分区索引：映射后的数据按 州 × 年份 分区存放，索引每个数据集构建一次，所有会话共享
+# （索引引用映射后的数据集，与上传数据集的缓存条目关联，随其一起淘汰）
+def load_partition_index(source_key, dataset, df, parent=None):
+    """返回数据集的分区索引；数据为空时返回None"""
+    if df.empty:
+        return None
+    return shared_cache.get_or_build(('partitions', source_key, dataset), lambda: PartitionIndex(df), parent=parent)
+
+cdc_partitions = load_partition_index(cdc_key or getattr(watched_version, 'version', None), 'cdc', mapped_cdc, cdc_key)
+hrsa_partitions = load_partition_index(hrsa_key or getattr(watched_version, 'version', None), 'hrsa', mapped_hrsa, hrsa_key)
+
+# 字段映射面板：显示当前映射，并允许固定或覆盖
+def render_mapping_panel(label, df, dataset):
+    """显示数据集的字段映射，用户可覆盖并固定到映射档案中"""
+    source_columns = df.attrs.get('source_columns')
+    if not source_columns:
+        return
+    
+    signature = header_signature(source_columns, dataset)
+    profile = get_profile(signature)
+    pinned = bool(profile and profile.get('pinned'))
+    current = df.attrs.get('field_map', {})
+    
+    st.markdown(f"**{label}** – {'📌 pinned mapping' if pinned else 'auto-detected mapping'}")
+    
+    # 每个标准字段一个下拉框，默认选中当前映射的原始列
+    none_option = "— not mapped —"
+    options = [none_option] + list(source_columns)
+    overrides = {}
+    for field in DATASET_FIELDS[dataset]:
+        default = str(current[field]) if field in current else none_option
+        choice = st.selectbox(
+            field,
+            options=options,
+            index=options.index(default) if default in options else 0,
+            key=f"mapping_{dataset}_{signature[:8]}_{field}"
+        )
+        if choice != none_option:
+            overrides[field] = choice
+    
+    pin_col, reset_col = st.columns(2)
+    if pin_col.button("📌 Pin mapping", key=f"pin_{dataset}"):
+        save_profile(signature, dataset, source_columns, overrides, pinned=True, rules_version=MAPPING_RULES_VERSION)
+        st.rerun()
+    if pinned and reset_col.button("↺ Reset", key=f"reset_{dataset}"):
+        delete_profile(signature)
+        st.rerun()
+
+if not mapped_cdc.empty or not mapped_hrsa.empty:
+    with st.sidebar.expander("🧭 Field Mapping", expanded=False):
+        st.markdown("*Mappings are remembered per file header. Pin a mapping to override auto-detection.*")
+        if not mapped_cdc.empty:
+            render_mapping_panel("CDC", mapped_cdc, 'cdc')
+        if not mapped_hrsa.empty:
+            render_mapping_panel("HRSA", mapped_hrsa, 'hrsa')
 
-# 清理并映射数据
-mapped_cdc = clean_and_map_cdc_data(cdc_data)
-mapped_hrsa = clean_and_map_hrsa_data(hrsa_data)
+# 数据质量报告：按文件内容指纹（自动加载时按数据集版本）缓存，只在数据变化时重新计算
+def render_quality_report(label, df, dataset, source_key):
+    """显示数据集的质量报告"""
+    report = shared_cache.get_or_build(('quality', source_key, dataset), lambda: profile_dataset(df, dataset))
+    st.markdown(f"**{label}** – {report['rows']:,} rows")
+    table = report['columns'].set_index('field')
+    for col in ('null_rate', 'unparsable_rate'):
+        table[col] = table[col].map('{:.1%}'.format)
+    st.dataframe(table)
+    if not report['unknown_states'].empty:
+        unknown = ", ".join(f"{state} ({count:,})" for state, count in report['unknown_states'].head(10).items())
+        st.warning(f"⚠️ Unrecognized states: {unknown}")
+    if report['duplicate_rows']:
+        st.warning(f"⚠️ {report['duplicate_rows']:,} duplicate rows on {' × '.join(report['duplicate_key'])}")
+
+if not mapped_cdc.empty or not mapped_hrsa.empty:
+    with st.sidebar.expander("🩺 Data Quality", expanded=False):
+        st.caption("Unparsable values are counted as nulls; outliers lie more than 3 IQR outside the quartiles.")
+        if not mapped_cdc.empty:
+            render_quality_report("CDC", mapped_cdc, 'cdc', cdc_key or watched_version.version)
+        if not mapped_hrsa.empty:
+            render_quality_report("HRSA", mapped_hrsa, 'hrsa', hrsa_key or watched_version.version)
 
 # 侧边栏添加过滤器
 with st.sidebar.expander("🔍 Filters", expanded=True):
-    # 深南部6州过滤器
-    st.markdown("**Deep South States Filter**")
+    # 地区和州过滤器：先选命名地区，再在地区内选州
+    st.markdown("**Region & States Filter**")
+    selected_region = st.selectbox("Region", region_names(), key="region")
+    region_state_codes = region_states(selected_region)
     selected_states = st.multiselect(
         "Select states to analyze",
-        options=["AL", "FL", "GA", "LA", "MS", "SC"],
-        default=["AL", "FL", "GA", "LA", "MS", "SC"]
+        options=list(region_state_codes),
+        default=list(region_state_codes),
+        format_func=lambda state: f"{state} – {STATE_NAMES.get(state, state)}",
+        key=f"states_{selected_region}"
     )
+    # 未选择任何州时分析整个地区
+    selected_states = selected_states or list(region_state_codes)
 
     # 年份筛选框
     st.markdown("\n**Year Filter**")
-    # 从映射后的CDC数据中获取年份
-    years = []
-    if not mapped_cdc.empty and 'year' in mapped_cdc.columns:
-        # 确保year列是数值类型
-        mapped_cdc['year'] = pd.to_numeric(mapped_cdc['year'], errors='coerce')
-        # 去重并排序
-        years = sorted(mapped_cdc['year'].dropna().unique())
-        # 过滤掉非数值
-        years = [int(year) for year in years if isinstance(year, (int, float)) and not np.isnan(year)]
+    # 从CDC数据的分区键获取地区内的年份（不扫描数据行）
+    years = cdc_partitions.years(region_state_codes) if cdc_partitions is not None else []
     
     if years:
         selected_years = st.multiselect(
@@ -235,51 +280,9 @@ with st.sidebar.expander("🔍 Filters", expanded=True):
 
 
 
-# 执行数据关联
-def merge_data(cdc_df, hrsa_df):
-    """关联CDC和HRSA数据"""
-    if cdc_df.empty or hrsa_df.empty:
-        return pd.DataFrame()
-    
-    # 确定连接键
-    has_state = 'state' in cdc_df.columns and 'state' in hrsa_df.columns
-    
-    if has_state:
-        # 先聚合，再合并（避免笛卡尔积）
-        # 1. 对CDC数据按州和年份聚合（保留年份维度）
-        # 聚合所有必要的列
-        cdc_agg = cdc_df.groupby(['state', 'year']).agg({
-            'total_births': 'sum',  # 总出生数
-            'prenatal_visits': 'mean',  # 平均产前检查次数
-            'mother_age': 'mean'  # 平均母亲年龄
-        }).reset_index()
-        
-        # 2. 对HRSA数据按州聚合（计算州级平均缺口分数）
-        hrsa_agg = hrsa_df.groupby('state').agg({
-            'gap_score': 'mean'  # 或'max'/'sum'，根据业务需求选择
-        }).reset_index()
-        
-        # 3. 再按州合并
-        merged = pd.merge(
-            cdc_agg, 
-            hrsa_agg, 
-            on=['state'], 
-            how='left'
-        )
-    else:
-        # 没有共同的连接键，返回空数据框
-        st.sidebar.warning("⚠️ No common merge keys found. Please ensure both files have State columns.")
-        return pd.DataFrame()
-    
-    # 填充缺失值：如果某个州在CDC有数据但在HRSA没数据，HPSA Score设为0
-    if 'gap_score' in merged.columns:
-        merged['gap_score'] = merged['gap_score'].fillna(0)
-    
-    return merged
-
 # 新增：地图绘制辅助函数
 def create_state_choropleth(df, metric_col='gap_score', title="Healthcare Gap Score by State"):
-    """创建Deep South 6州的交互式分级着色地图
+    """创建所选地区各州的交互式分级着色地图
     
     参数:
     df: 合并后的数据集 (merged_data)
@@ -290,11 +293,7 @@ def create_state_choropleth(df, metric_col='gap_score', title="Healthcare Gap Sc
         return None
     
     # 1. 聚合州级数据（确保每个州只有一条记录）
-    state_map_data = df.groupby('state').agg({
-        metric_col: 'mean',
-        'total_births': 'sum',
-        'gap_score': 'mean'
-    }).reset_index()
+    state_map_data = choropleth_data(df, metric_col)
     
     # 2. 绘制美国州级地图（使用Plotly内置数据）
     fig = px.choropleth(
@@ -324,7 +323,7 @@ def create_state_choropleth(df, metric_col='gap_score', title="Healthcare Gap Sc
         margin={"r":0,"t":50,"l":0,"b":0},
     )
     
-    # 5. 只显示Deep South 6州（聚焦目标区域）
+    # 5. 只显示数据中的州（聚焦所选地区）
     fig.update_geos(
         fitbounds="locations",  # 自动适配选中的州
         visible=False
@@ -332,16 +331,258 @@ def create_state_choropleth(df, metric_col='gap_score', title="Healthcare Gap Sc
     
     return fig
 
-# 执行数据关联
-merged_data = merge_data(mapped_cdc, mapped_hrsa)
+# 趋势预测图：实际值实线、预测值虚线，并显示95%预测区间
+def create_trend_forecast_chart(history, forecast, states, metric_label):
+    """创建各州实际值 + 预测值的折线图
+    
+    参数:
+    history: 趋势引擎输出的实际值长表 (state, year, value)
+    forecast: 趋势引擎输出的预测长表 (state, year, forecast, lower, upper)
+    states: 需要显示的州
+    metric_label: 指标显示名称
+    """
+    colors = ["#FF7F50", "#B2AC88", "#FFA07A", "#C5D5CB", "#FF4500", "#8FBC8F"]
+    history = history[history['state'].isin(states)]
+    forecast = forecast[forecast['state'].isin(states)]
+    
+    fig = go.Figure()
+    for i, (state, state_history) in enumerate(history.groupby('state', sort=True)):
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Scatter(
+            x=state_history['year'], y=state_history['value'],
+            mode='lines+markers', name=str(state), line=dict(color=color), legendgroup=str(state)
+        ))
+        state_forecast = forecast[forecast['state'] == state]
+        if state_forecast.empty:
+            continue
+        # 预测区间（上界 + 下界反向拼接成闭合区域）
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([state_forecast['year'], state_forecast['year'][::-1]]),
+            y=np.concatenate([state_forecast['upper'], state_forecast['lower'][::-1]]),
+            fill='toself', fillcolor=color, opacity=0.15, line=dict(width=0),
+            hoverinfo='skip', showlegend=False, legendgroup=str(state)
+        ))
+        # 预测值从最后一个实际值连接
+        last_point = state_history.iloc[[-1]]
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([last_point['year'], state_forecast['year']]),
+            y=np.concatenate([last_point['value'], state_forecast['forecast']]),
+            mode='lines', line=dict(color=color, dash='dash'),
+            name=f"{state} forecast", showlegend=False, legendgroup=str(state)
+        ))
+    
+    fig.update_layout(
+        title=f"{metric_label}: Actual and Forecast by State",
+        xaxis=dict(title="Year", tickmode='linear', dtick=1),
+        yaxis_title=metric_label,
+        height=450
+    )
+    return fig
+
+# 机会散点图：点数超过阈值时（县级数据）改用WebGL绘制并按屏幕网格抽稀，标签作为一条文本轨迹添加
+WEBGL_POINT_THRESHOLD = 1000
+MAX_SCATTER_LABELS = 50
+
+def create_opportunity_scatter(df, label_col, title='Opportunity Zones: Births vs Gap Score'):
+    """创建出生数 vs 缺口分数的机会散点图（气泡大小和颜色为机会指数）
+    
+    参数:
+    df: 每个地区一行的聚合数据 (total_births, gap_score, opportunity_index)
+    label_col: 地区名称列（悬浮显示和标签）
+    title: 图表标题
+    """
+    opportunity = df['opportunity_index'].to_numpy(dtype='float64')
+    # 机会指数前20%（不低于精确的80分位数）的点添加标签，最多MAX_SCATTER_LABELS个
+    labeled = top_share_mask(opportunity, 0.2, MAX_SCATTER_LABELS)
+    
+    large = len(df) > WEBGL_POINT_THRESHOLD
+    if large:
+        # 抽稀重叠的点：每个网格保留机会指数最高的点，需要标注的点全部保留
+        kept = decimate_points(df['total_births'], df['gap_score'], priority=opportunity, keep=labeled)
+        df = df.iloc[kept]
+        opportunity = opportunity[kept]
+        labeled = labeled[kept]
+    
+    sizes = np.clip(np.nan_to_num(opportunity), 0, None)
+    max_size = sizes.max() if len(sizes) and sizes.max() > 0 else 1.0
+    scatter_trace = go.Scattergl if large else go.Scatter
+    fig = go.Figure(scatter_trace(
+        x=df['total_births'],
+        y=df['gap_score'],
+        mode='markers',
+        marker=dict(
+            size=sizes, sizemode='area', sizeref=2.0 * max_size / 20 ** 2,
+            color=opportunity, colorscale=["#B2AC88", "#FF7F50"],
+            colorbar=dict(title='opportunity_index'), showscale=True
+        ),
+        customdata=df[label_col],
+        hovertemplate=(f"{label_col}=%{{customdata}}<br>total_births=%{{x:,.0f}}<br>"
+                       "gap_score=%{y:.2f}<br>opportunity_index=%{marker.color:.2f}<extra></extra>")
+    ))
+    
+    # 高机会点的标签：一条文本轨迹，而不是每个点一个annotation
+    label_rows = df[labeled]
+    fig.add_trace(go.Scatter(
+        x=label_rows['total_births'],
+        y=label_rows['gap_score'],
+        mode='text',
+        text=label_rows[label_col].astype(str),
+        textposition='top center',
+        textfont=dict(color="#FF7F50"),
+        hoverinfo='skip'
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Total Births',
+        yaxis_title='Gap Score (HPSA)',
+        showlegend=False,
+        width=500,
+        height=400
+    )
+    return fig
+
+# 执行数据关联（关联结果同样按数据集版本共享）
+dataset_version = None
+merged_key = None
+if cdc_key is not None and hrsa_key is not None:
+    merged_key = ('merged', cdc_key, hrsa_key)
+    dataset_version = version_id(merged_key)
+    merged_data = shared_cache.get_or_build(merged_key, lambda: merge_data(mapped_cdc, mapped_hrsa))
+    if merged_data.empty and not mapped_cdc.empty and not mapped_hrsa.empty:
+        st.sidebar.warning("⚠️ No common merge keys found. Please ensure both files have State columns.")
+    elif not merged_data.empty and data_watcher is None:
+        # API是进程级的：只自动发布第一个关联结果，其他会话的重跑不替换它（监听数据目录时API只提供自动加载的数据集）
+        api_server.publish(dataset_version, merged_data, replace=False)
+elif watched_version is not None:
+    dataset_version = watched_version.version
+    merged_data = watched_version.merged.copy(deep=False)
+
+# 未经过滤的关联结果（按数据集版本缓存的派生结果基于它计算）
+canonical_merged = merged_data
+
+# 所选地区的映射数据：只读取地区内各州的分区
+def region_rows(partitions):
+    """返回分区数据中属于所选地区的行（数据为空时返回空DataFrame）"""
+    return partitions.select(region_state_codes) if partitions is not None else pd.DataFrame()
 
-# 应用深南部州过滤器
-if not merged_data.empty and selected_states:
-    merged_data = merged_data[merged_data['state'].isin(selected_states)]
+# 县级关联结果（数据包含县FIPS代码时），按 (数据集版本, 地区) 缓存
+county_data = pd.DataFrame()
+if dataset_version is not None:
+    # 只读取所选地区的分区，耗时与地区的数据量成正比
+    county_data = shared_cache.get_or_build(
+        ('county', dataset_version, region_state_codes),
+        lambda: sort_into_partitions(merge_county_data(region_rows(cdc_partitions), region_rows(hrsa_partitions)))
+    )
 
-# 应用年份过滤器
-if not merged_data.empty and selected_years:
-    merged_data = merged_data[merged_data['year'].isin(selected_years)]
+
+def load_disparity_cube(geo):
+    """所选地区的 种族 × 地区 × 年份 数组，按 (数据集版本, 地区, 地区粒度) 缓存；没有种族数据时返回None"""
+    if dataset_version is None or 'race' not in mapped_cdc.columns:
+        return None
+    return shared_cache.get_or_build(
+        ('disparity', dataset_version, region_state_codes, geo),
+        lambda: build_disparity_cube(region_rows(cdc_partitions), region_rows(hrsa_partitions), geo)
+    )
+
+# 记录数据集版本快照：上传的文件每个会话一条版本线，自动加载的数据共用一条
+if watched_version is not None:
+    snapshot_lineage = 'watched'
+else:
+    snapshot_lineage = st.session_state.setdefault('snapshot_lineage', uuid.uuid4().hex)
+if dataset_version is not None and not canonical_merged.empty:
+    if watched_version is not None:
+        snapshot_label = " + ".join(os.path.basename(path) for path in watched_version.sources.values())
+    else:
+        snapshot_label = f"{cdc_file.name} + {hrsa_file.name}"
+    snapshot_store.record(snapshot_lineage, dataset_version, snapshot_label, canonical_merged, mapped_hrsa)
+
+# 本地JSON聚合API与应用同进程运行（每个进程只启动一次）
+if api_server.API_ENABLED:
+    api_server.start_in_background()
+    if data_watcher is None and cdc_key is not None and hrsa_key is not None and not canonical_merged.empty:
+        with st.sidebar.expander("🔌 JSON API", expanded=False):
+            if api_server.current_version() == dataset_version:
+                st.write(f"Serving this session's dataset (`{dataset_version}`) on port {api_server.API_PORT}.")
+            else:
+                st.write(f"Serving dataset `{api_server.current_version()}` from another session.")
+                # 显式替换API提供的数据集（所有API客户端都会切换到该版本）
+                if st.button("Serve this dataset via the API", key="api_publish"):
+                    api_server.publish(dataset_version, canonical_merged)
+                    st.rerun()
+
+# 应用地区/州和年份过滤器：关联结果按 州 × 年份 的行位置索引（每个数据集版本构建一次），
+# 选择只查找所选组合的行位置，选中的行连续时得到切片视图，不再逐行扫描和复制
+if not merged_data.empty:
+    merged_partitions = shared_cache.get_or_build(
+        ('partitions', dataset_version, 'merged'), lambda: PartitionIndex(sort_into_partitions(canonical_merged)),
+        parent=merged_key
+    )
+    merged_data = merged_partitions.select(selected_states or None, selected_years or None)
+
+# 侧边栏显示共享数据缓存指标
+with st.sidebar.expander("🗄️ Shared Data Cache", expanded=False):
+    cache_stats = shared_cache.stats()
+    st.write(f"Memory: {cache_stats['used_bytes'] / 1024 ** 2:,.1f} / {cache_stats['max_bytes'] / 1024 ** 2:,.0f} MB")
+    st.write(f"Datasets cached: {cache_stats['entries']}")
+    st.write(
+        f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+        f"Evictions: {cache_stats['evictions']} · Hit rate: {cache_stats['hit_rate']:.0%}"
+    )
+
+# 可浏览的数据集：名称 -> (共享缓存键, 未过滤数据, 数据集的缓存键)
+explorer_sources = {}
+if not canonical_merged.empty:
+    explorer_sources['Merged data'] = (('explorer', dataset_version, 'merged'), canonical_merged, merged_key)
+if not mapped_cdc.empty:
+    explorer_sources['Mapped CDC data'] = (('explorer', cdc_key or watched_version.version, 'cdc'), mapped_cdc, cdc_key)
+if not mapped_hrsa.empty:
+    explorer_sources['Mapped HRSA data'] = (('explorer', hrsa_key or watched_version.version, 'hrsa'), mapped_hrsa, hrsa_key)
+
+# 服务端分页数据浏览器：排序、过滤和翻页在服务端完成，浏览器只接收当前页
+def render_data_explorer(key_prefix):
+    """显示可排序、可过滤的分页数据表
+    
+    参数:
+    key_prefix: 控件key前缀（同一页面显示多个浏览器时区分控件）
+    """
+    if not explorer_sources:
+        st.info("No data to explore yet.")
+        return
+    
+    col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    with col1:
+        source_name = st.selectbox("Dataset", list(explorer_sources), key=f"{key_prefix}_source")
+    cache_key, source_df, source_key = explorer_sources[source_name]
+    # 索引按数据集版本构建一次，所有会话共享，随数据集的缓存条目一起淘汰
+    index = shared_cache.get_or_build(cache_key, lambda: data_explorer.ExplorerIndex(source_df), parent=source_key)
+    with col2:
+        sort_by = st.selectbox("Sort by", ["(stored order)"] + list(index.df.columns), key=f"{key_prefix}_sort")
+    with col3:
+        descending = st.toggle("Descending", value=False, key=f"{key_prefix}_desc")
+    with col4:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 500], key=f"{key_prefix}_size")
+    apply_filters = st.checkbox("Apply sidebar state/year filters", value=True, key=f"{key_prefix}_filters")
+    
+    index_bytes = index.nbytes
+    positions = index.select(
+        states=selected_states if apply_filters else None,
+        years=selected_years if apply_filters else None,
+        sort_by=None if sort_by == "(stored order)" else sort_by,
+        ascending=not descending,
+    )
+    if index.nbytes != index_bytes:
+        # 首次按该列排序时新建了排序顺序，重新统计索引在共享缓存中的内存占用
+        shared_cache.refresh(cache_key)
+    total = index.n_rows if positions is None else len(positions)
+    pages = data_explorer.page_count(total, page_size)
+    page_number = st.number_input(
+        f"Page (1-{pages:,})", min_value=1, max_value=pages, value=1, step=1, key=f"{key_prefix}_page"
+    )
+    rows, total = index.page(positions, int(page_number), page_size)
+    first_row = (int(page_number) - 1) * page_size
+    st.caption(f"Rows {min(first_row + 1, total):,}–{first_row + len(rows):,} of {total:,} "
+               f"({len(index.df.columns)} columns)")
+    st.dataframe(rows)
 
 # 暂时使用数据变量
 state_data = mapped_cdc  # 暂时使用映射后的CDC数据作为州级数据
@@ -421,14 +662,14 @@ with tabs[0]:
 
     
     with col2:
-        st.markdown("### Deep South States")
+        st.markdown(f"### {selected_region}")
         # 替换原有静态列表 + 提示 → 嵌入交互式地图
         if not merged_data.empty:
             # 绘制Gap Score地图
             map_fig = create_state_choropleth(
                 merged_data,
                 metric_col='gap_score',
-                title="Healthcare Gap Score (HPSA) - Deep South States"
+                title=f"Healthcare Gap Score (HPSA) - {selected_region}"
             )
             if map_fig:
                 st.plotly_chart(map_fig, width='stretch')
@@ -436,14 +677,7 @@ with tabs[0]:
                 st.info("📊 Map data unavailable. Please ensure merged data contains gap_score.")
         else:
             # 无数据时显示静态信息 + 提示
-            st.markdown("""
-            - Georgia (GA)
-            - Florida (FL)
-            - Alabama (AL)
-            - Mississippi (MS)
-            - Louisiana (LA)
-            - South Carolina (SC)
-            """)
+            st.markdown("\n".join(f"- {STATE_NAMES.get(state, state)} ({state})" for state in selected_states))
             st.info("📁 Upload CDC and HRSA data files to see interactive map visualization.")
     
     # 表单捕获功能
@@ -483,7 +717,7 @@ with tabs[0]:
 with tabs[1]:
     if st.session_state.form_completed:
         if not merged_data.empty:
-            st.title("Deep South FemTech Decision Center")
+            st.title(f"{selected_region} FemTech Decision Center")
             st.subheader("Layout 2.0 - Equity-Centered Insights")
             
             try:
@@ -531,7 +765,7 @@ with tabs[1]:
                     col3.metric(
                         label="States Covered",
                         value=f"{unique_states}",
-                        delta="Deep South States",
+                        delta=selected_region,
                         delta_color="normal"
                     )
                 else:
@@ -626,7 +860,7 @@ with tabs[1]:
                     # 检查是否有母亲年龄数据，使用merged_data确保数据一致性
                     if not merged_data.empty and 'mother_age' in merged_data.columns:
                         # 过滤掉年龄为0或无效的值
-                        age_data = merged_data[merged_data['mother_age'] > 0].copy()
+                        age_data = where_view(merged_data, merged_data['mother_age'] > 0)
                         
                         if not age_data.empty:
                             # 创建直方图
@@ -658,7 +892,7 @@ with tabs[1]:
                     # 使用merged_data确保数据一致性
                     if 'year' in merged_data.columns and 'prenatal_visits' in merged_data.columns:
                         # 过滤年份为0或空的值
-                        trend_df = merged_data[(merged_data['year'] > 0) & (merged_data['year'] < 3000)].copy()
+                        trend_df = where_view(merged_data, (merged_data['year'] > 0) & (merged_data['year'] < 3000))
                         
                         # 检查数据量
                         if len(trend_df) > 0:
@@ -692,11 +926,61 @@ with tabs[1]:
                     else:
                         st.info("ℹ️ Trend data not available. Please ensure your data contains Year and Prenatal Visits columns.")
                 
+                # 第五区：州级趋势与预测
+                st.subheader("🔮 State Trends & Forecast")
+                
+                # 趋势引擎对所有州×指标一次性计算，按数据集版本缓存
+                trend_results = shared_cache.get_or_build(
+                    ('trends', dataset_version),
+                    lambda: trends.build_trend_engine(canonical_merged)
+                )
+                trend_metric_labels = {
+                    'total_births': "Births",
+                    'prenatal_visits': "Prenatal Visits",
+                    'gap_score': "Gap Score (HPSA)"
+                }
+                available_trend_metrics = [m for m in trend_metric_labels if m in trend_results]
+                
+                if available_trend_metrics:
+                    trend_metric = st.selectbox(
+                        "Trend metric",
+                        options=available_trend_metrics,
+                        format_func=lambda m: trend_metric_labels[m],
+                        key="trend_metric"
+                    )
+                    trend_summary, trend_history, trend_forecast = trend_results[trend_metric]
+                    trend_states = selected_states or trend_summary['state'].tolist()
+                    
+                    fig_forecast = create_trend_forecast_chart(
+                        trend_history,
+                        trend_forecast,
+                        trend_states,
+                        trend_metric_labels[trend_metric]
+                    )
+                    st.plotly_chart(fig_forecast, width='stretch')
+                    
+                    # 趋势指标汇总表
+                    summary_view = trend_summary[trend_summary['state'].isin(trend_states)]
+                    st.dataframe(summary_view.style.format({
+                        'latest_year': '{:.0f}',
+                        'latest_value': '{:,.2f}',
+                        'yoy_change': '{:+.1%}',
+                        'rolling_avg': '{:,.2f}',
+                        'cagr': '{:+.1%}',
+                        'trend_slope': '{:+,.2f}',
+                        'forecast_next': '{:,.2f}',
+                        'forecast_lower': '{:,.2f}',
+                        'forecast_upper': '{:,.2f}'
+                    }, na_rep='–'), hide_index=True)
+                    st.caption("YoY change and rolling average (3-year) are for each state's latest year. "
+                               "Forecasts use a linear trend with a 95% prediction interval.")
+                else:
+                    st.info("ℹ️ Trend data not available. Please ensure your data contains State and Year columns.")
+                
                 # 数据概览（可选）
                 with st.expander("📋 Data Overview"):
                     st.write(f"Merged data contains {len(merged_data)} rows and {len(merged_data.columns)} columns")
-                    st.write("Sample Data:")
-                    st.dataframe(merged_data.head())
+                    render_data_explorer("overview")
                     
             except Exception as e:
                 st.warning(f"⚠️ Error analyzing data structure. Please ensure your data contains State and relevant metric columns. Error: {e}")
@@ -716,26 +1000,21 @@ with tabs[2]:
     if not merged_data.empty:
         # 计算Opportunity指数
         if 'total_births' in merged_data.columns and 'gap_score' in merged_data.columns:
-            # 先按州聚合核心指标
-            state_aggregated = merged_data.groupby('state').agg({
-                'total_births': 'sum',      # 计算每个州的总出生数
-                'gap_score': 'mean'         # 计算每个州的平均缺口分数
-            }).reset_index()
-            
-            # 计算所有州的最大总出生数
-            max_births = state_aggregated['total_births'].max() if not state_aggregated['total_births'].empty else 1
-            
-            # 用聚合后的指标重新计算州级机会指数
-            state_aggregated['opportunity_index'] = (state_aggregated['total_births'] / max_births) * state_aggregated['gap_score']
+            # 按州聚合核心指标并计算州级机会指数
+            state_aggregated = state_aggregates(merged_data)
             
             # 显示机会指数最高的前10个州
             top_opportunities = state_aggregated.nlargest(10, 'opportunity_index')[['state', 'total_births', 'gap_score', 'opportunity_index']]
+            top_opportunities['percentile'] = percentile_ranks(
+                state_aggregated['opportunity_index'], top_opportunities['opportunity_index']
+            )
             
             st.subheader("🎯 Top Opportunity Zones")
             st.dataframe(top_opportunities.style.format({
                 'total_births': '{:,.0f}',
                 'gap_score': '{:.2f}',
-                'opportunity_index': '{:.2f}'
+                'opportunity_index': '{:.2f}',
+                'percentile': '{:.0%}'
             }))
             
             # 创建机会指数可视化
@@ -747,47 +1026,11 @@ with tabs[2]:
             # 使用之前已经计算好的state_aggregated数据
             # 不需要重新聚合，因为我们已经在前面计算了正确的州级机会指数
             
-            # 筛选机会指数前20%的区域
-            threshold = state_aggregated['opportunity_index'].quantile(0.8)
-            high_opportunity = state_aggregated[state_aggregated['opportunity_index'] >= threshold]
-            
-            # 左侧：散点图（气泡图）
+            # 左侧：散点图（气泡图），机会指数前20%的区域添加标签
             with viz_col1:
                 st.markdown("### 🔍 Opportunity Heatmap")
-                # 准备hover数据
-                hover_data = ['state']
-                
                 # 创建散点图，使用聚合后的数据
-                fig_scatter = px.scatter(
-                    state_aggregated,
-                    x='total_births',
-                    y='gap_score',
-                    size='opportunity_index',
-                    color='opportunity_index',
-                    hover_data=hover_data,
-                    title='Opportunity Zones: Births vs Gap Score',
-                    color_continuous_scale=["#B2AC88", "#FF7F50"]
-                )
-                
-                # 对高机会点添加标签
-                for i, row in high_opportunity.iterrows():
-                    fig_scatter.add_annotation(
-                        x=row['total_births'],
-                        y=row['gap_score'],
-                        text=row['state'],
-                        showarrow=True,
-                        arrowhead=1,
-                        bgcolor="white",
-                        bordercolor="#FF7F50",
-                        borderwidth=2
-                    )
-                
-                fig_scatter.update_layout(
-                    xaxis_title='Total Births',
-                    yaxis_title='Gap Score (HPSA)',
-                    width=500,
-                    height=400
-                )
+                fig_scatter = create_opportunity_scatter(state_aggregated, 'state')
                 st.plotly_chart(fig_scatter, width='stretch')
             
             # 右侧：机会指数分布
@@ -812,9 +1055,8 @@ with tabs[2]:
                     height=400
                 )
                 
-                # 添加中位数和90分位数参考线
-                median_value = state_aggregated['opportunity_index'].median()
-                percentile_90 = state_aggregated['opportunity_index'].quantile(0.9)
+                # 添加中位数和90分位数参考线（每个州一个值，直接计算精确分位数）
+                median_value, percentile_90 = state_aggregated['opportunity_index'].quantile([0.5, 0.9])
                 
                 fig_hist.add_vline(x=median_value, line_dash="dash", line_color="green", 
                                   annotation_text=f"Median: {median_value:.2f}")
@@ -826,8 +1068,7 @@ with tabs[2]:
             # 按州分析机会
             st.subheader("🌍 State-Level Opportunity Analysis")
             # 使用已经聚合好的state_aggregated数据
-            state_opportunity = state_aggregated.copy()
-            state_opportunity = state_opportunity.sort_values('opportunity_index', ascending=False)
+            state_opportunity = state_aggregated.sort_values('opportunity_index', ascending=False)
             
             fig_state = px.bar(
                 state_opportunity,
@@ -846,11 +1087,147 @@ with tabs[2]:
             st.warning("⚠️ Required data columns not available. Please ensure your data contains total_births and gap_score columns.")
     else:
         st.info("ℹ️ No merged data available. Please upload both CDC and HRSA data files in the sidebar.")
+    
+    # 县级机会分析（HRSA数据包含县FIPS代码时显示）
+    if not county_data.empty:
+        st.subheader("🗺️ County-Level Opportunity")
+        county_partitions = shared_cache.get_or_build(
+            ('partitions', dataset_version, region_state_codes, 'county'), lambda: PartitionIndex(county_data),
+            parent=('county', dataset_version, region_state_codes)
+        )
+        county_table = county_aggregates(county_partitions.select(selected_states or None, selected_years or None))
+        
+        county_metrics = {'gap_score': "Healthcare Gap Score (HPSA)", 'active_designations': "Active HPSA Designations"}
+        if county_table['total_births'].notna().any():
+            county_metrics = {'opportunity_index': "Opportunity Index", 'total_births': "Total Births", **county_metrics}
+        else:
+            st.caption("CDC data has no county codes, so county births and opportunity index are unavailable.")
+        
+        resolutions = county_geo.available_resolutions()
+        map_states = tuple(sorted(selected_states or county_table['state'].dropna().unique()))
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            county_metric = st.selectbox("County metric", list(county_metrics), format_func=county_metrics.get, key="county_metric")
+        with col2:
+            detail = st.selectbox("Map detail", ["auto"] + resolutions, key="county_detail")
+        
+        if resolutions:
+            resolution = county_geo.auto_resolution(len(map_states), resolutions) if detail == "auto" else detail
+            # 模板按 (精度, 州) 只构建一次，重跑时只替换颜色数组
+            county_template = county_geo.choropleth_template(resolution, map_states)
+            values = county_template.align(county_table.set_index('county_fips')[county_metric])
+            with county_template.lock:
+                county_fig = county_template.fill(
+                    values, county_metrics[county_metric], f"{county_metrics[county_metric]} by County"
+                )
+                st.plotly_chart(county_fig, width='stretch')
+        else:
+            st.info("ℹ️ County boundaries are not installed. Build them with "
+                    "`python scripts/build_county_geometries.py --shp <Census county shapefile>`.")
+        
+        # 县级机会散点图（县数通常超过WEBGL_POINT_THRESHOLD，使用WebGL并抽稀），前20%的县添加标签
+        if 'opportunity_index' in county_metrics:
+            county_points = county_table.dropna(subset=['total_births', 'gap_score', 'opportunity_index'])
+            if not county_points.empty:
+                county_scatter = create_opportunity_scatter(
+                    county_points, 'county_fips', title='County Opportunity Zones: Births vs Gap Score'
+                )
+                st.plotly_chart(county_scatter, width='stretch')
+        
+        # 县排名附带所选指标的精确百分位
+        county_ranking = county_table.nlargest(15, county_metric)
+        county_ranking['percentile'] = percentile_ranks(county_table[county_metric], county_ranking[county_metric])
+        st.dataframe(county_ranking.style.format({
+            'total_births': '{:,.0f}',
+            'gap_score': '{:.2f}',
+            'active_designations': '{:.1f}',
+            'opportunity_index': '{:.2f}',
+            'percentile': '{:.0%}'
+        }, na_rep='–'))
+        
+        # 县×年份机会指数分布：按州×年份分区的摘要每个 (数据集版本, 地区) 构建一次，
+        # 选择州和年份时只合并命中分区的摘要，不扫描县数据行
+        if 'opportunity_index' in county_metrics:
+            county_sketches = shared_cache.get_or_build(
+                ('county_sketch', dataset_version, region_state_codes), lambda: county_year_sketches(county_data)
+            )
+            county_year_sketch, max_county_births = county_sketches.combine(selected_states or None, selected_years or None)
+            if county_year_sketch.count and max_county_births > 0:
+                county_median, county_top20, county_p90 = county_year_sketch.quantile([0.5, 0.8, 0.9]) / max_county_births
+                bin_counts, bin_edges = county_year_sketch.histogram(bins=30)
+                fig_county_dist = go.Figure(go.Bar(
+                    x=(bin_edges[:-1] + bin_edges[1:]) / 2 / max_county_births,
+                    y=bin_counts,
+                    width=np.diff(bin_edges) / max_county_births,
+                    marker_color="#FF7F50",
+                ))
+                fig_county_dist.add_vline(x=county_median, line_dash="dash", line_color="green",
+                                          annotation_text=f"Median: {county_median:.3f}")
+                fig_county_dist.add_vline(x=county_top20, line_dash="dash", line_color="orange",
+                                          annotation_text=f"Top 20%: {county_top20:.3f}")
+                fig_county_dist.add_vline(x=county_p90, line_dash="dot", line_color="red",
+                                          annotation_text=f"90th%: {county_p90:.3f}")
+                fig_county_dist.update_layout(
+                    title="County-Year Opportunity Index Distribution",
+                    xaxis_title="Opportunity Index (county × year)",
+                    yaxis_title="County-years",
+                )
+                st.plotly_chart(fig_county_dist, width='stretch')
+                st.caption(f"{county_year_sketch.count:,} county-years. Percentiles are approximate "
+                           f"(within ±{RELATIVE_ACCURACY:.0%} of the exact value).")
+    
+    # 数据集版本比较：与本会话（或自动加载数据）之前的版本对比
+    snapshot_history = snapshot_store.history(snapshot_lineage)
+    if len(snapshot_history) >= 2 and snapshot_history[-1].version == dataset_version:
+        st.subheader("🕘 Changes Between Dataset Versions")
+        current_snapshot = snapshot_history[-1]
+        previous_snapshots = snapshot_history[-2::-1]
+        base_snapshot = st.selectbox(
+            "Compare current data with",
+            previous_snapshots,
+            format_func=lambda snap: f"{snap.label} (loaded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snap.created_at))})",
+            key="snapshot_base"
+        )
+        version_diff = shared_cache.get_or_build(
+            ('diff', base_snapshot.version, current_snapshot.version),
+            lambda: diff_snapshots(base_snapshot, current_snapshot)
+        )
+        merged_diff = version_diff['merged']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Added state-years", f"{len(merged_diff['added']):,}")
+        col2.metric("Removed state-years", f"{len(merged_diff['removed']):,}")
+        col3.metric("Changed state-years", f"{merged_diff['changed_rows']:,}")
+        col4.metric("Unchanged state-years", f"{merged_diff['unchanged_rows']:,}")
+        if 'hrsa' in version_diff:
+            hrsa_diff = version_diff['hrsa']
+            st.caption(
+                f"HRSA designations: {len(hrsa_diff['added']):,} added, {len(hrsa_diff['removed']):,} removed, "
+                f"{hrsa_diff['changed_rows']:,} re-scored or updated"
+            )
+        
+        st.markdown("**Opportunity ranking movement** (positive = moved up)")
+        st.dataframe(version_diff['ranking'].style.format({
+            'old_rank': '{:.0f}', 'new_rank': '{:.0f}', 'rank_change': '{:+.0f}',
+            'old_opportunity_index': '{:.2f}', 'new_opportunity_index': '{:.2f}'
+        }, na_rep='–'))
+        
+        # 差异明细只显示前若干行
+        detail_limit = 1000
+        with st.expander("Changed values"):
+            st.dataframe(merged_diff['changed'].head(detail_limit))
+        with st.expander("Added and removed rows"):
+            st.markdown("Added")
+            st.dataframe(merged_diff['added'].head(detail_limit))
+            st.markdown("Removed")
+            st.dataframe(merged_diff['removed'].head(detail_limit))
+        if 'hrsa' in version_diff:
+            with st.expander("HRSA designation changes"):
+                st.dataframe(hrsa_diff['changed'].head(detail_limit))
 
 # AI洞察页面
 with tabs[3]:
     st.title("AI-Powered Insights")
-    st.markdown("Ask a question about Deep South women's health data")
+    st.markdown(f"Ask a question about {selected_region} women's health data")
     
     # Q&A框
     user_query = st.text_input(
@@ -889,15 +1266,21 @@ with tabs[3]:
                         data_summary += f"Top opportunity state: {top_state['state']} with composite score of {top_state['composite_score']:.2f}.\n"
                         data_summary += f"HPSA Score: {state_data['gap_score']:.2f}, Total Births: {state_data['total_births']:,.0f}.\n"
                     
-                    # 3. 种族维度分析（如果存在race列）
-                    if 'race' in merged_data.columns:
-                        race_counts = merged_data['race'].value_counts()
-                        data_summary += f"\nRace distribution: {race_counts.to_dict()}.\n"
-                        
-                        # 按种族聚合分析
-                        if 'total_births' in merged_data.columns:
-                            race_births = merged_data.groupby('race')['total_births'].sum().reset_index()
-                            data_summary += f"Births by race: {dict(zip(race_births['race'], race_births['total_births']))}.\n"
+                    # 3. 种族维度分析（CDC数据包含种族时，使用差异分析数组）
+                    summary_cube = load_disparity_cube('state')
+                    race_disparity_note = ""
+                    if summary_cube is not None:
+                        summary_reference = default_reference(summary_cube)
+                        summary_table = disparity_table(summary_cube, summary_reference, selected_states, selected_years)
+                        race_births = summary_table[summary_table['geo'] == 'All'].set_index('race')['births']
+                        data_summary += f"\nBirths by race: {', '.join(f'{race}: {births:,.0f}' for race, births in race_births.items())}.\n"
+                        summary_index = disparity_index(summary_table, 'prenatal_ratio', summary_reference)
+                        if not summary_index.empty:
+                            widest = summary_index.iloc[0]
+                            race_disparity_note = (
+                                f"- Prenatal care disparities (vs. {summary_reference}) are widest in {widest['geo']}, "
+                                f"led by {widest['most_divergent_race']} mothers (index {widest['disparity_index']:.1f})"
+                            )
                     
                     # 4. 生成动态洞察
                     # 确保top_state变量存在
@@ -906,6 +1289,10 @@ with tabs[3]:
                     if 'top_state' in locals():
                         top_state_name = top_state['state']
                         top_state_info = f"- The state with the most significant healthcare gap is {top_state_name}, presenting a prime opportunity for FemTech innovation\n"
+                    if top_state_name:
+                        first_action = f"1. Prioritize investment in {top_state_name} with programs addressing maternal health equity"
+                    else:
+                        first_action = "1. Identify states with highest healthcare gaps for targeted investment"
                     
                     response = f"""
                     ## AI-Generated Insight
@@ -918,10 +1305,10 @@ with tabs[3]:
                     **Key Opportunities:**
                     {top_state_info}
                     - Targeted interventions should focus on areas with high HPSA scores and substantial birth rates
-                    {"- Race-based disparities exist, with potential for targeted outreach programs" if 'race' in merged_data.columns else ""}
+                    {race_disparity_note}
                     
                     **Recommended Actions:**
-                    {f"1. Prioritize investment in {top_state_name} with programs addressing maternal health equity\n" if top_state_name else "1. Identify states with highest healthcare gaps for targeted investment\n"}
+                    {first_action}
                     2. Develop data-driven strategies to improve healthcare access in underserved areas
                     3. Consider racial and ethnic disparities when designing intervention programs
                     4. Establish partnerships with local healthcare providers to maximize impact
@@ -935,7 +1322,7 @@ with tabs[3]:
                     No merged data is currently available for analysis. Please upload both CDC and HRSA data files to generate meaningful insights.
                     
                     Once data is uploaded, this system will automatically:
-                    1. Analyze healthcare gaps across Deep South states
+                    1. Analyze healthcare gaps across the selected region's states
                     2. Identify top opportunity areas based on HPSA scores and birth rates
                     3. Generate race-specific insights (if race data is available)
                     4. Provide targeted investment recommendations
@@ -982,35 +1369,59 @@ with tabs[3]:
                     max_val = merged_data[col].max()
                     st.write(f"- {col}: Mean = {mean_val:.2f}, Range = {min_val:.2f} - {max_val:.2f}")
             
-            # 种族维度分析（如果存在race列）
-            if 'race' in merged_data.columns:
+            # 种族维度分析（CDC数据包含种族时）：相对参照种族的比率热力图和差异指数排名
+            if load_disparity_cube('state') is not None:
                 st.subheader("👥 Racial Dimensions")
-                race_counts = merged_data['race'].value_counts()
-                st.write("**Race Distribution:**")
-                for race, count in race_counts.items():
-                    st.write(f"- {race}: {count} records")
+                geo_levels = {'state': "State"}
+                if 'county_fips' in mapped_cdc.columns and mapped_cdc['county_fips'].notna().any():
+                    geo_levels['county_fips'] = "County"
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    disparity_geo = st.selectbox("Geography", list(geo_levels), format_func=geo_levels.get, key="disparity_geo")
+                disparity_cube = load_disparity_cube(disparity_geo)
+                with col2:
+                    race_options = list(disparity_cube.races)
+                    reference_race = st.selectbox(
+                        "Reference group", race_options,
+                        index=race_options.index(default_reference(disparity_cube)), key="disparity_reference"
+                    )
+                with col3:
+                    disparity_metric = st.selectbox("Measure", list(RATIO_METRICS), format_func=RATIO_METRICS.get, key="disparity_metric")
                 
-                # 按种族分析核心指标
-                if 'total_births' in merged_data.columns:
-                    race_births = merged_data.groupby('race')['total_births'].sum().reset_index()
-                    st.write("**Total Births by Race:**")
-                    for _, row in race_births.iterrows():
-                        st.write(f"- {row['race']}: {row['total_births']:,.0f}")
+                race_table = disparity_table(disparity_cube, reference_race, selected_states, selected_years)
+                ranked_disparity = disparity_index(race_table, disparity_metric, reference_race)
+                
+                # 热力图只显示差异指数最高的地区（县级时地区数量很多），合计列放在最前
+                heatmap_limit = 30
+                heatmap_geos = ['All'] + [geo for geo in ranked_disparity['geo'] if geo != 'All'][:heatmap_limit]
+                heatmap_data = race_table.pivot(index='race', columns='geo', values=disparity_metric).reindex(columns=heatmap_geos)
+                fig_disparity = px.imshow(
+                    heatmap_data,
+                    color_continuous_scale='RdBu_r',
+                    color_continuous_midpoint=1.0,
+                    aspect='auto',
+                    labels={'x': geo_levels[disparity_geo], 'y': 'Race', 'color': 'Ratio'},
+                    title=f"{RATIO_METRICS[disparity_metric]} vs. {reference_race}",
+                )
+                st.plotly_chart(fig_disparity, width='stretch')
+                
+                st.write(f"**Disparity Index by {geo_levels[disparity_geo]}** (mean absolute deviation from the reference group, %)")
+                st.dataframe(ranked_disparity.head(20).style.format({
+                    'disparity_index': '{:.1f}', 'max_deviation': '{:.1f}'
+                }), hide_index=True)
+                
+                with st.expander("Births and rates by race"):
+                    race_totals = race_table[race_table['geo'] == 'All'].drop(columns='geo')
+                    st.dataframe(race_totals.style.format({
+                        'births': '{:,.0f}', 'birth_share': '{:.1%}', 'prenatal_visits': '{:.2f}', 'exposure_rate': '{:.2f}',
+                        **{metric: '{:.2f}' for metric in RATIO_METRICS}
+                    }, na_rep='–'), hide_index=True)
             
             # 添加基于数据的洞察
             st.subheader("🎯 Key Opportunities")
             if 'total_births' in merged_data.columns and 'gap_score' in merged_data.columns:
-                # 先按州聚合核心指标
-                state_aggregated = merged_data.groupby('state').agg({
-                    'total_births': 'sum',
-                    'gap_score': 'mean'
-                }).reset_index()
-                
-                # 计算所有州的最大总出生数
-                max_births = state_aggregated['total_births'].max() if not state_aggregated['total_births'].empty else 1
-                
-                # 用聚合后的指标重新计算州级机会指数
-                state_aggregated['opportunity_index'] = (state_aggregated['total_births'] / max_births) * state_aggregated['gap_score']
+                # 按州聚合核心指标并计算州级机会指数
+                state_aggregated = state_aggregates(merged_data)
                 
                 # 按州分析
                 state_opportunity = state_aggregated.nlargest(3, 'opportunity_index')
@@ -1046,8 +1457,6 @@ with tabs[4]:
     
     if not merged_data.empty:
         # 创建CSV下载链接
-        import io
-        
         def get_csv_download_link(df, filename):
             """生成CSV文件的下载链接"""
             # 创建CSV缓冲区
@@ -1063,7 +1472,7 @@ with tabs[4]:
         
         # 显示数据预览
         with st.expander("📋 Data Preview"):
-            st.dataframe(merged_data.head())
+            render_data_explorer("download_preview")
     else:
         st.info("ℹ️ No merged data available. Please upload both CDC and HRSA data files to generate the merged dataset.")
     
@@ -1097,4 +1506,19 @@ st.markdown("""
 ### Footer
 *Demo only – not for redistribution.*
 *FemTech BI Dashboard for the Deep South* 
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# 本次重跑的内存统计
+rerun_memory = memory_report.finish_rerun(rerun_memory_start)
+with st.sidebar.expander("📈 Rerun Memory", expanded=False):
+    if rerun_memory['peak_bytes'] is not None:
+        rerun_peaks = st.session_state.setdefault('rerun_memory_peaks', [])
+        rerun_peaks.append(rerun_memory['peak_bytes'])
+        del rerun_peaks[:-20]
+        st.write(f"Peak during this rerun: {rerun_memory['peak_bytes'] / 1024 ** 2:,.1f} MB")
+        st.write(f"Net change after this rerun: {rerun_memory['retained_bytes'] / 1024 ** 2:+,.1f} MB")
+        st.write(f"Highest of the last {len(rerun_peaks)} reruns: {max(rerun_peaks) / 1024 ** 2:,.1f} MB")
+    else:
+        st.caption("Set `FEMTECH_TRACE_MEMORY=1` to record peak allocations per rerun.")
+    if rerun_memory['process_peak_bytes'] is not None:
+        st.write(f"Process peak RSS: {rerun_memory['process_peak_bytes'] / 1024 ** 2:,.0f} MB")
@@ -0,0 +1,154 @@
+import functools
+import json
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+# 县级地图：本地打包的县界几何（GeoJSON，按FIPS代码标识），不依赖网络。
+#
+# 几何数据由 scripts/build_county_geometries.py 从人口普查局的县界文件生成，
+# 预先简化为几个精度级别并序列化到 geo/ 目录；运行时每个精度只解析一次。
+# 地图图形按 (精度, 州) 构建一次作为模板，之后每次重跑只替换颜色数组和悬浮数据。
+
+GEO_DIR = os.environ.get('FEMTECH_GEO_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geo'))
+
+# 精度级别 -> (简化容差（度）, 坐标保留的小数位数)，从粗到细
+RESOLUTIONS = {
+    'low': (0.02, 3),
+    'medium': (0.005, 3),
+    'high': (0.001, 4),
+}
+
+CountyGeometry = namedtuple('CountyGeometry', ['features', 'fips', 'names', 'states'])
+
+
+def geometry_path(resolution):
+    """精度级别对应的几何文件路径"""
+    return os.path.join(GEO_DIR, f'counties_{resolution}.json')
+
+
+def available_resolutions():
+    """返回已打包的精度级别（从粗到细）"""
+    return [resolution for resolution in RESOLUTIONS if os.path.exists(geometry_path(resolution))]
+
+
+def auto_resolution(n_states, available=None):
+    """按显示的州数选择精度：州越多（地图缩放越小）使用越粗的几何"""
+    available = available_resolutions() if available is None else available
+    if not available:
+        return None
+    preferred = 'low' if n_states > 3 else 'medium' if n_states > 1 else 'high'
+    order = list(RESOLUTIONS)
+    # 首选精度未打包时使用最接近的已打包精度
+    return min(available, key=lambda resolution: abs(order.index(resolution) - order.index(preferred)))
+
+
+def _as_arrays(geometry):
+    """把坐标环转换为numpy数组：图形序列化前的深拷贝只需复制数组内存，不必逐个复制坐标列表"""
+    if geometry['type'] == 'Polygon':
+        geometry['coordinates'] = [np.asarray(ring, dtype='float64') for ring in geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        geometry['coordinates'] = [
+            [np.asarray(ring, dtype='float64') for ring in polygon] for polygon in geometry['coordinates']
+        ]
+    return geometry
+
+
+@functools.lru_cache(maxsize=None)
+def load_geometry(resolution):
+    """读取并解析一个精度级别的几何文件（每个进程只解析一次）"""
+    with open(geometry_path(resolution), encoding='utf-8') as f:
+        collection = json.load(f)
+    features = collection['features']
+    for feature in features:
+        _as_arrays(feature['geometry'])
+    return CountyGeometry(
+        features,
+        np.array([feature['id'] for feature in features]),
+        np.array([feature['properties'].get('name', '') for feature in features]),
+        np.array([feature['properties'].get('state', '') for feature in features]),
+    )
+
+
+class ChoroplethTemplate:
+    """可复用的县级分级着色地图：几何和布局固定，只替换颜色和悬浮数据"""
+
+    def __init__(self, geometry, mask):
+        self.fips = geometry.fips[mask]
+        self.names = geometry.names[mask]
+        self.states = geometry.states[mask]
+        geojson = {'type': 'FeatureCollection', 'features': [f for f, keep in zip(geometry.features, mask) if keep]}
+        self.figure = go.Figure(go.Choropleth(
+            geojson=geojson,
+            featureidkey='id',
+            locations=self.fips,
+            z=np.full(len(self.fips), np.nan),
+            colorscale=["#B2AC88", "#FF7F50", "#FF4500"],
+            marker_line_width=0.3,
+            marker_line_color='white',
+        ))
+        self.figure.update_geos(fitbounds='locations', visible=False)
+        self.figure.update_layout(height=600, margin={"r": 0, "t": 50, "l": 0, "b": 0})
+        # 同一模板被多个会话共享，填充数据和序列化期间需要加锁
+        self.lock = threading.Lock()
+
+    def fill(self, values, metric_label, title, hover_values=None):
+        """填充颜色数组（按模板县顺序对齐的数值，缺失为NaN）和悬浮数据；调用方需持有lock"""
+        trace = self.figure.data[0]
+        customdata = np.column_stack([self.names, self.states] + ([hover_values] if hover_values is not None else []))
+        hover_extra = "<br>%{customdata[2]}" if hover_values is not None else ""
+        trace.update(
+            z=values,
+            customdata=customdata,
+            colorbar=dict(title=metric_label, tickformat=',.2f'),
+            hovertemplate=f"%{{customdata[0]}}, %{{customdata[1]}} (%{{location}})<br>{metric_label}: %{{z:,.2f}}{hover_extra}<extra></extra>",
+        )
+        self.figure.update_layout(title=dict(text=title, font=dict(size=18, weight="bold")))
+        return self.figure
+
+    def align(self, series):
+        """把按FIPS索引的Series对齐到模板的县顺序"""
+        return series.reindex(self.fips).to_numpy(dtype='float64')
+
+
+@functools.lru_cache(maxsize=16)
+def choropleth_template(resolution, states):
+    """返回 (精度, 州元组) 对应的地图模板（首次请求时构建）"""
+    geometry = load_geometry(resolution)
+    mask = np.isin(geometry.states, list(states)) if states else np.ones(len(geometry.fips), dtype=bool)
+    return ChoroplethTemplate(geometry, mask)
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker简化闭合环（N×2数组，首尾相同）；简化后退化（不足4个点）时返回None"""
+    n = len(points)
+    if n <= 4:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # 闭合环首尾相同，先以离起点最远的点切成两段
+    far = int(np.argmax(((points - points[0]) ** 2).sum(axis=1)))
+    keep[far] = True
+    stack = [(0, far), (far, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    simplified = points[keep]
+    return simplified if len(simplified) >= 4 else None
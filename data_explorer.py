@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+
+# 服务端数据浏览器：按数据集版本建立索引（州/年份行位置索引 + 按需预计算的排序顺序），
+# 翻页、排序和过滤都在服务端完成，只把当前页的行发送到浏览器。
+
+# 行位置使用的整数类型（行数小于2^31时用int32节省内存）
+def _position_dtype(n_rows):
+    return np.int32 if n_rows < 2 ** 31 else np.int64
+
+
+class ExplorerIndex:
+    """单个数据集的浏览索引"""
+
+    def __init__(self, df, index_columns=('state', 'year')):
+        self.df = df
+        self.n_rows = len(df)
+        self._dtype = _position_dtype(self.n_rows)
+        self._lock = threading.Lock()
+        self._sort_orders = {}  # 列名 -> (升序行位置, 非缺失值个数)
+        # 州/年份 -> 行位置（升序），选择某些州/年份时只需访问对应的行
+        self._value_positions = {}
+        for col in index_columns:
+            if col in df.columns:
+                # groupby的indices是行位置（与索引标签无关），缺失值不建索引
+                groups = df[col].groupby(df[col].to_numpy(), sort=False).indices
+                self._value_positions[col] = {
+                    value: positions.astype(self._dtype) for value, positions in groups.items()
+                }
+
+    @property
+    def nbytes(self):
+        """索引数组占用的内存（不含引用的数据集；共享缓存按 dataset_cache.estimate_bytes 统计）"""
+        total = 0
+        for positions_by_value in self._value_positions.values():
+            total += sum(positions.nbytes for positions in positions_by_value.values())
+        for order, _ in self._sort_orders.values():
+            total += order.nbytes
+        return total
+
+    def sort_order(self, column):
+        """返回列的升序行位置（缺失值在最后）和非缺失值个数；首次请求时计算并缓存"""
+        with self._lock:
+            cached = self._sort_orders.get(column)
+        if cached is not None:
+            return cached
+        series = self.df[column].reset_index(drop=True)
+        order = series.sort_values(kind='stable', na_position='last').index.to_numpy().astype(self._dtype)
+        cached = (order, int(series.notna().sum()))
+        with self._lock:
+            self._sort_orders[column] = cached
+        return cached
+
+    def _mask(self, column, values):
+        """由行位置索引构建选择掩码（耗时与选中的行数成正比）"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        positions_by_value = self._value_positions[column]
+        for value in values:
+            positions = positions_by_value.get(value)
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def select(self, states=None, years=None, sort_by=None, ascending=True):
+        """返回满足条件的行位置（已排序）；没有过滤和排序时返回None表示全部行的自然顺序"""
+        mask = None
+        if states and 'state' in self._value_positions:
+            mask = self._mask('state', states)
+        if years and 'year' in self._value_positions:
+            year_mask = self._mask('year', years)
+            mask = year_mask if mask is None else mask & year_mask
+
+        if sort_by is None or sort_by not in self.df.columns:
+            return np.flatnonzero(mask).astype(self._dtype) if mask is not None else None
+
+        order, valid_count = self.sort_order(sort_by)
+        if not ascending:
+            # 降序时缺失值仍放在最后
+            order = np.concatenate([order[:valid_count][::-1], order[valid_count:]])
+        return order[mask[order]] if mask is not None else order
+
+    def page(self, positions, page_number, page_size):
+        """返回指定页的行（页码从1开始）和总行数"""
+        total = self.n_rows if positions is None else len(positions)
+        start = max(page_number - 1, 0) * page_size
+        end = min(start + page_size, total)
+        if start >= total:
+            return self.df.iloc[0:0], total
+        if positions is None:
+            return self.df.iloc[start:end], total
+        return self.df.iloc[positions[start:end]], total
+
+
+def page_count(total_rows, page_size):
+    """总页数（至少1页）"""
+    return max(1, -(-total_rows // page_size))
@@ -0,0 +1,495 @@
+import hashlib
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+from hpsa_intervals import DesignationIndex
+from mapping_profiles import (
+    fields_for_columns,
+    get_profile,
+    header_signature,
+    profile_revision,
+    save_profile,
+)
+from partitions import sort_into_partitions
+
+# 数据管道：文件加载、字段映射、数据清理与CDC/HRSA关联（不依赖Streamlit，可供应用和API共用）
+
+# 州名映射字典：全称 -> 简称（50州、哥伦比亚特区和波多黎各）
+STATE_MAPPING = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'District of Columbia': 'DC', 'Florida': 'FL',
+    'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL', 'Indiana': 'IN',
+    'Iowa': 'IA', 'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME',
+    'Maryland': 'MD', 'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS',
+    'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH',
+    'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY', 'North Carolina': 'NC', 'North Dakota': 'ND',
+    'Ohio': 'OH', 'Oklahoma': 'OK', 'Oregon': 'OR', 'Pennsylvania': 'PA', 'Puerto Rico': 'PR',
+    'Rhode Island': 'RI', 'South Carolina': 'SC', 'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX',
+    'Utah': 'UT', 'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV',
+    'Wisconsin': 'WI', 'Wyoming': 'WY',
+}
+
+# 小写全称 -> 简称（标准化时按字典查找）
+_STATE_LOOKUP = {full_name.lower(): abbreviation for full_name, abbreviation in STATE_MAPPING.items()}
+
+# 州FIPS代码 -> 州简称（县FIPS代码的前两位）
+STATE_FIPS = {
+    '01': 'AL', '02': 'AK', '04': 'AZ', '05': 'AR', '06': 'CA', '08': 'CO', '09': 'CT', '10': 'DE',
+    '11': 'DC', '12': 'FL', '13': 'GA', '15': 'HI', '16': 'ID', '17': 'IL', '18': 'IN', '19': 'IA',
+    '20': 'KS', '21': 'KY', '22': 'LA', '23': 'ME', '24': 'MD', '25': 'MA', '26': 'MI', '27': 'MN',
+    '28': 'MS', '29': 'MO', '30': 'MT', '31': 'NE', '32': 'NV', '33': 'NH', '34': 'NJ', '35': 'NM',
+    '36': 'NY', '37': 'NC', '38': 'ND', '39': 'OH', '40': 'OK', '41': 'OR', '42': 'PA', '44': 'RI',
+    '45': 'SC', '46': 'SD', '47': 'TN', '48': 'TX', '49': 'UT', '50': 'VT', '51': 'VA', '53': 'WA',
+    '54': 'WV', '55': 'WI', '56': 'WY', '72': 'PR',
+}
+
+# 标准化州名函数
+def standardize_state_name(state_name):
+    """将州名标准化为简称"""
+    if pd.isna(state_name):
+        return state_name
+    
+    # 转换为字符串并去除空格
+    state_str = str(state_name).strip()
+    
+    # 如果已经是简称（2个字符），直接返回
+    if len(state_str) == 2 and state_str.isalpha():
+        return state_str.upper()
+    
+    # 尝试从全称映射到简称；如果无法映射，返回原始值
+    return _STATE_LOOKUP.get(' '.join(state_str.lower().split()), state_str)
+
+def standardize_state_series(series):
+    """按唯一值标准化整列州名（避免逐行调用）"""
+    uniques = series.dropna().unique()
+    lookup = {value: standardize_state_name(value) for value in uniques}
+    return series.astype(object).map(lookup)
+
+def standardize_fips_series(series):
+    """将县FIPS代码标准化为5位字符串（补齐前导0，去掉Excel数值的".0"），无效值为NaN"""
+    codes = series.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    codes = codes.where(codes.str.fullmatch(r'\d{4,5}'))
+    return codes.str.zfill(5)
+
+# 辅助函数：将值转换为数值类型
+def to_numeric(value):
+    """将字符串或其他类型的值转换为数值类型"""
+    if pd.isna(value):
+        return np.nan
+    
+    try:
+        # 转换为字符串
+        str_val = str(value)
+        # 去除千分位逗号
+        str_val = str_val.replace(',', '')
+        # 转换为浮点数
+        return float(str_val)
+    except (ValueError, TypeError):
+        # 如果转换失败，返回np.nan
+        return np.nan
+
+def to_numeric_series(series):
+    """向量化版本的to_numeric：去除千分位逗号后整列转换，失败值为NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    cleaned = series.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+
+def unparsable_count(raw, parsed):
+    """原始值非空（且不是空白字符串）但转换结果为缺失的个数，只检查转换失败的行"""
+    candidates = parsed.isna().to_numpy() & raw.notna().to_numpy()
+    if not candidates.any():
+        return 0
+    return int(raw[candidates].astype(str).str.strip().ne('').sum())
+
+# 字段解析：根据表头确定每个标准字段对应的原始列名
+def _first_column(columns, predicate):
+    """返回第一个满足条件的原始列名（按小写、去空格后的列名匹配）"""
+    for col in columns:
+        if predicate(str(col).lower().strip()):
+            return col
+    return None
+
+def resolve_cdc_fields(columns):
+    """解析CDC表头，返回 {标准字段: 原始列名}"""
+    fields = {
+        'total_births': _first_column(columns, lambda c: 'birth' in c and 'rate' not in c),
+        'prenatal_visits': _first_column(columns, lambda c: 'prenatal' in c or 'visit' in c),
+        'state': _first_column(columns, lambda c: 'state' in c and 'county' not in c),
+        'year': _first_column(columns, lambda c: 'year' in c),
+        # 优先匹配母亲年龄，否则退回到更广泛的age匹配
+        'mother_age': (_first_column(columns, lambda c: 'age' in c and 'mother' in c)
+                       or _first_column(columns, lambda c: 'age' in c)),
+        'race': _first_column(columns, lambda c: 'race' in c),
+        # 县级数据（如CDC WONDER按县分组导出的County Code）
+        'county_fips': _first_column(columns, lambda c: 'county' in c and ('code' in c or 'fips' in c)),
+    }
+    return {field: col for field, col in fields.items() if col is not None}
+
+def resolve_hrsa_fields(columns):
+    """解析HRSA表头，返回 {标准字段: 原始列名}"""
+    fields = {
+        'gap_score': _first_column(columns, lambda c: 'hpsa' in c and 'score' in c),
+        'state': _first_column(columns, lambda c: 'state' in c and 'county' not in c),
+        # 如 "State and County Federal Information Processing Standard Code"
+        'county_fips': _first_column(columns, lambda c: 'county' in c and ('code' in c or 'fips' in c)),
+        # 指定/撤销日期，用于按年份判断HPSA是否有效
+        'designation_date': _first_column(
+            columns, lambda c: 'designation' in c and 'date' in c and 'update' not in c and 'withdr' not in c
+        ),
+        'withdrawn_date': _first_column(columns, lambda c: 'withdr' in c and 'date' in c),
+        # 认定记录的稳定编号（HPSA ID，没有时退回到HPSA Source ID），用于版本比较时匹配同一条记录
+        'hpsa_id': (_first_column(columns, lambda c: c.replace('_', ' ') == 'hpsa id')
+                    or _first_column(columns, lambda c: 'hpsa' in c and 'source id' in c.replace('_', ' '))),
+    }
+    return {field: col for field, col in fields.items() if col is not None}
+
+FIELD_RESOLVERS = {
+    'cdc': resolve_cdc_fields,
+    'hrsa': resolve_hrsa_fields,
+}
+
+# 各数据集的标准字段（按映射输出顺序）
+DATASET_FIELDS = {
+    'cdc': ['total_births', 'prenatal_visits', 'state', 'year', 'mother_age', 'race', 'county_fips'],
+    'hrsa': ['gap_score', 'state', 'county_fips', 'designation_date', 'withdrawn_date', 'hpsa_id'],
+}
+
+# 文本字段和日期字段，其余映射字段均按数值处理
+TEXT_FIELDS = {'state', 'race', 'county_fips', 'hpsa_id'}
+DATE_FIELDS = {'designation_date', 'withdrawn_date'}
+
+# 字段解析规则版本：规则变化后，自动解析的档案会重新解析（用户固定的档案保持不变）
+MAPPING_RULES_VERSION = 4
+
+def resolve_fields(columns, dataset):
+    """解析字段映射：表头签名命中档案时直接复用，否则按列名规则解析并保存为新档案"""
+    columns = list(columns)
+    signature = header_signature(columns, dataset)
+    profile = get_profile(signature)
+    if profile is not None and (profile.get('pinned') or profile.get('rules_version') == MAPPING_RULES_VERSION):
+        return fields_for_columns(profile, columns)
+    
+    field_map = FIELD_RESOLVERS[dataset](columns)
+    save_profile(signature, dataset, columns, field_map, rules_version=MAPPING_RULES_VERSION)
+    return field_map
+
+def projected_columns(columns, dataset):
+    """根据表头计算需要解析的列，返回 (列名列表, 显式dtype, 字段映射)；无法识别数据集时返回 (None, None, None)"""
+    if dataset not in FIELD_RESOLVERS:
+        return None, None, None
+    field_map = resolve_fields(columns, dataset)
+    # 去重并保持表头中的原始顺序
+    wanted = set(field_map.values())
+    usecols = [col for col in columns if col in wanted]
+    # 所有映射列先按字符串读取，再统一做向量化的数值/州名转换
+    dtypes = {col: str for col in usecols}
+    return usecols, dtypes, field_map
+
+def _tag_projection(df, header, field_map, dataset):
+    """在DataFrame上记录原始表头和字段映射，供字段映射面板和清理函数使用"""
+    df.attrs['source_columns'] = [str(col) for col in header]
+    df.attrs['field_map'] = dict(field_map)
+    return _tag_mapping_revision(df, header, dataset)
+
+def _tag_mapping_revision(df, header, dataset):
+    """记录表头签名和加载时该表头的映射修订号（缓存键和缓存校验使用）"""
+    signature = header_signature(header, dataset)
+    df.attrs['mapping_signature'] = signature
+    df.attrs['mapping_revision'] = profile_revision(signature)
+    return df
+
+def mapped_fields(df, dataset):
+    """返回DataFrame的字段映射：优先使用加载时记录的映射，否则按当前列名解析"""
+    field_map = df.attrs.get('field_map')
+    if field_map is None:
+        return resolve_fields(df.columns, dataset)
+    return {field: col for field, col in field_map.items() if col in df.columns}
+
+# 数据加载函数支持CSV/Excel文件（上传文件或任意二进制文件对象）
+# 注意：加载失败时直接抛出异常，由调用方决定如何提示；映射后的数据集由进程级共享缓存保存
+def load_data(uploaded_file, file_type, dataset=None):
+    """加载文件；指定dataset（'cdc'/'hrsa'）时先读取表头，只解析映射需要的列
+
+    加载结果的attrs记录表头签名（mapping_signature）和该表头的映射修订号（mapping_revision）
+    """
+    if file_type == 'csv':
+        # 尝试不同的编码格式读取CSV文件
+        encodings = ['utf-8', 'latin1', 'gbk', 'gb2312']
+        for encoding in encodings:
+            try:
+                return _read_csv_projected(uploaded_file, dataset, encoding=encoding)
+            except UnicodeDecodeError:
+                uploaded_file.seek(0)  # 重置文件指针
+                continue
+        # 如果所有编码都失败，替换无法解码的字符
+        uploaded_file.seek(0)  # 重置文件指针
+        return _read_csv_projected(uploaded_file, dataset, encoding='utf-8', encoding_errors='replace')
+    elif file_type == 'excel':
+        return _read_excel_projected(uploaded_file, dataset)
+    else:
+        return pd.DataFrame()
+
+def file_type_for(filename):
+    """根据文件名判断文件类型（'csv'或'excel'）"""
+    return 'csv' if str(filename).lower().endswith('.csv') else 'excel'
+
+def _read_csv_projected(uploaded_file, dataset, **read_kwargs):
+    """两阶段读取CSV：先嗅探表头解析字段映射，再只解析映射到的列"""
+    # 第一阶段：只读取表头
+    header = pd.read_csv(uploaded_file, nrows=0, **read_kwargs).columns.tolist()
+    uploaded_file.seek(0)  # 重置文件指针
+    
+    usecols, dtypes, field_map = projected_columns(header, dataset)
+    if not usecols:
+        # 未识别数据集或没有任何可映射列时，按原方式读取全部列
+        df = pd.read_csv(uploaded_file, **read_kwargs)
+        return _tag_mapping_revision(df, header, dataset) if dataset in FIELD_RESOLVERS else df
+    
+    # 第二阶段：只解析需要的列，并指定dtype避免类型推断
+    df = pd.read_csv(uploaded_file, usecols=usecols, dtype=dtypes, **read_kwargs)
+    return _tag_projection(df, header, field_map, dataset)
+
+# Excel列式缓存目录（按文件内容哈希命名，重复加载同一工作簿时直接读取列式文件）
+EXCEL_CACHE_DIR = os.environ.get('FEMTECH_CACHE_DIR', os.path.join('.cache', 'excel'))
+
+def _excel_engine():
+    """优先使用更快的calamine引擎，未安装时回退到pandas默认引擎"""
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None
+
+def content_hash(uploaded_file):
+    """按块计算上传文件内容的SHA-256哈希"""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1 << 20), b''):
+        digest.update(chunk)
+    uploaded_file.seek(0)  # 重置文件指针
+    return digest.hexdigest()
+
+def _excel_cache_path(digest, dataset):
+    """返回工作簿对应的列式缓存文件路径
+
+    缓存只保存投影后的列，文件名包含映射规则版本：规则升级后旧缓存不再命中，
+    重新按新规则解析需要读取的列。表头的映射修订号记录在缓存的attrs中，读取时校验。
+    """
+    return os.path.join(EXCEL_CACHE_DIR, f"{digest[:32]}-{dataset or 'all'}-v{MAPPING_RULES_VERSION}.parquet")
+
+def _read_cached_excel(cache_path):
+    """读取列式缓存；不存在、损坏，或该表头的映射在缓存后被固定/取消固定时返回None"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        cached = pd.read_parquet(cache_path)
+    except Exception:
+        # 缓存损坏或缺少parquet引擎时，重新读取工作簿
+        return None
+    signature = cached.attrs.get('mapping_signature')
+    if signature is not None and cached.attrs.get('mapping_revision') != profile_revision(signature):
+        return None
+    return cached
+
+def _read_excel_projected(uploaded_file, dataset):
+    """快速读取Excel：命中列式缓存直接返回，否则只读取需要的工作表和列并写入缓存"""
+    digest = content_hash(uploaded_file)
+    cache_path = _excel_cache_path(digest, dataset)
+    cached = _read_cached_excel(cache_path)
+    if cached is not None:
+        return cached
+    
+    engine = _excel_engine()
+    
+    # 第一阶段：读取所有工作表的表头，选择第一个能解析出字段映射的工作表
+    headers = pd.read_excel(uploaded_file, sheet_name=None, nrows=0, engine=engine)
+    uploaded_file.seek(0)  # 重置文件指针
+    
+    sheet_name, usecols, dtypes, field_map, header = 0, None, None, None, None
+    for name, sheet_header in headers.items():
+        sheet_usecols, sheet_dtypes, sheet_fields = projected_columns(sheet_header.columns.tolist(), dataset)
+        if sheet_usecols:
+            sheet_name, usecols, dtypes, field_map = name, sheet_usecols, sheet_dtypes, sheet_fields
+            header = sheet_header.columns.tolist()
+            break
+    
+    if not usecols:
+        # 未识别数据集或没有任何可映射列时，按原方式读取第一个工作表
+        df = pd.read_excel(uploaded_file, engine=engine)
+        return _tag_mapping_revision(df, df.columns, dataset) if dataset in FIELD_RESOLVERS else df
+    
+    # 第二阶段：只解析需要的工作表和列
+    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, usecols=usecols, dtype=dtypes, engine=engine)
+    df = _tag_projection(df, header, field_map, dataset)
+    
+    # 一次性转换为列式缓存；缓存失败不影响本次加载
+    try:
+        os.makedirs(EXCEL_CACHE_DIR, exist_ok=True)
+        df.to_parquet(cache_path, index=False)
+    except Exception:
+        pass
+    
+    return df
+
+# 数据清理与字段映射函数
+def clean_and_map_cdc_data(df):
+    """清理并映射CDC数据字段"""
+    if df.empty:
+        return df
+    
+    # 创建映射后的DataFrame
+    mapped_df = pd.DataFrame(index=df.index)
+    
+    # 按表头解析字段映射（复用映射档案，列名匹配时忽略大小写和空格）
+    field_map = mapped_fields(df, 'cdc')
+    unparsable = {}
+    
+    for field in DATASET_FIELDS['cdc']:
+        if field not in field_map:
+            continue
+        col = field_map[field]
+        if field == 'state':
+            # 标准化州名为简称
+            mapped_df['state'] = standardize_state_series(df[col])
+        elif field == 'county_fips':
+            mapped_df['county_fips'] = standardize_fips_series(df[col])
+        elif field in TEXT_FIELDS:
+            mapped_df[field] = df[col]
+        else:
+            # 应用数值转换，处理千分位逗号
+            mapped_df[field] = to_numeric_series(df[col])
+            unparsable[field] = unparsable_count(df[col], mapped_df[field])
+    
+    # 保留原始表头和字段映射，供字段映射面板使用；转换失败的个数供数据质量报告使用
+    mapped_df.attrs.update(df.attrs)
+    mapped_df.attrs['unparsable'] = unparsable
+    # 按 州 × 年份 分区存放（选择地区时只读取命中的分区）
+    return sort_into_partitions(mapped_df)
+
+def clean_and_map_hrsa_data(df):
+    """清理并映射HRSA数据字段"""
+    if df.empty:
+        return df
+    
+    # 创建映射后的DataFrame
+    mapped_df = pd.DataFrame(index=df.index)
+    
+    # 按表头解析字段映射（复用映射档案，列名匹配时忽略大小写和空格）
+    field_map = mapped_fields(df, 'hrsa')
+    unparsable = {}
+    
+    if 'gap_score' in field_map:
+        # 应用数值转换，处理混合数据类型
+        mapped_df['gap_score'] = to_numeric_series(df[field_map['gap_score']])
+        unparsable['gap_score'] = unparsable_count(df[field_map['gap_score']], mapped_df['gap_score'])
+    
+    if 'state' in field_map:
+        # 标准化州名为简称
+        mapped_df['state'] = standardize_state_series(df[field_map['state']])
+    
+    if 'county_fips' in field_map:
+        mapped_df['county_fips'] = standardize_fips_series(df[field_map['county_fips']])
+    
+    if 'hpsa_id' in field_map:
+        # 编号按文本保存（保留前导零）
+        mapped_df['hpsa_id'] = df[field_map['hpsa_id']].astype('string').str.strip()
+    
+    for field in DATASET_FIELDS['hrsa']:
+        if field in DATE_FIELDS and field in field_map:
+            # 日期解析失败的值为NaT
+            mapped_df[field] = pd.to_datetime(df[field_map[field]], errors='coerce')
+            unparsable[field] = unparsable_count(df[field_map[field]], mapped_df[field])
+    
+    # 保留原始表头和字段映射，供字段映射面板使用；转换失败的个数供数据质量报告使用
+    mapped_df.attrs.update(df.attrs)
+    mapped_df.attrs['unparsable'] = unparsable
+    # 按 州 × 年份 分区存放（选择地区时只读取命中的分区）
+    return sort_into_partitions(mapped_df)
+
+# 执行数据关联
+def merge_data(cdc_df, hrsa_df):
+    """关联CDC和HRSA数据"""
+    if cdc_df.empty or hrsa_df.empty:
+        return pd.DataFrame()
+    
+    # 确定连接键
+    has_state = 'state' in cdc_df.columns and 'state' in hrsa_df.columns
+    
+    if has_state:
+        # 先聚合，再合并（避免笛卡尔积）
+        # 1. 对CDC数据按州和年份聚合（保留年份维度）
+        # 聚合所有必要的列
+        cdc_agg = cdc_df.groupby(['state', 'year']).agg({
+            'total_births': 'sum',  # 总出生数
+            'prenatal_visits': 'mean',  # 平均产前检查次数
+            'mother_age': 'mean'  # 平均母亲年龄
+        }).reset_index()
+        
+        if 'designation_date' in hrsa_df.columns and hrsa_df['designation_date'].notna().any():
+            # 2. 有指定日期时，按年份关联：每个州×年份只统计当年有效的HPSA指定
+            designation_index = DesignationIndex.from_frame(hrsa_df)
+            gap_scores, active_counts = designation_index.lookup(cdc_agg['state'], cdc_agg['year'])
+            merged = cdc_agg.assign(gap_score=gap_scores, active_designations=active_counts)
+        else:
+            # 2. 对HRSA数据按州聚合（计算州级平均缺口分数）
+            hrsa_agg = hrsa_df.groupby('state').agg({
+                'gap_score': 'mean'  # 或'max'/'sum'，根据业务需求选择
+            }).reset_index()
+            
+            # 3. 再按州合并
+            merged = pd.merge(
+                cdc_agg, 
+                hrsa_agg, 
+                on=['state'], 
+                how='left'
+            )
+    else:
+        # 没有共同的连接键，返回空数据框（由调用方提示用户）
+        return pd.DataFrame()
+    
+    # 填充缺失值：如果某个州在CDC有数据但在HRSA没数据，HPSA Score设为0
+    if 'gap_score' in merged.columns:
+        merged['gap_score'] = merged['gap_score'].fillna(0)
+    
+    return merged
+
+# 县级关联：CDC按县×年份聚合，HRSA按县和有效年份关联
+def merge_county_data(cdc_df, hrsa_df):
+    """关联县级CDC和HRSA数据，返回每个县×年份一行（county_fips, state, year, total_births,
+    gap_score, active_designations）；HRSA数据没有县FIPS代码时返回空DataFrame
+
+    CDC数据没有县代码时只能得到县级HPSA分数：每个有指定的县与CDC中的年份组合，出生数为NaN。
+    """
+    if cdc_df.empty or hrsa_df.empty or 'county_fips' not in hrsa_df.columns or 'year' not in cdc_df.columns:
+        return pd.DataFrame()
+    hrsa = hrsa_df.dropna(subset=['county_fips'])
+    if hrsa.empty:
+        return pd.DataFrame()
+    
+    if 'county_fips' in cdc_df.columns and cdc_df['county_fips'].notna().any():
+        county_agg = cdc_df.dropna(subset=['county_fips']).groupby(['county_fips', 'year']).agg({
+            'total_births': 'sum'
+        }).reset_index()
+    else:
+        counties = pd.unique(hrsa['county_fips'])
+        years = np.sort(pd.unique(cdc_df['year'].dropna()))
+        county_agg = pd.DataFrame({
+            'county_fips': np.repeat(counties, len(years)),
+            'year': np.tile(years, len(counties)),
+            'total_births': np.nan,
+        })
+    
+    if 'designation_date' in hrsa.columns and hrsa['designation_date'].notna().any():
+        designation_index = DesignationIndex.from_frame(hrsa, key='county_fips')
+        gap_scores, active_counts = designation_index.lookup(county_agg['county_fips'], county_agg['year'])
+    else:
+        county_scores = hrsa.groupby('county_fips')['gap_score'].agg(['mean', 'count'])
+        gap_scores = county_agg['county_fips'].map(county_scores['mean']).to_numpy()
+        active_counts = county_agg['county_fips'].map(county_scores['count']).fillna(0).to_numpy(dtype='int64')
+    
+    county_agg.insert(1, 'state', county_agg['county_fips'].str[:2].map(STATE_FIPS))
+    merged = county_agg.assign(gap_score=gap_scores, active_designations=active_counts)
+    merged['gap_score'] = merged['gap_score'].fillna(0)
+    return merged
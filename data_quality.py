@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# 数据质量报告：对映射后的数据集做一次向量化扫描，统计缺失率、转换失败率、
+# 超出合理范围的值、无法识别的州、重复的 州×年份 记录和离群值。
+# 所有数值列（日期按年份）合并成一个二维数组后统一计算，不对每项检查单独扫描整表。
+
+# 合理取值范围（闭区间，None表示不限）
+VALID_RANGES = {
+    'total_births': (0, None),
+    'prenatal_visits': (0, 60),
+    'year': (1900, 2100),
+    'mother_age': (10, 60),
+    'gap_score': (0, 26),  # HPSA分数范围为0-25（牙科为0-26）
+    'designation_date': (1970, 2100),  # 日期字段按年份检查
+    'withdrawn_date': (1970, 2100),
+}
+
+# 离群值判定：超出四分位距（IQR）若干倍的值
+OUTLIER_IQR_MULTIPLIER = 3.0
+
+# 美国50州、哥伦比亚特区和海外领地的邮政简称
+US_STATE_CODES = frozenset([
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY',
+    'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND',
+    'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+    'DC', 'PR', 'GU', 'VI', 'AS', 'MP',
+])
+
+# 确定一条记录的字段（用于重复记录检查）：CDC为 州×年份，再加上文件中映射到的县和细分字段
+DUPLICATE_KEYS = {
+    'cdc': ['state', 'county_fips', 'year', 'race', 'mother_age'],
+    'hrsa': ['state', 'county_fips', 'designation_date', 'withdrawn_date', 'gap_score'],
+}
+
+
+def _numeric_block(df):
+    """把数值列和日期列（转为年份）合并成二维float数组，返回 (列名列表, 数组)"""
+    columns = []
+    arrays = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.dt.year.to_numpy(dtype='float64', na_value=np.nan)
+        elif pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            continue
+        columns.append(col)
+        arrays.append(values)
+    if not arrays:
+        return columns, np.empty((len(df), 0))
+    return columns, np.column_stack(arrays)
+
+
+def profile_dataset(df, dataset):
+    """生成数据集的质量报告
+
+    参数:
+    df: 映射后的数据集（attrs中带有转换失败个数）
+    dataset: 'cdc' 或 'hrsa'
+
+    返回:
+    dict，包含 rows、columns（每列一行的统计表）、unknown_states（无法识别的州及行数）、
+    duplicate_rows 和 duplicate_key
+    """
+    n_rows = len(df)
+    unparsable = df.attrs.get('unparsable', {})
+    numeric_cols, values = _numeric_block(df)
+
+    # 数值列：缺失、超范围和离群值在同一个二维数组上一次算出
+    missing = np.isnan(values)
+    lower = np.array([VALID_RANGES.get(col, (None, None))[0] for col in numeric_cols], dtype='float64')
+    upper = np.array([VALID_RANGES.get(col, (None, None))[1] for col in numeric_cols], dtype='float64')
+    with np.errstate(invalid='ignore'):
+        out_of_range = ((values < np.nan_to_num(lower, nan=-np.inf)) | (values > np.nan_to_num(upper, nan=np.inf))).sum(axis=0)
+        if n_rows and len(numeric_cols):
+            with warnings.catch_warnings():
+                # 整列缺失时分位数为NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                q1, q3 = np.nanpercentile(values, [25, 75], axis=0)
+            iqr = q3 - q1
+            outliers = ((values < q1 - OUTLIER_IQR_MULTIPLIER * iqr) | (values > q3 + OUTLIER_IQR_MULTIPLIER * iqr)).sum(axis=0)
+        else:
+            outliers = np.zeros(len(numeric_cols), dtype=int)
+    numeric_stats = {
+        col: (int(missing[:, i].sum()), int(out_of_range[i]), int(outliers[i]))
+        for i, col in enumerate(numeric_cols)
+    }
+
+    rows = []
+    for col in df.columns:
+        if col in numeric_stats:
+            null_count, range_count, outlier_count = numeric_stats[col]
+        else:
+            null_count, range_count, outlier_count = int(df[col].isna().sum()), 0, 0
+        bad_count = unparsable.get(col, 0)
+        rows.append({
+            'field': col,
+            'null_rate': null_count / n_rows if n_rows else 0.0,
+            # 转换失败的值也计入缺失，这里单独列出
+            'unparsable_rate': bad_count / n_rows if n_rows else 0.0,
+            'out_of_range': range_count,
+            'outliers': outlier_count,
+        })
+    columns = pd.DataFrame(rows, columns=['field', 'null_rate', 'unparsable_rate', 'out_of_range', 'outliers'])
+
+    # 无法识别的州：按唯一值判断，再统计行数
+    unknown_states = pd.Series(dtype='int64')
+    if 'state' in df.columns:
+        state_counts = df['state'].value_counts()
+        unknown_states = state_counts[~state_counts.index.isin(US_STATE_CODES)]
+
+    # 重复记录：关键字段组合完全相同的行（第一次出现的不计）
+    duplicate_key = [col for col in DUPLICATE_KEYS.get(dataset, []) if col in df.columns]
+    duplicate_rows = 0
+    if 'state' in duplicate_key and len(duplicate_key) > 1:
+        duplicate_rows = int(df.duplicated(subset=duplicate_key).sum())
+
+    return {
+        'rows': n_rows,
+        'columns': columns,
+        'unknown_states': unknown_states,
+        'duplicate_rows': duplicate_rows,
+        'duplicate_key': duplicate_key,
+    }
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+import api_server
+from data_pipeline import (
+    clean_and_map_cdc_data,
+    clean_and_map_hrsa_data,
+    content_hash,
+    file_type_for,
+    load_data,
+    merge_data,
+)
+from mapping_profiles import profile_revision
+from snapshots import snapshot_store
+
+# 监听本地数据目录：文件新增或变化时在后台线程重新加载并关联数据，
+# 构建完成后整体替换当前数据集版本。构建期间会话继续使用上一版本，不会阻塞或看到半成品。
+#
+# 目录中文件名包含 "cdc" / "hrsa"（不区分大小写）的CSV/Excel文件分别作为CDC和HRSA数据，
+# 同类文件有多个时使用最近修改的一个。
+
+DATA_DIR = os.environ.get('FEMTECH_DATA_DIR', '')
+# 轮询间隔（秒）
+POLL_SECONDS = float(os.environ.get('FEMTECH_DATA_POLL_SECONDS', '2'))
+# 防抖时间（秒）：文件在该时间内不再变化才开始重建，合并连续的写入/复制
+DEBOUNCE_SECONDS = float(os.environ.get('FEMTECH_DATA_DEBOUNCE_SECONDS', '3'))
+# 构建失败（文件仍在写入、被锁定或解析错误）后的重试间隔（秒），连续失败时加倍，最多为8倍
+RETRY_SECONDS = float(os.environ.get('FEMTECH_DATA_RETRY_SECONDS', '10'))
+
+DATA_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# 不可变的数据集版本
+DatasetVersion = namedtuple('DatasetVersion', [
+    'version', 'mapped_cdc', 'mapped_hrsa', 'merged', 'sources', 'built_at'
+])
+
+
+def find_source_files(data_dir):
+    """返回目录中最新的CDC和HRSA文件路径 {'cdc': path, 'hrsa': path}"""
+    latest = {}
+    try:
+        entries = list(os.scandir(data_dir))
+    except OSError:
+        return {}
+    for entry in entries:
+        name = entry.name.lower()
+        if not entry.is_file() or not name.endswith(DATA_EXTENSIONS) or name.startswith(('.', '~$')):
+            continue
+        for dataset in ('cdc', 'hrsa'):
+            if dataset in name:
+                mtime = entry.stat().st_mtime_ns
+                if dataset not in latest or mtime > latest[dataset][0]:
+                    latest[dataset] = (mtime, entry.path)
+    return {dataset: path for dataset, (_, path) in latest.items()}
+
+
+def directory_snapshot(data_dir, signatures=()):
+    """目录快照：数据文件的 (修改时间, 大小)，外加当前数据文件表头的映射修订号
+
+    参数:
+    signatures: 当前版本数据文件的表头签名；只有这些表头的映射被固定/取消固定时才触发重建
+    """
+    snapshot = {'mapping_revisions': tuple(profile_revision(signature) for signature in signatures)}
+    try:
+        entries = list(os.scandir(data_dir))
+    except OSError:
+        return snapshot
+    for entry in entries:
+        if entry.is_file() and entry.name.lower().endswith(DATA_EXTENSIONS):
+            stat = entry.stat()
+            snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def build_version(sources):
+    """加载、映射并关联数据文件，返回新的DatasetVersion（hash相同时版本号相同）"""
+    mapped = {}
+    hashes = []
+    for dataset, clean_and_map in (('cdc', clean_and_map_cdc_data), ('hrsa', clean_and_map_hrsa_data)):
+        path = sources[dataset]
+        with open(path, 'rb') as f:
+            hashes.append(content_hash(f))
+            raw = load_data(f, file_type_for(path), dataset=dataset)
+        mapped[dataset] = clean_and_map(raw)
+        hashes.append(str(mapped[dataset].attrs.get('mapping_revision', 0)))
+    version = hashlib.sha1('|'.join(hashes).encode('utf-8')).hexdigest()[:16]
+    merged = merge_data(mapped['cdc'], mapped['hrsa'])
+    return DatasetVersion(version, mapped['cdc'], mapped['hrsa'], merged, dict(sources), time.time())
+
+
+class DataDirectoryWatcher:
+    """后台轮询数据目录，防抖后重建数据集并原子替换当前版本"""
+
+    def __init__(self, data_dir, poll_seconds=POLL_SECONDS, debounce_seconds=DEBOUNCE_SECONDS,
+                 retry_seconds=RETRY_SECONDS):
+        self.data_dir = data_dir
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.retry_seconds = retry_seconds
+        self.current = None  # 当前DatasetVersion，只整体替换，不原地修改
+        self.building = False
+        self.last_error = None
+        self.builds = 0
+        self.failures = 0  # 当前快照连续构建失败的次数
+        self._stop = threading.Event()
+        self._thread = None
+        self._built_snapshot = None
+        self._signatures = ()  # 当前版本CDC/HRSA文件的表头签名
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='femtech-data-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+
+    def status(self):
+        """返回监听状态（用于侧边栏显示）"""
+        current = self.current
+        return {
+            'data_dir': self.data_dir,
+            'version': current.version if current else None,
+            'built_at': current.built_at if current else None,
+            'sources': current.sources if current else {},
+            'building': self.building,
+            'builds': self.builds,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        pending = None  # 尚未构建的快照
+        changed_at = 0.0
+        retry_at = 0.0
+        while not self._stop.is_set():
+            snapshot = directory_snapshot(self.data_dir, self._signatures)
+            if snapshot != self._built_snapshot:
+                now = time.monotonic()
+                if snapshot != pending:
+                    # 检测到新变化，重新计时（之前的失败不再推迟构建）
+                    pending = snapshot
+                    changed_at = now
+                    retry_at = 0.0
+                    self.failures = 0
+                elif now - changed_at >= self.debounce_seconds and now >= retry_at:
+                    if self._rebuild(snapshot):
+                        pending = None
+                        self.failures = 0
+                    else:
+                        # 同一快照稍后重试，连续失败时退避
+                        self.failures += 1
+                        retry_at = now + self.retry_seconds * min(2 ** (self.failures - 1), 8)
+            self._stop.wait(self.poll_seconds)
+
+    def _rebuild(self, snapshot):
+        """构建新版本；失败时保留上一版本并记录错误
+
+        返回:
+        快照是否已处理（构建成功或缺少数据文件）；构建失败时返回False，快照不记为已构建，之后重试
+        """
+        sources = find_source_files(self.data_dir)
+        if 'cdc' not in sources or 'hrsa' not in sources:
+            self._built_snapshot = snapshot
+            self.last_error = "Waiting for both CDC and HRSA files in the data directory."
+            return True
+        self.building = True
+        try:
+            new_version = build_version(sources)
+        except Exception as e:
+            self.last_error = f"Rebuild failed, keeping previous version (will retry): {e}"
+            return False
+        finally:
+            self.building = False
+        # 记录构建时实际使用的映射修订号：构建期间映射又被修改时，下次轮询会再次重建
+        mapped = (new_version.mapped_cdc, new_version.mapped_hrsa)
+        self._signatures = tuple(df.attrs.get('mapping_signature') for df in mapped)
+        self._built_snapshot = dict(
+            snapshot, mapping_revisions=tuple(df.attrs.get('mapping_revision', 0) for df in mapped)
+        )
+        self.last_error = None
+        self.builds += 1
+        if self.current is None or new_version.version != self.current.version:
+            # 原子替换：单次引用赋值，读取方要么看到旧版本要么看到完整的新版本
+            self.current = new_version
+            if not new_version.merged.empty:
+                api_server.publish(new_version.version, new_version.merged)
+                label = " + ".join(os.path.basename(path) for path in new_version.sources.values())
+                snapshot_store.record('watched', new_version.version, label, new_version.merged, new_version.mapped_hrsa)
+        return True
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def start_watcher(data_dir=DATA_DIR):
+    """启动进程内唯一的数据目录监听器；未配置数据目录时返回None"""
+    global _watcher
+    if not data_dir:
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DataDirectoryWatcher(data_dir).start()
+    return _watcher
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# 进程级共享数据集缓存：同一份数据只在进程内保存一次，所有会话共享只读视图
+#
+# Streamlit每次重跑都会重新执行app.py，但已导入的模块常驻进程，
+# 因此缓存对象放在模块级别即可跨会话共享。
+
+# 共享视图依赖写时复制（pandas 3起默认开启），保证会话内修改不会写回共享数据
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# 内存上限（MB），超过后按最近最少使用（LRU）淘汰旧版本数据集
+DEFAULT_MAX_MB = float(os.environ.get('FEMTECH_CACHE_MAX_MB', '1024'))
+
+
+# 缓存未命中的标记（构建结果本身可能是None，例如没有种族数据时的差异数组）
+_MISSING = object()
+
+
+class DatasetCache:
+    """带内存上限和LRU淘汰的共享数据集缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._parents = {}  # 派生条目key -> 其引用的数据集key
+        self._children = {}  # 数据集key -> 引用它的派生条目key集合
+        self._building = {}  # key -> threading.Lock，避免多个会话重复构建同一数据集
+        self._lock = threading.Lock()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, builder, parent=None):
+        """返回key对应的数据集视图；未命中时调用builder()构建并放入缓存
+
+        参数:
+        parent: 构建结果引用的数据集的缓存键（如数据集上的索引），见put()
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return _view(value)
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        # 同一key只允许一个线程构建，其余线程等待后直接命中
+        with build_lock:
+            with self._lock:
+                value = self._lookup(key, count_hit=False)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return _view(value)
+                self.misses += 1
+            try:
+                value = builder()
+                self.put(key, value, parent=parent)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return _view(value)
+
+    def put(self, key, value, parent=None):
+        """放入缓存；单个数据集超过内存上限时不缓存
+
+        索引等派生对象通过 .df 引用整个数据集：parent在缓存中时只统计对象自身，
+        并在parent被淘汰或替换时一并淘汰；否则引用的数据集计入该条目的内存占用。
+        """
+        with self._lock:
+            linked = parent is not None and parent in self._entries
+        nbytes = estimate_bytes(value, include_referenced=not linked)
+        with self._lock:
+            self._remove(key)
+            if linked and parent not in self._entries:
+                # 统计期间parent已被淘汰，改为计入引用的数据集
+                linked = False
+                nbytes = estimate_bytes(value)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.used_bytes += nbytes
+            if linked:
+                self._parents[key] = parent
+                self._children.setdefault(parent, set()).add(key)
+            self._evict()
+
+    def refresh(self, key):
+        """重新统计条目的内存占用（派生对象在放入缓存后继续增长时调用，如按需构建的排序顺序）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            linked = key in self._parents
+        if entry is None:
+            return
+        nbytes = estimate_bytes(entry[0], include_referenced=not linked)
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            self._entries[key] = (entry[0], nbytes)
+            self.used_bytes += nbytes - entry[1]
+            self._evict()
+
+    def clear(self):
+        """清空缓存（保留统计数据）"""
+        with self._lock:
+            self._entries.clear()
+            self._parents.clear()
+            self._children.clear()
+            self.used_bytes = 0
+
+    def stats(self):
+        """返回缓存指标：命中/未命中/淘汰次数、条目数和内存占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'used_bytes': self.used_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _lookup(self, key, count_hit=True):
+        """查找并标记为最近使用，不存在时返回_MISSING（调用方需持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        self._entries.move_to_end(key)
+        if count_hit:
+            self.hits += 1
+        return entry[0]
+
+    def _evict(self):
+        """按LRU顺序淘汰，直到内存占用不超过上限（调用方需持有锁）"""
+        while self.used_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        """移除条目及引用它的派生条目（调用方需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry[1]
+        parent = self._parents.pop(key, None)
+        if parent is not None:
+            self._children.get(parent, set()).discard(key)
+        for child in self._children.pop(key, ()):
+            self._remove(child)
+
+
+def estimate_bytes(value, include_referenced=True):
+    """估算缓存值占用的内存（DataFrame/Series按深度内存统计，元组/字典递归求和）
+
+    include_referenced: 索引等对象通过 .df 引用的数据集是否一并统计
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_bytes(item, include_referenced) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_bytes(item, include_referenced) for item in value.values())
+    nbytes = int(getattr(value, 'nbytes', 0))
+    referenced = getattr(value, 'df', None)
+    if include_referenced and isinstance(referenced, pd.DataFrame):
+        nbytes += estimate_bytes(referenced)
+    return nbytes
+
+
+def version_id(key):
+    """将缓存键转换为简短的数据集版本号（用于API ETag等）"""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+
+
+def _view(value):
+    """返回共享数据的浅拷贝视图：会话中新增/替换列不会影响缓存中的数据"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        items = [_view(item) for item in value]
+        # 保留命名元组的类型
+        return type(value)(*items) if hasattr(value, '_fields') else tuple(items)
+    if isinstance(value, dict):
+        return {key: _view(item) for key, item in value.items()}
+    return value
+
+
+# 进程内唯一的共享缓存实例
+shared_cache = DatasetCache(max_bytes=DEFAULT_MAX_MB * 1024 * 1024)
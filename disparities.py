@@ -0,0 +1,156 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from hpsa_intervals import DesignationIndex
+
+# 种族差异分析：把CDC数据整理成 种族 × 地区（州或县）× 年份 的三维数组（出生数、产前检查、
+# 缺口加权暴露），每个数据集版本只构建一次；比率和差异指数都在数组上向量化计算。
+#
+# 缺口加权暴露 = 出生数 × 该地区当年的HPSA缺口分数；暴露率 = 暴露 / 出生数，
+# 即该群体的出生平均面临的缺口分数。同一地区内各种族的缺口分数相同，
+# 暴露差异来自各种族在地区之间的分布，因此在汇总多个地区（或县级数据）时才有意义。
+
+DisparityCube = namedtuple('DisparityCube', [
+    'races', 'geos', 'geo_states', 'years', 'births', 'prenatal_sum', 'prenatal_weight', 'exposure'
+])
+
+# 比率指标：列名 -> 显示名称
+RATIO_METRICS = {
+    'prenatal_ratio': "Prenatal visits ratio",
+    'exposure_ratio': "Gap exposure ratio",
+    'birth_share_ratio': "Birth share ratio",
+}
+
+
+def build_disparity_cube(cdc_df, hrsa_df, geo='state'):
+    """构建 种族 × 地区 × 年份 数组
+
+    参数:
+    cdc_df: 映射后的CDC数据（需要race、total_births、year和地区列）
+    hrsa_df: 映射后的HRSA数据（用于每个地区×年份的缺口分数）
+    geo: 地区粒度，'state' 或 'county_fips'
+
+    返回:
+    DisparityCube；缺少必要字段时返回None
+    """
+    required = ['race', 'total_births', 'year', geo]
+    if cdc_df.empty or any(col not in cdc_df.columns for col in required):
+        return None
+    df = cdc_df.dropna(subset=required)
+    if df.empty:
+        return None
+
+    race_codes, races = pd.factorize(df['race'].astype(str), sort=True)
+    geo_codes, geos = pd.factorize(df[geo].astype(str), sort=True)
+    year_codes, years = pd.factorize(df['year'], sort=True)
+    shape = (len(races), len(geos), len(years))
+    flat = np.ravel_multi_index((race_codes, geo_codes, year_codes), shape)
+    size = int(np.prod(shape))
+
+    births = df['total_births'].to_numpy(dtype='float64')
+    if 'prenatal_visits' in df.columns:
+        prenatal = df['prenatal_visits'].to_numpy(dtype='float64')
+        has_prenatal = ~np.isnan(prenatal)
+        prenatal_sum = np.bincount(flat, weights=np.where(has_prenatal, prenatal * births, 0.0), minlength=size)
+        prenatal_weight = np.bincount(flat, weights=np.where(has_prenatal, births, 0.0), minlength=size)
+    else:
+        prenatal_sum = prenatal_weight = np.zeros(size)
+    births_total = np.bincount(flat, weights=births, minlength=size)
+
+    # 每个 地区×年份 的缺口分数（按年份关联有效的HPSA指定）
+    gap = _geo_year_gap(hrsa_df, geo, np.asarray(geos), np.asarray(years, dtype='float64'))
+    exposure = births_total.reshape(shape) * gap[None, :, :]
+
+    geo_states = np.asarray(geos) if geo == 'state' else (
+        df.groupby(geo_codes)['state'].first().reindex(range(len(geos))).to_numpy()
+        if 'state' in df.columns else np.full(len(geos), '', dtype=object)
+    )
+    return DisparityCube(
+        np.asarray(races), np.asarray(geos), geo_states, np.asarray(years),
+        births_total.reshape(shape), prenatal_sum.reshape(shape), prenatal_weight.reshape(shape), exposure
+    )
+
+
+def _geo_year_gap(hrsa_df, geo, geos, years):
+    """返回 地区 × 年份 的缺口分数矩阵（没有HPSA数据的地区为0，与州级关联一致）"""
+    gap = np.zeros((len(geos), len(years)))
+    if hrsa_df.empty or geo not in hrsa_df.columns or 'gap_score' not in hrsa_df.columns:
+        return gap
+    grid_geos = np.repeat(geos, len(years))
+    grid_years = np.tile(years, len(geos))
+    if 'designation_date' in hrsa_df.columns and hrsa_df['designation_date'].notna().any():
+        scores, _ = DesignationIndex.from_frame(hrsa_df, key=geo).lookup(grid_geos, grid_years)
+    else:
+        mean_scores = hrsa_df.groupby(hrsa_df[geo].astype(str))['gap_score'].mean()
+        scores = pd.Series(grid_geos).map(mean_scores).to_numpy(dtype='float64')
+    return np.nan_to_num(scores, nan=0.0).reshape(len(geos), len(years))
+
+
+def _select(cube, states=None, years=None):
+    """按州和年份筛选数组的地区、年份位置"""
+    geo_mask = np.isin(cube.geo_states, list(states)) if states else np.ones(len(cube.geos), dtype=bool)
+    year_mask = np.isin(cube.years, list(years)) if years else np.ones(len(cube.years), dtype=bool)
+    return geo_mask, year_mask
+
+
+def disparity_table(cube, reference, states=None, years=None):
+    """计算每个 地区 × 种族 的指标及相对参照种族的比率（年份汇总），并附加所有地区合计（geo='All'）
+
+    返回长表: geo, race, births, birth_share, prenatal_visits, exposure_rate, 以及RATIO_METRICS中的比率
+    """
+    geo_mask, year_mask = _select(cube, states, years)
+    geos = np.append(cube.geos[geo_mask], 'All')
+
+    def collapse(values):
+        # 汇总选中的年份，并在最后追加所有地区的合计
+        by_geo = values[:, geo_mask][:, :, year_mask].sum(axis=2)
+        return np.concatenate([by_geo, by_geo.sum(axis=1, keepdims=True)], axis=1)
+
+    births = collapse(cube.births)
+    prenatal_sum = collapse(cube.prenatal_sum)
+    prenatal_weight = collapse(cube.prenatal_weight)
+    exposure = collapse(cube.exposure)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        birth_share = births / births.sum(axis=0, keepdims=True)
+        prenatal = np.where(prenatal_weight > 0, prenatal_sum / prenatal_weight, np.nan)
+        exposure_rate = np.where(births > 0, exposure / births, np.nan)
+        ref = int(np.flatnonzero(cube.races == reference)[0])
+        ratios = {
+            'prenatal_ratio': prenatal / prenatal[ref],
+            'exposure_ratio': exposure_rate / exposure_rate[ref],
+            'birth_share_ratio': birth_share / birth_share[ref],
+        }
+
+    n_races, n_geos = births.shape
+    table = pd.DataFrame({
+        'geo': np.tile(geos, n_races),
+        'race': np.repeat(cube.races, n_geos),
+        'births': births.ravel(),
+        'birth_share': birth_share.ravel(),
+        'prenatal_visits': prenatal.ravel(),
+        'exposure_rate': exposure_rate.ravel(),
+        **{name: values.ravel() for name, values in ratios.items()},
+    })
+    # 没有出生记录的组合不参与比较
+    table.loc[table['births'] <= 0, list(RATIO_METRICS)] = np.nan
+    return table
+
+
+def disparity_index(table, metric, reference):
+    """差异指数（Pearcy-Keppel）：各非参照种族比率与1的平均绝对偏差（%），按地区从高到低排序"""
+    others = table[(table['race'] != reference) & table[metric].notna()]
+    deviation = (others[metric] - 1).abs() * 100
+    ranked = deviation.groupby(others['geo']).agg(['mean', 'max', 'count'])
+    ranked.columns = ['disparity_index', 'max_deviation', 'groups_compared']
+    # 偏差最大的种族
+    worst = others.loc[deviation.groupby(others['geo']).idxmax(), ['geo', 'race']].set_index('geo')['race']
+    ranked['most_divergent_race'] = worst
+    return ranked.sort_values('disparity_index', ascending=False).reset_index()
+
+
+def default_reference(cube):
+    """默认参照种族：出生数最多的种族"""
+    return cube.races[int(np.argmax(cube.births.sum(axis=(1, 2))))]
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# HPSA指定区间索引：按州 + 指定/撤销年份构建有序数组，向量化查询每个州×年份有效的指定
+#
+# 年份粒度规则：在某年内指定或撤销的区域，均视为该年有效。
+# 缺少指定日期视为一直有效；缺少撤销日期视为至今有效。
+
+# 组合键 = 州编码 * YEAR_SPAN + 年份
+YEAR_SPAN = 10000
+MIN_YEAR = 0
+MAX_YEAR = YEAR_SPAN - 1
+
+
+class DesignationIndex:
+    """HPSA指定的区间索引（有序起止年份数组 + 分数前缀和）"""
+
+    def __init__(self, states, start_keys, start_scores, start_counts, end_keys, end_scores, end_counts):
+        self.states = states
+        self.start_keys = start_keys
+        self.start_scores = start_scores
+        self.start_counts = start_counts
+        self.end_keys = end_keys
+        self.end_scores = end_scores
+        self.end_counts = end_counts
+
+    @classmethod
+    def from_frame(cls, hrsa_df, key='state'):
+        """从映射后的HRSA数据构建索引（需要key、gap_score、designation_date列）
+
+        key默认为州，也可以是县FIPS代码等其他地区字段
+        """
+        df = hrsa_df.dropna(subset=[key, 'gap_score'])
+        states = pd.Index(pd.unique(df[key].astype(str)))
+        codes = states.get_indexer(df[key].astype(str)).astype(np.int64)
+        scores = df['gap_score'].to_numpy(dtype='float64')
+
+        start_years = _year_array(df['designation_date'], MIN_YEAR)
+        if 'withdrawn_date' in df.columns:
+            end_years = _year_array(df['withdrawn_date'], MAX_YEAR)
+        else:
+            end_years = np.full(len(df), MAX_YEAR, dtype=np.int64)
+        # 撤销早于指定的异常记录按指定当年撤销处理
+        end_years = np.maximum(end_years, start_years)
+
+        start_keys, start_scores, start_counts = _sorted_prefix(codes * YEAR_SPAN + start_years, scores)
+        end_keys, end_scores, end_counts = _sorted_prefix(codes * YEAR_SPAN + end_years, scores)
+        return cls(states, start_keys, start_scores, start_counts, end_keys, end_scores, end_counts)
+
+    def lookup(self, states, years):
+        """查询每个 (州, 年份) 有效指定的平均分数和数量
+
+        返回:
+        (mean_scores, active_counts)，没有有效指定的位置平均分数为NaN
+        """
+        codes = self.states.get_indexer(pd.Index(states).astype(str)).astype(np.int64)
+        years = np.clip(np.asarray(years, dtype='float64'), MIN_YEAR, MAX_YEAR)
+        years = np.nan_to_num(years, nan=MIN_YEAR).astype(np.int64)
+        known = codes >= 0
+        base = np.where(known, codes, 0) * YEAR_SPAN
+        query = base + years
+
+        # 已开始：state相同且起始年份 <= year
+        lo = np.searchsorted(self.start_keys, base, side='left')
+        hi = np.searchsorted(self.start_keys, query, side='right')
+        started_sum = self.start_scores[hi] - self.start_scores[lo]
+        started_count = self.start_counts[hi] - self.start_counts[lo]
+
+        # 已结束：state相同且撤销年份 < year
+        lo = np.searchsorted(self.end_keys, base, side='left')
+        hi = np.searchsorted(self.end_keys, query, side='left')
+        ended_sum = self.end_scores[hi] - self.end_scores[lo]
+        ended_count = self.end_counts[hi] - self.end_counts[lo]
+
+        active_count = np.where(known, started_count - ended_count, 0)
+        active_sum = np.where(known, started_sum - ended_sum, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_scores = np.where(active_count > 0, active_sum / np.maximum(active_count, 1), np.nan)
+        return mean_scores, active_count
+
+
+def _year_array(dates, fill_year):
+    """将日期列转换为整数年份数组，缺失值填充为fill_year"""
+    years = pd.to_datetime(dates, errors='coerce').dt.year
+    return years.fillna(fill_year).to_numpy(dtype=np.int64)
+
+
+def _sorted_prefix(keys, scores):
+    """按键排序，返回 (有序键, 分数前缀和, 计数前缀和)，前缀和首位补0"""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    score_prefix = np.concatenate(([0.0], np.cumsum(scores[order])))
+    count_prefix = np.arange(len(keys) + 1, dtype=np.int64)
+    return sorted_keys, score_prefix, count_prefix
@@ -0,0 +1,58 @@
+import importlib
+import importlib.util
+import sys
+import threading
+
+# 延迟导入：返回一个模块代理，直到第一次访问其属性时才真正导入模块。
+# 用于只有部分页面才需要的重型依赖（例如plotly.express），缩短冷启动后首次渲染的时间。
+#
+# 不使用importlib.util.LazyLoader：Python 3.12.3之前，多个线程同时首次访问其属性时不安全，
+# 而Streamlit的各会话在不同线程中重跑。代理在锁内完成首次导入，之后直接转发属性访问。
+
+_proxies = {}  # 模块名 -> _LazyModule（同一进程内的所有重跑共用同一个代理）
+_proxies_lock = threading.Lock()
+
+
+class _LazyModule:
+    """模块代理：首次访问属性时在锁内导入模块"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_import(name):
+    """返回延迟加载的模块；模块已导入时直接返回"""
+    if name in sys.modules:
+        return sys.modules[name]
+    with _proxies_lock:
+        proxy = _proxies.get(name)
+        if proxy is None:
+            if importlib.util.find_spec(name) is None:
+                raise ImportError(f"No module named {name!r}")
+            proxy = _proxies[name] = _LazyModule(name)
+    return proxy
+
+
+def is_loaded(name):
+    """模块是否已真正导入（延迟模块在第一次访问属性前不算已加载）"""
+    return name in sys.modules
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+
+# 字段映射档案存储：按标准化表头的哈希保存已解析/用户固定的字段映射，跨会话持久化
+PROFILE_PATH = os.environ.get('FEMTECH_PROFILE_PATH', os.path.join('.cache', 'mapping_profiles.json'))
+
+_lock = threading.Lock()
+_store = None
+
+
+def normalize_column(col):
+    """标准化列名（转为小写并去除空格）"""
+    return str(col).lower().strip()
+
+
+def header_signature(columns, dataset):
+    """计算表头签名：数据集名称 + 标准化后的列名序列的SHA-1"""
+    digest = hashlib.sha1(str(dataset).encode('utf-8'))
+    for col in columns:
+        digest.update(b'\x1f')
+        digest.update(normalize_column(col).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_store():
+    """首次访问时从磁盘加载档案，之后使用进程内缓存"""
+    global _store
+    if _store is None:
+        try:
+            with open(PROFILE_PATH, 'r', encoding='utf-8') as f:
+                _store = json.load(f)
+        except (OSError, ValueError):
+            _store = {}
+        _store.setdefault('profiles', {})
+        _store.setdefault('revisions', {})
+    return _store
+
+
+def _persist(store):
+    """原子写入档案文件（先写临时文件再替换）"""
+    try:
+        os.makedirs(os.path.dirname(PROFILE_PATH) or '.', exist_ok=True)
+        tmp_path = f"{PROFILE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(store, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, PROFILE_PATH)
+    except OSError:
+        # 只读文件系统等情况下仅保留进程内档案
+        pass
+
+
+def get_profile(signature):
+    """返回签名对应的档案 {'dataset', 'columns', 'fields', 'pinned', 'rules_version'}，不存在时返回None"""
+    with _lock:
+        profile = _load_store()['profiles'].get(signature)
+        return dict(profile) if profile is not None else None
+
+
+def save_profile(signature, dataset, columns, fields, pinned=False, rules_version=None):
+    """保存字段映射档案；自动解析的结果不会覆盖用户固定的档案
+
+    参数:
+    fields: {标准字段: 原始列名}，以标准化列名保存
+    pinned: 是否为用户固定/覆盖的映射
+    rules_version: 生成该映射时的字段解析规则版本
+    """
+    with _lock:
+        store = _load_store()
+        existing = store['profiles'].get(signature)
+        if existing is not None and existing.get('pinned') and not pinned:
+            return
+        store['profiles'][signature] = {
+            'dataset': dataset,
+            'columns': [normalize_column(col) for col in columns],
+            'fields': {field: normalize_column(col) for field, col in fields.items()},
+            'pinned': bool(pinned),
+            'rules_version': rules_version,
+        }
+        if pinned:
+            # 固定映射会改变列投影，递增该表头的修订号使其已缓存的加载结果失效（其他表头不受影响）
+            _bump_revision(store, signature)
+        _persist(store)
+
+
+def delete_profile(signature):
+    """删除档案（取消固定），下次加载时重新自动解析"""
+    with _lock:
+        store = _load_store()
+        removed = store['profiles'].pop(signature, None)
+        if removed is not None:
+            if removed.get('pinned'):
+                _bump_revision(store, signature)
+            _persist(store)
+
+
+def _bump_revision(store, signature):
+    """递增表头的修订号（删除档案后保留，取消固定同样使旧结果失效）"""
+    store['revisions'][signature] = store['revisions'].get(signature, 0) + 1
+
+
+def profile_revision(signature):
+    """返回表头签名的映射修订号，用作加载缓存键的一部分；签名未知（None）或从未固定时为0"""
+    if signature is None:
+        return 0
+    with _lock:
+        return _load_store()['revisions'].get(signature, 0)
+
+
+def fields_for_columns(profile, columns):
+    """将档案中的标准化列名映射回当前表头的原始列名，忽略已不存在的列"""
+    raw_by_normalized = {}
+    for col in columns:
+        raw_by_normalized.setdefault(normalize_column(col), col)
+    return {
+        field: raw_by_normalized[col]
+        for field, col in profile['fields'].items()
+        if col in raw_by_normalized
+    }
@@ -0,0 +1,42 @@
+import os
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 每次脚本重跑的内存统计：FEMTECH_TRACE_MEMORY=1 时用tracemalloc记录重跑期间Python和NumPy/pandas分配的峰值
+# （tracemalloc会明显拖慢运行，默认关闭）；进程常驻内存峰值始终可用（Unix）。
+# 同一进程中多个会话并发重跑时，tracemalloc的峰值包含其他会话的分配。
+
+TRACE_MEMORY = os.environ.get('FEMTECH_TRACE_MEMORY', '0') == '1'
+
+
+def start_rerun():
+    """重跑开始时调用：重置峰值，返回当前已分配的字节数（未开启时返回None）"""
+    if not TRACE_MEMORY:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def finish_rerun(start_bytes):
+    """重跑结束时调用，返回 {'peak_bytes', 'retained_bytes', 'process_peak_bytes'}（不可用的项为None）"""
+    report = {'peak_bytes': None, 'retained_bytes': None, 'process_peak_bytes': process_peak_bytes()}
+    if start_bytes is not None and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report['peak_bytes'] = peak - start_bytes
+        report['retained_bytes'] = current - start_bytes
+    return report
+
+
+def process_peak_bytes():
+    """进程常驻内存（RSS）的历史峰值；不支持的平台返回None"""
+    if resource is None:
+        return None
+    # Linux上ru_maxrss以KB为单位，macOS上以字节为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# 分区存储：映射后的数据按 州 × 年份 排序存放，每个分区是一段连续的行；
+# 分区索引只记录每个分区的起止行位置，选择地区/州/年份时先在分区层面筛选（分区裁剪），
+# 再只读取命中分区的行，耗时与选中的行数成正比，而不是与全国数据的行数成正比。
+
+PARTITION_KEYS = ('state', 'year')
+
+
+def sort_into_partitions(df, keys=PARTITION_KEYS):
+    """按分区键稳定排序（缺失值在最后），使每个分区成为连续的行；已有序时直接返回"""
+    keys = [key for key in keys if key in df.columns]
+    if not keys or df.empty:
+        return df
+    order = np.lexsort([_sort_codes(df[key]) for key in reversed(keys)])
+    if np.array_equal(order, np.arange(len(df))):
+        return df
+    sorted_df = df.take(order)
+    sorted_df.attrs.update(df.attrs)
+    return sorted_df
+
+
+def _sort_codes(series):
+    """分区键的排序编码（缺失值编码为最大值，排在最后）"""
+    codes, _ = pd.factorize(series, sort=True)
+    return np.where(codes < 0, np.iinfo(codes.dtype).max, codes)
+
+
+class PartitionIndex:
+    """已按分区键排序的数据集的分区索引：分区 -> 连续行范围"""
+
+    def __init__(self, df, keys=PARTITION_KEYS):
+        self.df = df
+        self.keys = [key for key in keys if key in df.columns]
+        n_rows = len(df)
+        self._by_key = {}
+        self._by_state = {}
+        if not self.keys or n_rows == 0:
+            self.starts = np.zeros(1 if n_rows else 0, dtype=np.int64)
+            self.stops = np.full(len(self.starts), n_rows, dtype=np.int64)
+            self.values = {}
+            return
+        # 任一分区键变化的位置即分区边界（数据已排序，同一分区的行相邻）
+        changed = np.zeros(n_rows, dtype=bool)
+        changed[0] = True
+        for key in self.keys:
+            codes, _ = pd.factorize(df[key])
+            changed[1:] |= codes[1:] != codes[:-1]
+        self.starts = np.flatnonzero(changed).astype(np.int64)
+        self.stops = np.append(self.starts[1:], n_rows)
+        # 每个分区的键值（取分区第一行）
+        self.values = {key: df[key].to_numpy()[self.starts] for key in self.keys}
+        # 分区键 -> 分区编号，州 -> 该州的分区编号（升序）；选择时按键查找，不遍历全部分区
+        for number, key in enumerate(zip(*(self.values[key] for key in self.keys))):
+            self._by_key[key] = number
+            self._by_state.setdefault(key[0], []).append(number)
+
+    @property
+    def nbytes(self):
+        """索引数组占用的内存（不含引用的数据集；共享缓存按 dataset_cache.estimate_bytes 统计）"""
+        return self.starts.nbytes + self.stops.nbytes + sum(values.nbytes for values in self.values.values())
+
+    @property
+    def n_partitions(self):
+        return len(self.starts)
+
+    def partition_mask(self, states=None, years=None):
+        """返回命中的分区掩码（分区裁剪，只检查分区键值，不访问数据行）"""
+        mask = np.ones(self.n_partitions, dtype=bool)
+        if states is not None and 'state' in self.values:
+            mask &= np.isin(self.values['state'], list(states))
+        if years is not None and 'year' in self.values:
+            mask &= np.isin(self.values['year'], list(years))
+        return mask
+
+    def years(self, states=None):
+        """命中州的分区中出现的年份（升序，不含缺失值）"""
+        if 'year' not in self.values:
+            return []
+        values = pd.to_numeric(pd.Series(self.values['year'][self.partition_mask(states)]), errors='coerce')
+        return sorted(int(year) for year in values.dropna().unique())
+
+    def partition_numbers(self, states=None, years=None):
+        """按分区键查找命中的分区编号（升序），耗时与所选的 州 × 年份 组合数成正比；不过滤时返回None"""
+        if self.keys[:1] != ['state']:
+            mask = self.partition_mask(states, years)
+            return None if mask.all() else np.flatnonzero(mask)
+        if years is None or 'year' not in self.keys:
+            if states is None:
+                return None
+            numbers = [number for state in states for number in self._by_state.get(state, ())]
+        else:
+            states = self._by_state if states is None else states
+            numbers = [self._by_key[key] for key in ((state, year) for state in states for year in years)
+                       if key in self._by_key]
+        return np.unique(np.asarray(numbers, dtype=np.int64))
+
+    def positions(self, states=None, years=None):
+        """命中分区的行位置（升序）；不过滤或全部命中时返回None表示全部行"""
+        numbers = self.partition_numbers(states, years)
+        if numbers is None or len(numbers) == self.n_partitions:
+            return None
+        # 拼接各分区的行位置：每段为 start .. stop-1
+        starts, stops = self.starts[numbers], self.stops[numbers]
+        lengths = stops - starts
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def select(self, states=None, years=None):
+        """返回命中分区的行；全部命中时返回整个数据集，命中的分区连续时返回切片视图（不复制数据）"""
+        positions = self.positions(states, years)
+        if positions is None:
+            return self.df
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            return self.df.iloc[positions[0]:positions[-1] + 1]
+        return self.df.iloc[positions]
+
+
+def where_view(df, mask):
+    """按布尔条件过滤；全部满足时直接返回原数据（不复制）"""
+    mask = np.asarray(mask, dtype=bool)
+    return df if mask.all() else df[mask]
@@ -0,0 +1,44 @@
+import numpy as np
+
+# 散点图抽稀：把点按屏幕网格分箱，每个格子只保留一个代表点（优先级最高的点），
+# 大量重叠的点不再逐个绘制，同时保留每个区域的峰值和必须显示的点。
+
+# 网格大小（约等于图表的像素分辨率 / 标记大小）
+DEFAULT_GRID = (200, 120)
+
+
+def decimate_points(x, y, priority=None, keep=None, grid=DEFAULT_GRID):
+    """返回抽稀后保留的点位置（升序）
+
+    参数:
+    x, y: 坐标数组
+    priority: 优先级数组，每个网格保留优先级最高的点（默认保留第一个点）
+    keep: 布尔数组，为True的点总是保留（如需要标注的点）
+    grid: (横向格数, 纵向格数)
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    valid = np.isfinite(x) & np.isfinite(y)
+    positions = np.flatnonzero(valid)
+    if len(positions) == 0:
+        return positions
+
+    # 坐标映射到网格编号
+    cells = np.zeros(len(positions), dtype=np.int64)
+    for values, size, scale in ((x[valid], grid[0], 1), (y[valid], grid[1], grid[0])):
+        low, high = values.min(), values.max()
+        span = high - low if high > low else 1.0
+        cells += np.minimum(((values - low) / span * size).astype(np.int64), size - 1) * scale
+
+    # 按 (格子, 优先级降序) 排序后取每个格子的第一个点
+    if priority is None:
+        order = np.argsort(cells, kind='stable')
+    else:
+        ranks = -np.nan_to_num(np.asarray(priority, dtype='float64')[positions], nan=-np.inf)
+        order = np.lexsort((ranks, cells))
+    _, first = np.unique(cells[order], return_index=True)
+    kept = positions[order[first]]
+
+    if keep is not None:
+        kept = np.union1d(kept, np.flatnonzero(np.asarray(keep, dtype=bool) & valid))
+    return np.sort(kept)
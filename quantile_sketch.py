@@ -0,0 +1,206 @@
+import numpy as np
+
+# 可合并的近似分位数摘要（DDSketch式对数分桶）。
+#
+# 误差界：每个值落入宽度按比例增长的桶 (γ^(i-1), γ^i]，γ = (1+α)/(1-α)，桶的代表值为 2γ^i/(γ+1)。
+# 对任意分位数q，返回值与真实的第q分位数值（按 q·(n-1) 取下整的排名）之间的相对误差不超过α：
+#     |估计值 - 真实值| <= α · |真实值|
+# 该误差界与数据量、数据分布无关，并且在合并后仍然成立（合并只是桶计数相加，结果与对全部数据直接构建相同）。
+# 绝对值小于 MIN_MAGNITUDE 的值计为0。
+#
+# 摘要按数据分区（州 × 年份）构建一次，选择州和年份时只合并命中分区的桶计数，不再扫描数据行。
+
+RELATIVE_ACCURACY = 0.01
+MIN_MAGNITUDE = 1e-9
+
+
+def _gamma(alpha):
+    return (1 + alpha) / (1 - alpha)
+
+
+def bucket_indexes(values, alpha=RELATIVE_ACCURACY):
+    """值（取绝对值，需大于MIN_MAGNITUDE）对应的对数桶编号"""
+    return np.ceil(np.log(np.abs(values)) / np.log(_gamma(alpha))).astype(np.int64)
+
+
+class QuantileSketch:
+    """单个摘要：正值桶、负值桶（按绝对值分桶）和零值计数"""
+
+    def __init__(self, positive=None, positive_offset=0, negative=None, negative_offset=0, zero_count=0,
+                 alpha=RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self.positive = np.zeros(0, dtype=np.int64) if positive is None else np.asarray(positive, dtype=np.int64)
+        self.positive_offset = positive_offset
+        self.negative = np.zeros(0, dtype=np.int64) if negative is None else np.asarray(negative, dtype=np.int64)
+        self.negative_offset = negative_offset
+        self.zero_count = int(zero_count)
+
+    @classmethod
+    def from_values(cls, values, alpha=RELATIVE_ACCURACY):
+        """由一组值构建摘要（缺失值忽略）"""
+        values = np.asarray(values, dtype='float64')
+        values = values[np.isfinite(values)]
+        zero = np.abs(values) <= MIN_MAGNITUDE
+        stores = []
+        for side in (values[~zero & (values > 0)], -values[~zero & (values < 0)]):
+            if len(side) == 0:
+                stores.append((None, 0))
+                continue
+            buckets = bucket_indexes(side, alpha)
+            offset = int(buckets.min())
+            stores.append((np.bincount(buckets - offset), offset))
+        (positive, positive_offset), (negative, negative_offset) = stores
+        return cls(positive, positive_offset, negative, negative_offset, int(zero.sum()), alpha)
+
+    @property
+    def count(self):
+        return int(self.positive.sum() + self.negative.sum() + self.zero_count)
+
+    @property
+    def nbytes(self):
+        return self.positive.nbytes + self.negative.nbytes
+
+    def merge(self, other):
+        """返回合并后的新摘要（两个摘要的精度必须相同）"""
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        positive, positive_offset = _add_stores(self.positive, self.positive_offset, other.positive, other.positive_offset)
+        negative, negative_offset = _add_stores(self.negative, self.negative_offset, other.negative, other.negative_offset)
+        return QuantileSketch(positive, positive_offset, negative, negative_offset,
+                              self.zero_count + other.zero_count, self.alpha)
+
+    def _support(self):
+        """按数值升序排列的 (桶代表值, 计数)"""
+        gamma = _gamma(self.alpha)
+        negative_values = -2 * gamma ** (np.arange(len(self.negative)) + self.negative_offset) / (gamma + 1)
+        positive_values = 2 * gamma ** (np.arange(len(self.positive)) + self.positive_offset) / (gamma + 1)
+        values = np.concatenate([negative_values[::-1], [0.0], positive_values])
+        counts = np.concatenate([self.negative[::-1], [self.zero_count], self.positive])
+        nonzero = counts > 0
+        return values[nonzero], counts[nonzero]
+
+    def quantile(self, q):
+        """返回分位数的近似值（q可以是数值或数组）；摘要为空时返回NaN"""
+        q_array = np.atleast_1d(np.asarray(q, dtype='float64'))
+        values, counts = self._support()
+        if len(values) == 0:
+            result = np.full(len(q_array), np.nan)
+        else:
+            ranks = np.floor(np.clip(q_array, 0, 1) * (counts.sum() - 1))
+            result = values[np.searchsorted(np.cumsum(counts), ranks, side='right')]
+        return result if np.ndim(q) else float(result[0])
+
+    def rank(self, values):
+        """值的近似百分位排名（0-1，不大于该值的比例）"""
+        support, counts = self._support()
+        if len(support) == 0:
+            return np.full(len(np.atleast_1d(values)), np.nan)
+        cumulative = np.concatenate([[0], np.cumsum(counts)])
+        # 与分桶一致：按值所在桶的代表值比较
+        probes = self._representative(np.atleast_1d(np.asarray(values, dtype='float64')))
+        return cumulative[np.searchsorted(support, probes, side='right')] / counts.sum()
+
+    def _representative(self, values):
+        """值所在桶的代表值"""
+        gamma = _gamma(self.alpha)
+        result = np.zeros(len(values))
+        nonzero = np.isfinite(values) & (np.abs(values) > MIN_MAGNITUDE)
+        buckets = bucket_indexes(values[nonzero], self.alpha)
+        result[nonzero] = np.sign(values[nonzero]) * 2 * gamma ** buckets / (gamma + 1)
+        result[~np.isfinite(values)] = np.nan
+        return result
+
+    def histogram(self, bins=10):
+        """由桶计数近似的直方图：返回 (计数, 分箱边界)"""
+        values, counts = self._support()
+        if len(values) == 0:
+            return np.zeros(0), np.zeros(0)
+        return np.histogram(values, bins=bins, weights=counts)
+
+
+def _add_stores(left, left_offset, right, right_offset):
+    """按桶编号对齐后相加两组桶计数"""
+    if len(left) == 0:
+        return right.copy(), right_offset
+    if len(right) == 0:
+        return left.copy(), left_offset
+    offset = min(left_offset, right_offset)
+    total = np.zeros(max(left_offset + len(left), right_offset + len(right)) - offset, dtype=np.int64)
+    total[left_offset - offset:left_offset - offset + len(left)] += left
+    total[right_offset - offset:right_offset - offset + len(right)] += right
+    return total, offset
+
+
+class PartitionSketches:
+    """每个分区（州 × 年份）一个摘要，以 分区 × 桶 的计数矩阵存放；选择时只合并命中分区的行
+
+    参数:
+    df: 数据（每行一个值）
+    value_col: 构建摘要的列
+    max_col: 额外记录每个分区最大值的列（默认为value_col），供按选择范围归一化
+    """
+
+    def __init__(self, df, value_col, max_col=None, keys=('state', 'year'), alpha=RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self.keys = [key for key in keys if key in df.columns]
+        values = df[value_col].to_numpy(dtype='float64')
+        valid = np.isfinite(values)
+        if self.keys:
+            valid &= df[self.keys].notna().all(axis=1).to_numpy()
+        df, values = df[valid], values[valid]
+        max_values = values if max_col is None else df[max_col].to_numpy(dtype='float64')
+        if self.keys:
+            # 分区编号按首次出现的顺序，与size()的分组顺序一致
+            groups = df.groupby(self.keys, sort=False)
+            partition_codes = groups.ngroup().to_numpy()
+            partitions = groups.size().index
+            self.values = {key: partitions.get_level_values(level).to_numpy() for level, key in enumerate(self.keys)}
+        else:
+            partition_codes = np.zeros(len(values), dtype=np.int64)
+            self.values = {}
+        n_partitions = int(partition_codes.max()) + 1 if len(values) else 0
+        self.n_partitions = n_partitions
+        zero = np.abs(values) <= MIN_MAGNITUDE
+        self.zero_counts = np.bincount(partition_codes[zero], minlength=n_partitions)
+        # 分区 × 桶 计数矩阵（正值和负值各一个）
+        self.stores = []
+        for side in (values > 0, values < 0):
+            side &= ~zero
+            if not side.any():
+                self.stores.append((np.zeros((n_partitions, 0), dtype=np.int64), 0))
+                continue
+            buckets = bucket_indexes(values[side], alpha)
+            offset = int(buckets.min())
+            width = int(buckets.max()) - offset + 1
+            flat = partition_codes[side] * width + (buckets - offset)
+            counts = np.bincount(flat, minlength=n_partitions * width).reshape(n_partitions, width)
+            self.stores.append((counts, offset))
+        # 每个分区的最大值（用于按选择范围的最大值归一化）
+        self.maxima = np.full(n_partitions, np.nan)
+        if len(values):
+            np.fmax.at(self.maxima, partition_codes, max_values)
+
+    @property
+    def nbytes(self):
+        return (sum(counts.nbytes for counts, _ in self.stores) + self.zero_counts.nbytes + self.maxima.nbytes
+                + sum(values.nbytes for values in self.values.values()))
+
+    def partition_mask(self, states=None, years=None):
+        """命中的分区掩码（只检查分区键值）"""
+        mask = np.ones(self.n_partitions, dtype=bool)
+        if states is not None and 'state' in self.values:
+            mask &= np.isin(self.values['state'], list(states))
+        if years is not None and 'year' in self.values:
+            mask &= np.isin(self.values['year'], list(years))
+        return mask
+
+    def combine(self, states=None, years=None):
+        """合并所选州和年份的分区摘要，返回 (QuantileSketch, 所选分区的最大值)"""
+        mask = self.partition_mask(states, years)
+        (positive, positive_offset), (negative, negative_offset) = self.stores
+        sketch = QuantileSketch(
+            positive[mask].sum(axis=0), positive_offset, negative[mask].sum(axis=0), negative_offset,
+            int(self.zero_counts[mask].sum()), self.alpha
+        )
+        maximum = float(np.nanmax(self.maxima[mask])) if mask.any() and not np.isnan(self.maxima[mask]).all() else np.nan
+        return sketch, maximum
@@ -0,0 +1,65 @@
+import json
+import os
+
+from data_pipeline import STATE_MAPPING
+
+# 命名地区：地区名称 -> 州简称元组。同一份全国数据可以按任意地区查看，
+# 选择地区后只读取对应州的分区（见 partitions.py）。
+#
+# 可通过 FEMTECH_REGIONS_FILE 指定JSON文件（{"地区名称": ["AL", "GA", ...]}）添加或覆盖地区定义。
+
+REGIONS_FILE = os.environ.get('FEMTECH_REGIONS_FILE', '')
+
+ALL_STATES = 'All states'
+
+# 州简称 -> 全称
+STATE_NAMES = {abbreviation: full_name for full_name, abbreviation in STATE_MAPPING.items()}
+
+BUILTIN_REGIONS = {
+    'Deep South': ('AL', 'FL', 'GA', 'LA', 'MS', 'SC'),
+    # 阿巴拉契亚地区委员会（ARC）覆盖的州
+    'Appalachia': ('AL', 'GA', 'KY', 'MD', 'MS', 'NC', 'NY', 'OH', 'PA', 'SC', 'TN', 'VA', 'WV'),
+    'Southwest': ('AZ', 'NM', 'OK', 'TX'),
+    # 人口普查局四大区域
+    'Northeast': ('CT', 'MA', 'ME', 'NH', 'NJ', 'NY', 'PA', 'RI', 'VT'),
+    'Midwest': ('IA', 'IL', 'IN', 'KS', 'MI', 'MN', 'MO', 'ND', 'NE', 'OH', 'SD', 'WI'),
+    'South': ('AL', 'AR', 'DC', 'DE', 'FL', 'GA', 'KY', 'LA', 'MD', 'MS', 'NC', 'OK', 'SC', 'TN', 'TX', 'VA', 'WV'),
+    'West': ('AK', 'AZ', 'CA', 'CO', 'HI', 'ID', 'MT', 'NM', 'NV', 'OR', 'UT', 'WA', 'WY'),
+    ALL_STATES: tuple(sorted(STATE_NAMES)),
+}
+
+DEFAULT_REGION = os.environ.get('FEMTECH_DEFAULT_REGION', 'Deep South')
+
+
+def load_regions(path=REGIONS_FILE):
+    """返回内置地区加上配置文件中的地区（配置文件不存在或无效时只返回内置地区）"""
+    regions = dict(BUILTIN_REGIONS)
+    if not path:
+        return regions
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            custom = json.load(f)
+    except (OSError, ValueError):
+        return regions
+    for name, states in custom.items():
+        codes = tuple(sorted({str(state).strip().upper() for state in states} & set(STATE_NAMES)))
+        if codes:
+            regions[str(name)] = codes
+    return regions
+
+
+REGIONS = load_regions()
+
+
+def region_names():
+    """地区名称列表（默认地区在最前）"""
+    names = list(REGIONS)
+    if DEFAULT_REGION in REGIONS:
+        names.remove(DEFAULT_REGION)
+        names.insert(0, DEFAULT_REGION)
+    return names
+
+
+def region_states(name):
+    """地区包含的州简称（升序）；未知地区返回全部州"""
+    return tuple(sorted(REGIONS.get(name, REGIONS[ALL_STATES])))
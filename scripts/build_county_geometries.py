@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from county_geo import GEO_DIR, RESOLUTIONS, geometry_path, simplify_ring  # noqa: E402
+from data_pipeline import STATE_FIPS  # noqa: E402
+from regions import DEFAULT_REGION, REGIONS  # noqa: E402
+
+# 生成县级地图使用的本地几何文件：读取人口普查局县界文件（cartographic boundary shapefile，
+# 如 cb_2023_us_county_500k.shp 及同名 .dbf），筛选目标地区或州，按各精度级别简化并序列化为紧凑的GeoJSON。
+#
+# 用法:
+#   python scripts/build_county_geometries.py --shp cb_2023_us_county_500k.shp
+#   python scripts/build_county_geometries.py --shp cb_2023_us_county_500k.shp --region "All states"
+#   python scripts/build_county_geometries.py --shp cb_2023_us_county_500k.shp --states AL,FL,GA,LA,MS,SC,TN
+
+
+def read_dbf(path):
+    """读取dBASE属性表，返回记录列表（字段名 -> 去除空格的字符串）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    n_records, header_length, record_length = struct.unpack('<IHH', data[4:12])
+    fields = []
+    offset = 32
+    while data[offset] != 0x0D:
+        name = data[offset:offset + 11].split(b'\x00', 1)[0].decode('ascii')
+        fields.append((name, data[offset + 16]))
+        offset += 32
+    records = []
+    for i in range(n_records):
+        start = header_length + i * record_length + 1  # 跳过删除标记
+        record = {}
+        for name, length in fields:
+            record[name] = data[start:start + length].decode('latin-1').strip()
+            start += length
+        records.append(record)
+    return records
+
+
+def read_polygons(path):
+    """读取shapefile中的多边形，返回每条记录的环列表（每个环为N×2的经纬度数组）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    shapes = []
+    offset = 100
+    while offset < len(data):
+        _, content_length = struct.unpack('>ii', data[offset:offset + 8])
+        content = data[offset + 8:offset + 8 + content_length * 2]
+        offset += 8 + content_length * 2
+        shape_type = struct.unpack('<i', content[:4])[0]
+        if shape_type == 0:
+            shapes.append([])
+            continue
+        if shape_type not in (5, 15, 25):
+            raise ValueError(f"Unsupported shape type {shape_type}; expected polygons")
+        n_parts, n_points = struct.unpack('<ii', content[36:44])
+        parts = np.frombuffer(content, dtype='<i4', count=n_parts, offset=44)
+        points = np.frombuffer(content, dtype='<f8', count=n_points * 2, offset=44 + 4 * n_parts).reshape(-1, 2)
+        bounds = list(parts) + [n_points]
+        shapes.append([points[bounds[i]:bounds[i + 1]] for i in range(n_parts)])
+    return shapes
+
+
+def _is_clockwise(ring):
+    """环是否为顺时针（shapefile外环为顺时针，内环为逆时针）"""
+    x, y = ring[:, 0], ring[:, 1]
+    return np.sum((x[1:] - x[:-1]) * (y[1:] + y[:-1])) > 0
+
+
+def simplify_shape(rings, tolerance, decimals):
+    """简化一个县的所有环，返回GeoJSON几何；全部退化时返回None"""
+    polygons = []
+    for ring in rings:
+        simplified = simplify_ring(ring, tolerance)
+        if simplified is None:
+            continue
+        simplified = np.round(simplified, decimals)
+        # 去掉取整后相邻重复的点
+        distinct = np.concatenate(([True], np.any(simplified[1:] != simplified[:-1], axis=1)))
+        simplified = simplified[distinct]
+        if len(simplified) < 4:
+            continue
+        if _is_clockwise(ring) or not polygons:
+            polygons.append([simplified.tolist()])
+        else:
+            polygons[-1].append(simplified.tolist())
+    if not polygons:
+        # 面积很小的县：使用未简化的外环，避免地图上缺失
+        outer = np.round(rings[0], decimals)
+        polygons = [[outer.tolist()]]
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build simplified county geometries for the county choropleth")
+    parser.add_argument('--shp', required=True, help="Census cartographic boundary county shapefile (.shp)")
+    parser.add_argument('--region', default=DEFAULT_REGION, choices=list(REGIONS),
+                        help="Named region whose states to include")
+    parser.add_argument('--states', help="Comma-separated state abbreviations to include (overrides --region)")
+    parser.add_argument('--out', default=GEO_DIR, help="Output directory")
+    args = parser.parse_args()
+
+    if args.states:
+        states = {state.strip().upper() for state in args.states.split(',') if state.strip()}
+    else:
+        states = set(REGIONS[args.region])
+    records = read_dbf(os.path.splitext(args.shp)[0] + '.dbf')
+    shapes = read_polygons(args.shp)
+    counties = []
+    for record, rings in zip(records, shapes):
+        state = STATE_FIPS.get(record.get('STATEFP', ''))
+        if state in states and rings:
+            fips = record.get('GEOID') or record['STATEFP'] + record['COUNTYFP']
+            counties.append((fips, record.get('NAME', ''), state, rings))
+    counties.sort(key=lambda county: county[0])
+    print(f"{len(counties)} counties in {', '.join(sorted(states))}")
+
+    os.makedirs(args.out, exist_ok=True)
+    for resolution, (tolerance, decimals) in RESOLUTIONS.items():
+        features = [
+            {
+                'type': 'Feature',
+                'id': fips,
+                'properties': {'name': name, 'state': state},
+                'geometry': simplify_shape(rings, tolerance, decimals),
+            }
+            for fips, name, state, rings in counties
+        ]
+        path = os.path.join(args.out, os.path.basename(geometry_path(resolution)))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+        print(f"{resolution:>6}: {os.path.getsize(path) / 1024:,.0f} KB -> {path}")
+
+
+if __name__ == '__main__':
+    main()
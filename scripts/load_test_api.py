@@ -0,0 +1,94 @@
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# 本地JSON聚合API压测脚本：并发请求各端点，统计吞吐量、延迟分位数、状态码和传输字节数
+#
+# 用法（先启动应用或 python api_server.py --cdc ... --hrsa ...）:
+#   python scripts/load_test_api.py --requests 2000 --concurrency 20
+#   python scripts/load_test_api.py --no-etag --no-gzip   # 对比不使用缓存验证/压缩的情况
+
+DEFAULT_ENDPOINTS = [
+    '/api/v1/state-aggregates',
+    '/api/v1/opportunity',
+    '/api/v1/choropleth?metric=gap_score',
+    '/api/v1/trends',
+]
+
+
+def fetch(url, etag=None, use_gzip=True):
+    """发送一次GET请求，返回 (状态码, 响应字节数, 耗时秒, ETag)"""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if use_gzip:
+        headers['Accept-Encoding'] = 'gzip'
+    request = urllib.request.Request(url, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            return response.status, len(body), time.perf_counter() - start, response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, len(body), time.perf_counter() - start, e.headers.get('ETag')
+
+
+def percentile(values, q):
+    """计算分位数（q取0-100）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the local FemTech BI aggregates API")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8502')
+    parser.add_argument('--endpoint', action='append', dest='endpoints',
+                        help="Endpoint path to request (repeatable); defaults to all aggregate endpoints")
+    parser.add_argument('--requests', type=int, default=1000, help="Total number of requests")
+    parser.add_argument('--concurrency', type=int, default=10, help="Number of concurrent clients")
+    parser.add_argument('--no-etag', action='store_true', help="Do not send If-None-Match")
+    parser.add_argument('--no-gzip', action='store_true', help="Do not request gzip encoding")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints or DEFAULT_ENDPOINTS
+    urls = [args.base_url.rstrip('/') + endpoint for endpoint in endpoints]
+
+    # 预热：每个端点请求一次，记录ETag供后续轮询使用
+    etags = {}
+    for url in urls:
+        status, _, _, etag = fetch(url, use_gzip=not args.no_gzip)
+        if status != 200:
+            print(f"Warm-up request to {url} returned {status}")
+        etags[url] = None if args.no_etag else etag
+
+    def worker(i):
+        url = urls[i % len(urls)]
+        return fetch(url, etag=etags[url], use_gzip=not args.no_gzip)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [result[2] * 1000 for result in results]
+    statuses = Counter(result[0] for result in results)
+    total_bytes = sum(result[1] for result in results)
+
+    print(f"Requests:     {len(results)} over {elapsed:.2f}s ({len(results) / elapsed:,.0f} req/s)")
+    print(f"Concurrency:  {args.concurrency}")
+    print(f"Status codes: {dict(sorted(statuses.items()))}")
+    print(f"Bytes:        {total_bytes:,} total, {total_bytes / len(results):,.0f} avg per response")
+    print(f"Latency ms:   mean {statistics.mean(latencies):.2f}, p50 {percentile(latencies, 50):.2f}, "
+          f"p95 {percentile(latencies, 95):.2f}, p99 {percentile(latencies, 99):.2f}, max {max(latencies):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# 冷启动报告：在新的Python进程中（已导入Streamlit，与服务器进程的状态一致）首次运行应用脚本，
+# 测量首次渲染时间（脚本开始到第一个页面元素发送）和完整渲染时间，并列出脚本运行期间导入耗时最多的模块。
+# 首次渲染超过预算、或无数据时加载了应延迟加载的模块时以非零状态退出，可作为回归检查。
+#
+# 用法:
+#   python scripts/startup_report.py
+#   python scripts/startup_report.py --budget 0.5 --top 20
+
+# 首次渲染时间预算（秒）
+DEFAULT_BUDGET_SECONDS = float(os.environ.get('FEMTECH_FIRST_PAINT_BUDGET', '0.5'))
+
+# 无数据的首页不应加载的模块：应用脚本中所有 lazy_import('...') 的模块（只在绘制图表或特定标签页时加载）
+
+MARKER = '=== script run ==='
+
+# 在子进程中执行：记录第一个页面元素发送的时间
+CHILD_CODE = '''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+sys.path.insert(0, {app_dir!r})
+from lazy_imports import is_loaded
+
+first_paint = []
+original_enqueue = ScriptRunContext.enqueue
+
+def enqueue(self, msg):
+    if not first_paint and msg.HasField('delta'):
+        first_paint.append(time.perf_counter())
+    return original_enqueue(self, msg)
+
+ScriptRunContext.enqueue = enqueue
+at = AppTest.from_file({app_path!r}, default_timeout=120)
+# Streamlit自身已导入的模块（例如其plotly主题导入的plotly.graph_objects）无法由应用延迟
+preloaded = [name for name in {deferred!r} if is_loaded(name)]
+print({marker!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+at.run()
+end = time.perf_counter()
+print(json.dumps({{
+    'first_paint': first_paint[0] - start if first_paint else None,
+    'render': end - start,
+    'exceptions': [str(e.value) for e in at.exception],
+    'preloaded': preloaded,
+    'deferred_loaded': [name for name in {deferred!r} if is_loaded(name) and name not in preloaded],
+}}))
+'''
+
+
+def deferred_modules(app_path):
+    """从应用脚本中找出所有 lazy_import('模块名') 调用的模块名（按出现顺序）"""
+    with open(app_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=app_path)
+    names = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'lazy_import'
+                and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            if node.args[0].value not in names:
+                names.append(node.args[0].value)
+    return names
+
+
+def parse_importtime(lines):
+    """解析 -X importtime 输出，返回脚本直接触发的导入 [(模块, 累计毫秒)]"""
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if name.startswith('  ') or not cumulative.strip().isdigit():
+            continue  # 嵌套导入已计入上层模块的累计时间
+        entries.append((name.strip(), int(cumulative) / 1000))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure FemTech BI cold-start time to first paint")
+    parser.add_argument('--app', default=os.path.join(os.path.dirname(__file__), '..', 'app.py'))
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help="Maximum allowed time to first paint in seconds")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(args.app)
+    app_dir = os.path.dirname(app_path)
+    deferred = deferred_modules(app_path)
+    code = CHILD_CODE.format(app_dir=app_dir, app_path=app_path, marker=MARKER, deferred=deferred)
+    # 无数据冷启动：不监听数据目录，不启动本地API
+    env = dict(os.environ, FEMTECH_DATA_DIR='', FEMTECH_API_ENABLED='0')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=app_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit(result.returncode)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    stderr_lines = result.stderr.splitlines()
+    run_lines = stderr_lines[stderr_lines.index(MARKER) + 1:] if MARKER in stderr_lines else []
+    imports = sorted(parse_importtime(run_lines), key=lambda item: item[1], reverse=True)
+
+    print(f"Imports during the first script run ({sum(ms for _, ms in imports):,.0f} ms total):")
+    for name, ms in imports[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    first_paint = report['first_paint']
+    print(f"Time to first paint: {first_paint * 1000:,.0f} ms (budget {args.budget * 1000:,.0f} ms)"
+          if first_paint is not None else "Time to first paint: no elements rendered")
+    print(f"Full first render:   {report['render'] * 1000:,.0f} ms")
+    print(f"Deferred modules checked: {', '.join(deferred)}")
+    if report['preloaded']:
+        print(f"  already imported by Streamlit before the script run: {', '.join(report['preloaded'])}")
+
+    failures = []
+    if report['exceptions']:
+        failures.append(f"app raised: {report['exceptions']}")
+    if first_paint is None or first_paint > args.budget:
+        failures.append("time to first paint is over budget")
+    if report['deferred_loaded']:
+        failures.append(f"deferred modules loaded without data: {', '.join(report['deferred_loaded'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
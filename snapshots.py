@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from aggregates import opportunity_ranking
+from dataset_cache import estimate_bytes
+
+# 数据集版本快照与差异比较
+#
+# 每次加载得到新的数据集版本时记录一个不可变快照（只保存引用，数据本身由写时复制保证不被修改）。
+# 差异比较按记录键（关联数据为 州×年份，HRSA为 HPSA ID，没有时为 州×认定日期）对每行计算64位哈希，
+# 再用一次向量化关联找出新增、删除和变化的行，不逐行比较。
+#
+# 快照引用的数据不在共享数据集缓存中统计，因此存储单独设置内存上限，超过时按记录时间淘汰最旧的快照。
+
+# 每条版本线保留的快照个数
+MAX_SNAPSHOTS = int(os.environ.get('FEMTECH_SNAPSHOT_LIMIT', '5'))
+# 最多保留的版本线个数（每个上传会话一条，自动加载的数据一条）
+MAX_LINEAGES = 32
+# 所有快照引用的数据合计的内存上限（MB）
+MAX_SNAPSHOT_MB = float(os.environ.get('FEMTECH_SNAPSHOT_MAX_MB', '256'))
+
+# 各数据集比较时使用的记录键（按优先顺序，使用两个版本都包含的第一组）
+DIFF_KEYS = {
+    'merged': [['state', 'year']],
+    # 行顺序无关的稳定编号优先；州×认定日期在同一州同日多条认定时依赖出现序号区分
+    'hrsa': [['hpsa_id'], ['state', 'designation_date']],
+}
+
+# 不可变的数据集快照（nbytes为引用数据的估算内存）
+Snapshot = namedtuple('Snapshot', ['version', 'label', 'created_at', 'merged', 'mapped_hrsa', 'nbytes'])
+
+
+class SnapshotStore:
+    """按版本线保存最近的数据集快照"""
+
+    def __init__(self, max_snapshots=MAX_SNAPSHOTS, max_lineages=MAX_LINEAGES, max_bytes=MAX_SNAPSHOT_MB * 1024 * 1024):
+        self.max_snapshots = max_snapshots
+        self.max_lineages = max_lineages
+        self.max_bytes = int(max_bytes)
+        self._lineages = OrderedDict()  # 版本线 -> [Snapshot]（从旧到新）
+        self._lock = threading.Lock()
+
+    def record(self, lineage, version, label, merged, mapped_hrsa):
+        """记录新版本；版本与该版本线最新快照相同时不重复记录"""
+        with self._lock:
+            history = self._lineages.get(lineage)
+            if history and history[-1].version == version:
+                self._lineages.move_to_end(lineage)
+                return history[-1]
+        # 估算内存（深度统计文本列）在锁外进行
+        nbytes = estimate_bytes(merged) + estimate_bytes(mapped_hrsa)
+        with self._lock:
+            history = self._lineages.setdefault(lineage, [])
+            self._lineages.move_to_end(lineage)
+            if history and history[-1].version == version:
+                return history[-1]
+            # 重新加载旧版本时移到最新位置
+            history[:] = [snapshot for snapshot in history if snapshot.version != version]
+            snapshot = Snapshot(version, label, time.time(), merged, mapped_hrsa, nbytes)
+            history.append(snapshot)
+            del history[:-self.max_snapshots]
+            while len(self._lineages) > self.max_lineages:
+                self._lineages.popitem(last=False)
+            self._evict(snapshot)
+            return snapshot
+
+    @property
+    def used_bytes(self):
+        """所有快照引用的数据的估算内存"""
+        with self._lock:
+            return sum(snapshot.nbytes for history in self._lineages.values() for snapshot in history)
+
+    def _evict(self, keep):
+        """超过内存上限时按记录时间淘汰最旧的快照，刚记录的快照keep保留（调用方需持有锁）"""
+        used = sum(snapshot.nbytes for history in self._lineages.values() for snapshot in history)
+        candidates = sorted(
+            ((snapshot.created_at, lineage, snapshot.version, snapshot.nbytes)
+             for lineage, history in self._lineages.items() for snapshot in history if snapshot is not keep),
+            key=lambda candidate: candidate[0]
+        )
+        for _, lineage, version, nbytes in candidates:
+            if used <= self.max_bytes:
+                break
+            history = [snapshot for snapshot in self._lineages[lineage] if snapshot.version != version]
+            if history:
+                self._lineages[lineage] = history
+            else:
+                del self._lineages[lineage]
+            used -= nbytes
+
+    def history(self, lineage):
+        """返回版本线的快照列表（从旧到新）"""
+        with self._lock:
+            return list(self._lineages.get(lineage, []))
+
+
+def _row_hashes(df, key_cols, value_cols):
+    """返回每行的键哈希和值哈希（uint64）
+
+    键哈希始终包含出现序号（同一键的第几行），重复键的行按值哈希排序后编号，
+    因此结果与行的先后顺序无关：同一键下内容相同的行总能互相匹配。
+    """
+    n_rows = len(df)
+    if n_rows == 0:
+        return np.zeros(0, dtype='uint64'), np.zeros(0, dtype='uint64')
+    value_hash = pd.util.hash_pandas_object(df[value_cols], index=False).to_numpy() if value_cols else np.zeros(n_rows, dtype='uint64')
+    record_hash = pd.util.hash_pandas_object(df[key_cols], index=False).to_numpy() if key_cols else np.zeros(n_rows, dtype='uint64')
+    # 按 (键, 值) 排序，出现序号 = 行在同一键分组内的位置
+    order = np.lexsort((value_hash, record_hash))
+    sorted_keys = record_hash[order]
+    group_starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    sizes = np.diff(np.append(group_starts, n_rows))
+    occurrence = np.empty(n_rows, dtype=np.int64)
+    occurrence[order] = np.arange(n_rows) - np.repeat(group_starts, sizes)
+    key_hash = pd.util.hash_pandas_object(
+        pd.DataFrame({'key': record_hash, 'occurrence': occurrence}), index=False
+    ).to_numpy()
+    return key_hash, value_hash
+
+
+def diff_keys(dataset, old, new):
+    """两个版本都包含的第一组候选记录键（都不满足时返回最后一组中两边都有的字段）"""
+    candidates = DIFF_KEYS[dataset]
+    for key_cols in candidates:
+        if all(col in old.columns and col in new.columns for col in key_cols):
+            return key_cols
+    return candidates[-1]
+
+
+def diff_frames(old, new, key_cols):
+    """比较两个版本的数据集
+
+    参数:
+    old: 旧版本数据
+    new: 新版本数据
+    key_cols: 记录键字段
+
+    返回:
+    dict，包含 added（新增行）、removed（删除行）、changed（变化的字段，长表：键、field、old、new）、
+    changed_rows、unchanged_rows、columns_added 和 columns_removed
+    """
+    key_cols = [col for col in key_cols if col in old.columns and col in new.columns]
+    value_cols = [col for col in new.columns if col in old.columns and col not in key_cols]
+    old_key, old_value = _row_hashes(old, key_cols, value_cols)
+    new_key, new_value = _row_hashes(new, key_cols, value_cols)
+
+    # 按键哈希关联：两边分别排序后二分查找（有序查询对缓存友好），64位哈希碰撞概率可忽略
+    old_order = np.argsort(old_key)
+    new_order = np.argsort(new_key)
+    sorted_old = old_key[old_order]
+    sorted_new = new_key[new_order]
+    slots = np.minimum(np.searchsorted(sorted_new, sorted_old), max(len(new_key) - 1, 0))
+    matched = sorted_new[slots] == sorted_old if len(new_key) else np.zeros(len(old_key), dtype=bool)
+    old_matched = old_order[matched]
+    new_matched = new_order[slots[matched]]
+    removed_pos = np.sort(old_order[~matched])
+    in_old = np.zeros(len(new_key), dtype=bool)
+    in_old[new_matched] = True
+    added_pos = np.flatnonzero(~in_old)
+    differs = old_value[old_matched] != new_value[new_matched]
+    old_pos = old_matched[differs]
+    new_pos = new_matched[differs]
+
+    # 变化的行逐字段比较，只列出值不同的字段
+    old_changed = old.iloc[old_pos].reset_index(drop=True)
+    new_changed = new.iloc[new_pos].reset_index(drop=True)
+    parts = []
+    for col in value_cols:
+        before = old_changed[col]
+        after = new_changed[col]
+        differs = ~((before == after) | (before.isna() & after.isna())).to_numpy(dtype=bool)
+        if differs.any():
+            part = new_changed.loc[differs, key_cols].copy()
+            part['field'] = col
+            part['old'] = before[differs].astype(object)
+            part['new'] = after[differs].astype(object)
+            parts.append(part)
+    changed = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=key_cols + ['field', 'old', 'new'])
+
+    return {
+        'added': new.iloc[added_pos],
+        'removed': old.iloc[removed_pos],
+        'changed': changed,
+        'changed_rows': len(old_pos),
+        'unchanged_rows': len(old_matched) - len(old_pos),
+        'columns_added': [col for col in new.columns if col not in old.columns],
+        'columns_removed': [col for col in old.columns if col not in new.columns],
+    }
+
+
+def ranking_movement(old_merged, new_merged):
+    """两个版本之间各州机会指数排名的变化（rank_change为正表示排名上升）"""
+    columns = ['state', 'old_rank', 'new_rank', 'rank_change', 'old_opportunity_index', 'new_opportunity_index']
+    if old_merged.empty or new_merged.empty:
+        return pd.DataFrame(columns=columns)
+    old_ranking = opportunity_ranking(old_merged)[['state', 'rank', 'opportunity_index']]
+    new_ranking = opportunity_ranking(new_merged)[['state', 'rank', 'opportunity_index']]
+    movement = pd.merge(old_ranking, new_ranking, on='state', how='outer', suffixes=('_old', '_new'))
+    movement = movement.rename(columns={
+        'rank_old': 'old_rank', 'rank_new': 'new_rank',
+        'opportunity_index_old': 'old_opportunity_index', 'opportunity_index_new': 'new_opportunity_index',
+    })
+    movement['rank_change'] = movement['old_rank'] - movement['new_rank']
+    return movement[columns].sort_values(['new_rank', 'old_rank'], na_position='last').reset_index(drop=True)
+
+
+def diff_snapshots(old, new):
+    """比较两个快照：关联数据和HRSA认定记录的差异，以及机会指数排名变化"""
+    result = {'ranking': ranking_movement(old.merged, new.merged)}
+    result['merged'] = diff_frames(old.merged, new.merged, diff_keys('merged', old.merged, new.merged))
+    if not old.mapped_hrsa.empty and not new.mapped_hrsa.empty:
+        result['hrsa'] = diff_frames(
+            old.mapped_hrsa, new.mapped_hrsa, diff_keys('hrsa', old.mapped_hrsa, new.mapped_hrsa)
+        )
+    return result
+
+
+# 进程内唯一的快照存储（与共享数据集缓存一样跨会话常驻）
+snapshot_store = SnapshotStore()
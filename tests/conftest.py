@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# 应用模块位于仓库根目录（平铺结构）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import mapping_profiles  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_profiles(tmp_path, monkeypatch):
+    """每个测试使用独立的映射档案文件，不读写仓库中的 .cache"""
+    monkeypatch.setattr(mapping_profiles, 'PROFILE_PATH', str(tmp_path / 'mapping_profiles.json'))
+    monkeypatch.setattr(mapping_profiles, '_store', None)
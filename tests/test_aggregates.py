@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import percentile_ranks, top_share_mask
+
+
+def test_top_share_labels_match_exact_quantile():
+    # 标注的前20%必须与 quantile(0.8) 的精确结果一致（近似分位数曾导致标注集合不同）
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        values = rng.lognormal(0, 1, rng.integers(5, 60)) * rng.choice([1, 10, 1000])
+        baseline = values >= pd.Series(values).quantile(0.8)
+        assert np.array_equal(top_share_mask(values, 0.2), baseline)
+
+    values = np.arange(10, 61, dtype='float64')
+    assert np.array_equal(top_share_mask(values, 0.2), values >= 50)
+
+
+def test_top_share_mask_caps_label_count():
+    values = np.arange(100, dtype='float64')
+    mask = top_share_mask(values, 0.5, max_count=5)
+    assert np.flatnonzero(mask).tolist() == [95, 96, 97, 98, 99]
+
+
+def test_percentile_ranks_match_pandas_rank():
+    values = pd.Series([3.0, 1.0, 2.0, 2.0, np.nan, 5.0])
+    expected = values.rank(pct=True, method='max').dropna()
+    assert np.allclose(percentile_ranks(values, values.dropna()), expected)
@@ -0,0 +1,100 @@
+import gzip
+import http.client
+import json
+
+import pandas as pd
+import pytest
+
+import api_server
+
+
+@pytest.fixture(autouse=True)
+def _reset_api(monkeypatch):
+    monkeypatch.setattr(api_server, '_current', None)
+    monkeypatch.setattr(api_server, '_responses', api_server.OrderedDict())
+
+
+def test_publish_without_replace_keeps_the_published_dataset():
+    first = pd.DataFrame({'state': ['AL']})
+    assert api_server.publish('v1', first, replace=False)
+    api_server._responses['etag'] = (b'{}', None)
+
+    # 其他会话的重跑不替换已发布的版本，也不清空响应缓存
+    assert not api_server.publish('v2', pd.DataFrame({'state': ['GA']}), replace=False)
+    assert api_server.current_version() == 'v1'
+    assert 'etag' in api_server._responses
+
+
+def test_publish_replace_switches_version_and_clears_responses():
+    api_server.publish('v1', pd.DataFrame({'state': ['AL']}))
+    api_server._responses['etag'] = (b'{}', None)
+    assert api_server.publish('v2', pd.DataFrame({'state': ['GA']}))
+    assert api_server.current_version() == 'v2'
+    assert not api_server._responses
+
+
+@pytest.fixture
+def api_url():
+    server = api_server.ThreadingHTTPServer(('127.0.0.1', 0), api_server.AggregatesHandler)
+    thread = api_server.threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def _get(address, path, headers=None):
+    connection = http.client.HTTPConnection(*address, timeout=5)
+    connection.request('GET', path, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+def _merged(n_states=40):
+    states = [f'S{i:02d}' for i in range(n_states)]
+    return pd.DataFrame({
+        'state': states,
+        'year': [2020.0] * n_states,
+        'total_births': [1000.0 + i for i in range(n_states)],
+        'gap_score': [float(i % 25) for i in range(n_states)],
+    })
+
+
+def test_choropleth_rejects_text_metric(api_url):
+    api_server.publish('v1', _merged())
+    response, body = _get(api_url, '/api/v1/choropleth?metric=state')
+    assert response.status == 400
+    assert 'not numeric' in json.loads(body)['error']
+
+    response, body = _get(api_url, '/api/v1/choropleth?metric=missing')
+    assert response.status == 400
+
+
+def test_if_none_match_returns_304(api_url):
+    api_server.publish('v1', _merged())
+    response, _ = _get(api_url, '/api/v1/state-aggregates')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag
+
+    response, body = _get(api_url, '/api/v1/state-aggregates', {'If-None-Match': etag})
+    assert response.status == 304
+    assert body == b''
+
+    # 发布新版本后旧ETag不再匹配
+    api_server.publish('v2', _merged(30))
+    response, _ = _get(api_url, '/api/v1/state-aggregates', {'If-None-Match': etag})
+    assert response.status == 200
+
+
+def test_gzip_only_when_accepted(api_url):
+    api_server.publish('v1', _merged())
+    response, body = _get(api_url, '/api/v1/state-aggregates', {'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    payload = json.loads(gzip.decompress(body))
+    assert payload['version'] == 'v1' and payload['rows'] == 40
+
+    response, body = _get(api_url, '/api/v1/state-aggregates')
+    assert response.getheader('Content-Encoding') is None
+    assert json.loads(body)['rows'] == 40
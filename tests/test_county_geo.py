@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+import county_geo
+from county_geo import ChoroplethTemplate, CountyGeometry, simplify_ring
+
+
+def _circle(n_points, radius=1.0):
+    angles = np.linspace(0, 2 * np.pi, n_points, endpoint=False)
+    ring = np.column_stack([radius * np.cos(angles), radius * np.sin(angles)])
+    return np.vstack([ring, ring[:1]])
+
+
+def test_simplify_ring_keeps_ring_closed():
+    ring = _circle(200)
+    simplified = simplify_ring(ring, 0.01)
+    assert 4 <= len(simplified) < len(ring)
+    assert np.array_equal(simplified[0], simplified[-1])
+    # 保留的点都来自原始环
+    assert all(any(np.array_equal(point, original) for original in ring) for point in simplified)
+
+
+def test_simplify_ring_zero_tolerance_keeps_corners():
+    square = np.array([[0, 0], [0.5, 0], [1, 0], [1, 1], [0, 1], [0, 0]], dtype='float64')
+    simplified = simplify_ring(square, 0.0)
+    assert [tuple(point) for point in simplified] == [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+
+
+def test_simplify_ring_degenerate_returns_none():
+    # 面积很小的环在容差下只剩首尾和最远点
+    tiny = _circle(50, radius=1e-4)
+    assert simplify_ring(tiny, 0.01) is None
+    # 点数不超过4时原样返回
+    triangle = np.array([[0, 0], [1, 0], [0, 1], [0, 0]], dtype='float64')
+    assert simplify_ring(triangle, 10.0) is triangle
+
+
+def _geometry():
+    features = []
+    for i, (fips, state) in enumerate([('01001', 'AL'), ('01003', 'AL'), ('13001', 'GA')]):
+        square = [[i, 0], [i + 1, 0], [i + 1, 1], [i, 1], [i, 0]]
+        features.append({'type': 'Feature', 'id': fips, 'properties': {'name': f'County {i}', 'state': state},
+                         'geometry': {'type': 'Polygon', 'coordinates': [square]}})
+    return CountyGeometry(
+        features,
+        np.array([feature['id'] for feature in features]),
+        np.array([feature['properties']['name'] for feature in features]),
+        np.array([feature['properties']['state'] for feature in features]),
+    )
+
+
+def test_template_aligns_and_fills_values():
+    template = ChoroplethTemplate(_geometry(), np.array([True, True, False]))
+    assert template.fips.tolist() == ['01001', '01003']
+    assert len(template.figure.data[0].geojson['features']) == 2
+
+    values = template.align(pd.Series({'01003': 5.0, '13001': 7.0}))
+    assert np.isnan(values[0]) and values[1] == 5.0
+
+    with template.lock:
+        figure = template.fill(values, "Gap Score", "Gap Score by County", hover_values=np.array(['a', 'b']))
+    trace = figure.data[0]
+    assert np.isnan(trace.z[0]) and trace.z[1] == 5.0
+    assert trace.customdata.tolist() == [['County 0', 'AL', 'a'], ['County 1', 'AL', 'b']]
+    assert 'Gap Score' in trace.hovertemplate
+    assert figure.layout.title.text == "Gap Score by County"
+
+    # 再次填充只替换数据，几何保持不变
+    with template.lock:
+        figure = template.fill(np.array([1.0, 2.0]), "Births", "Births by County")
+    assert figure.data[0].z.tolist() == [1.0, 2.0]
+    assert figure.data[0].customdata.shape == (2, 2)
+    assert len(figure.data[0].geojson['features']) == 2
+
+
+def test_bundled_geometries_cover_default_region():
+    assert county_geo.available_resolutions() == ['low', 'medium', 'high']
+    geometry = county_geo.load_geometry('low')
+    assert set(geometry.states) == {'AL', 'FL', 'GA', 'LA', 'MS', 'SC'}
+    assert len(set(geometry.fips)) == len(geometry.fips)
@@ -0,0 +1,59 @@
+import io
+
+import data_pipeline
+from data_pipeline import load_data, resolve_cdc_fields, resolve_hrsa_fields
+
+
+def test_resolvers_sniff_fields_from_header():
+    cdc = ['State', 'Year', 'Births', 'Birth Rate', 'Average Number of Prenatal Visits',
+           "Mother's Age", 'Age Group', 'Race', 'County Code']
+    assert resolve_cdc_fields(cdc) == {
+        'total_births': 'Births',
+        'prenatal_visits': 'Average Number of Prenatal Visits',
+        'state': 'State',
+        'year': 'Year',
+        'mother_age': "Mother's Age",
+        'race': 'Race',
+        'county_fips': 'County Code',
+    }
+
+    hrsa = ['HPSA ID', 'Common State Name', 'State and County Federal Information Processing Standard Code',
+            'HPSA Score', 'HPSA Designation Date', 'HPSA Designation Last Update Date', 'Withdrawn Date']
+    assert resolve_hrsa_fields(hrsa) == {
+        'gap_score': 'HPSA Score',
+        'state': 'Common State Name',
+        'county_fips': 'State and County Federal Information Processing Standard Code',
+        'designation_date': 'HPSA Designation Date',
+        'withdrawn_date': 'Withdrawn Date',
+        'hpsa_id': 'HPSA ID',
+    }
+    # 无法识别的列不出现在映射中
+    assert resolve_hrsa_fields(['Notes']) == {}
+
+
+def test_csv_reads_only_mapped_columns_as_text():
+    csv = b"State,Births,Notes,Year\nAL,\"1,200\",x,2020\nGA,300,y,2021\n"
+    df = load_data(io.BytesIO(csv), 'csv', dataset='cdc')
+    assert list(df.columns) == ['State', 'Births', 'Year']
+    assert df['Births'].tolist() == ['1,200', '300']
+    assert df.attrs['source_columns'] == ['State', 'Births', 'Notes', 'Year']
+    assert df.attrs['field_map'] == {'total_births': 'Births', 'state': 'State', 'year': 'Year'}
+
+    mapped = data_pipeline.clean_and_map_cdc_data(df)
+    assert mapped['total_births'].tolist() == [1200.0, 300.0]
+
+
+def test_csv_without_dataset_reads_all_columns():
+    df = load_data(io.BytesIO(b"a,b\n1,2\n"), 'csv')
+    assert list(df.columns) == ['a', 'b']
+    assert 'field_map' not in df.attrs
+
+
+def test_encoding_fallback_when_bad_byte_follows_the_header():
+    # 表头和前面的数据都是合法的UTF-8，Latin-1字节出现在读取缓冲区之后
+    rows = ''.join(f"AL,{i},2020,note{i}\n" for i in range(50000))
+    csv = ("State,Births,Year,Notes\n" + rows).encode('ascii') + "GA,7,2021,Bogot\xe1\n".encode('latin1')
+    df = load_data(io.BytesIO(csv), 'csv', dataset='cdc')
+    assert len(df) == 50001
+    assert df['State'].iloc[-1] == 'GA'
+    assert list(df.columns) == ['State', 'Births', 'Year']
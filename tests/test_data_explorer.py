@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from data_explorer import ExplorerIndex, page_count
+
+
+def _frame(n=500):
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        'state': rng.choice(['AL', 'GA', 'MS', 'SC'], n),
+        'year': rng.choice([2019.0, 2020.0, 2021.0], n),
+        'total_births': rng.permutation(n).astype('float64'),
+    }, index=rng.permutation(n) + 1000)  # 非默认索引：行位置与标签不同
+    df.loc[df.index[::17], 'total_births'] = np.nan
+    return df
+
+
+def test_filter_and_sort_match_pandas():
+    df = _frame()
+    index = ExplorerIndex(df)
+    selected = df['state'].isin(['AL', 'MS']) & df['year'].isin([2020.0])
+
+    positions = index.select(states=['AL', 'MS'], years=[2020.0])
+    assert np.array_equal(positions, np.flatnonzero(selected))
+
+    for ascending in (True, False):
+        positions = index.select(states=['AL', 'MS'], years=[2020.0], sort_by='total_births', ascending=ascending)
+        expected = df[selected].sort_values('total_births', ascending=ascending, na_position='last')
+        pd.testing.assert_frame_equal(df.iloc[positions], expected)
+
+
+def test_unfiltered_selection_and_unknown_values():
+    df = _frame()
+    index = ExplorerIndex(df)
+    assert index.select() is None
+    assert index.select(sort_by='not_a_column') is None
+    assert len(index.select(states=['TX'])) == 0
+    # 排序顺序只计算一次
+    assert index.sort_order('total_births') is index.sort_order('total_births')
+
+
+def test_paging():
+    df = _frame(95)
+    index = ExplorerIndex(df)
+    rows, total = index.page(None, 2, 20)
+    assert total == 95
+    pd.testing.assert_frame_equal(rows, df.iloc[20:40])
+
+    positions = index.select(states=['GA'], sort_by='total_births')
+    rows, total = index.page(positions, page_count(len(positions), 10), 10)
+    assert total == len(positions)
+    pd.testing.assert_frame_equal(rows, df.iloc[positions[(page_count(total, 10) - 1) * 10:]])
+
+    rows, total = index.page(positions, 99, 10)
+    assert rows.empty and total == len(positions)
+
+
+def test_page_count():
+    assert page_count(0, 50) == 1
+    assert page_count(50, 50) == 1
+    assert page_count(51, 50) == 2
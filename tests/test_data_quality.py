@@ -0,0 +1,62 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline import clean_and_map_cdc_data, clean_and_map_hrsa_data, load_data
+from data_quality import profile_dataset
+
+CDC_CSV = b"""State,Year,Births,Avg Prenatal Visits
+AL,2020,100,10
+AL,2020,110,11
+GA,2020,unknown,80
+Georgia,2021,,12
+XX,2021,120,9
+Narnia,2021,130,10
+MS,2021,"1,000,000",10
+SC,2021,105,
+"""
+
+
+def _field_stats(report):
+    return report['columns'].set_index('field')
+
+
+def test_cdc_profile_counts():
+    mapped = clean_and_map_cdc_data(load_data(io.BytesIO(CDC_CSV), 'csv', dataset='cdc'))
+    report = profile_dataset(mapped, 'cdc')
+    stats = _field_stats(report)
+
+    assert report['rows'] == 8
+    # "unknown"转换失败（同时计入缺失），空值只计入缺失
+    assert stats.loc['total_births', 'null_rate'] == 2 / 8
+    assert stats.loc['total_births', 'unparsable_rate'] == 1 / 8
+    assert stats.loc['total_births', 'outliers'] == 1
+    assert stats.loc['prenatal_visits', 'null_rate'] == 1 / 8
+    assert stats.loc['prenatal_visits', 'out_of_range'] == 1
+    assert stats.loc['state', 'null_rate'] == 0
+    assert report['unknown_states'].to_dict() == {'Narnia': 1, 'XX': 1}
+    # 州全称标准化后，AL 2020重复一次
+    assert report['duplicate_key'] == ['state', 'year']
+    assert report['duplicate_rows'] == 1
+
+
+def test_hrsa_dates_checked_by_year():
+    hrsa = pd.DataFrame({
+        'Common State Name': ['AL', 'AL', 'GA'],
+        'HPSA Score': ['12', '30', '5'],
+        'HPSA Designation Date': ['2015-01-01', '1960-05-01', 'not a date'],
+    })
+    report = profile_dataset(clean_and_map_hrsa_data(hrsa), 'hrsa')
+    stats = _field_stats(report)
+    assert stats.loc['gap_score', 'out_of_range'] == 1
+    assert stats.loc['designation_date', 'out_of_range'] == 1
+    assert stats.loc['designation_date', 'null_rate'] == 1 / 3
+    assert report['duplicate_rows'] == 0
+
+
+def test_empty_frame():
+    report = profile_dataset(pd.DataFrame({'state': [], 'total_births': np.array([], dtype='float64')}), 'cdc')
+    assert report['rows'] == 0
+    assert report['columns']['null_rate'].tolist() == [0.0, 0.0]
+    assert report['duplicate_rows'] == 0
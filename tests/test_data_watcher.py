@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import data_watcher
+from mapping_profiles import header_signature, save_profile
+
+CDC_CSV = "State,Year,Births,Avg Prenatal Visits,Mother's Age\nAL,2020,100,10,28\nGA,2020,200,11,29\n"
+HRSA_CSV = "Common State Name,HPSA Score\nAL,12\nGA,{score}\n"
+
+
+@pytest.fixture(autouse=True)
+def _no_publish(monkeypatch):
+    # 不修改进程级的API和快照存储
+    monkeypatch.setattr(data_watcher.api_server, 'publish', lambda *args, **kwargs: True)
+    monkeypatch.setattr(data_watcher.snapshot_store, 'record', lambda *args, **kwargs: None)
+
+
+def _write(path, text):
+    path.write_text(text)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _watcher(data_dir):
+    watcher = data_watcher.DataDirectoryWatcher(
+        str(data_dir), poll_seconds=0.01, debounce_seconds=0.05, retry_seconds=0.05
+    )
+    return watcher.start()
+
+
+def test_builds_after_debounce_and_swaps_on_change(tmp_path):
+    _write(tmp_path / 'cdc.csv', CDC_CSV)
+    _write(tmp_path / 'hrsa.csv', HRSA_CSV.format(score=8))
+    watcher = _watcher(tmp_path)
+    try:
+        assert _wait_for(lambda: watcher.current is not None)
+        first = watcher.current
+        assert sorted(first.merged['state']) == ['AL', 'GA']
+        assert watcher.builds == 1
+
+        _write(tmp_path / 'hrsa.csv', HRSA_CSV.format(score=20))
+        assert _wait_for(lambda: watcher.current is not first)
+        assert watcher.current.version != first.version
+        assert watcher.current.merged.set_index('state').loc['GA', 'gap_score'] == 20
+        assert watcher.last_error is None
+    finally:
+        watcher.stop()
+
+
+def test_waits_for_both_files(tmp_path):
+    _write(tmp_path / 'cdc.csv', CDC_CSV)
+    watcher = _watcher(tmp_path)
+    try:
+        assert _wait_for(lambda: watcher.last_error is not None)
+        assert 'Waiting' in watcher.last_error
+        assert watcher.current is None
+
+        _write(tmp_path / 'hrsa.csv', HRSA_CSV.format(score=8))
+        assert _wait_for(lambda: watcher.current is not None)
+    finally:
+        watcher.stop()
+
+
+def test_failed_build_is_retried_without_directory_change(tmp_path, monkeypatch):
+    _write(tmp_path / 'cdc.csv', CDC_CSV)
+    _write(tmp_path / 'hrsa.csv', HRSA_CSV.format(score=8))
+    build_version = data_watcher.build_version
+    attempts = []
+
+    def flaky_build(sources):
+        attempts.append(sources)
+        if len(attempts) == 1:
+            raise OSError("file is locked")
+        return build_version(sources)
+
+    monkeypatch.setattr(data_watcher, 'build_version', flaky_build)
+    watcher = _watcher(tmp_path)
+    try:
+        # 第一次构建失败后，不修改目录也会重试并成功
+        assert _wait_for(lambda: watcher.current is not None)
+        assert len(attempts) == 2
+        assert watcher.last_error is None
+        assert watcher.failures == 0
+    finally:
+        watcher.stop()
+
+
+def test_rebuilds_only_when_its_own_header_mapping_changes(tmp_path):
+    _write(tmp_path / 'cdc.csv', CDC_CSV)
+    _write(tmp_path / 'hrsa.csv', HRSA_CSV.format(score=8))
+    watcher = _watcher(tmp_path)
+    try:
+        assert _wait_for(lambda: watcher.current is not None)
+        first = watcher.current
+
+        # 固定其他表头的映射不触发重建
+        other = header_signature(['State', 'Births'], 'cdc')
+        save_profile(other, 'cdc', ['State', 'Births'], {'state': 'State'}, pinned=True)
+        time.sleep(0.3)
+        assert watcher.builds == 1
+
+        hrsa = first.mapped_hrsa
+        save_profile(hrsa.attrs['mapping_signature'], 'hrsa', hrsa.attrs['source_columns'],
+                     hrsa.attrs['field_map'], pinned=True)
+        assert _wait_for(lambda: watcher.builds == 2)
+        assert watcher.current.mapped_hrsa.attrs['mapping_revision'] == 1
+        assert watcher.current.version != first.version
+    finally:
+        watcher.stop()
@@ -0,0 +1,60 @@
+import pandas as pd
+
+from data_explorer import ExplorerIndex
+from dataset_cache import DatasetCache, estimate_bytes
+from partitions import PartitionIndex
+
+
+def _frame(n_rows=1000):
+    return pd.DataFrame({
+        'state': ['AL', 'GA'] * (n_rows // 2),
+        'year': [2020] * n_rows,
+        'total_births': range(n_rows),
+    })
+
+
+def test_index_without_cached_parent_charges_referenced_frame():
+    df = _frame()
+    cache = DatasetCache(max_bytes=10 ** 9)
+    index = cache.get_or_build(('partitions', 'v1', 'cdc'), lambda: PartitionIndex(df))
+    assert cache.stats()['used_bytes'] == index.nbytes + estimate_bytes(df)
+
+
+def test_linked_index_is_evicted_with_its_dataset():
+    df = _frame()
+    cache = DatasetCache(max_bytes=10 ** 9)
+    cache.put(('mapped', 'v1'), df)
+    index = cache.get_or_build(('partitions', 'v1', 'cdc'), lambda: PartitionIndex(df), parent=('mapped', 'v1'))
+    assert cache.stats()['used_bytes'] == estimate_bytes(df) + index.nbytes
+
+    # 数据集被淘汰时，引用它的索引一并淘汰
+    small = _frame(10)
+    cache.max_bytes = estimate_bytes(small)
+    cache.put(('mapped', 'v2'), small)
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['used_bytes'] == estimate_bytes(small)
+
+
+def test_refresh_counts_sort_orders_built_after_put():
+    df = _frame()
+    cache = DatasetCache(max_bytes=10 ** 9)
+    cache.put(('merged', 'v1'), df)
+    index = cache.get_or_build(('explorer', 'v1'), lambda: ExplorerIndex(df), parent=('merged', 'v1'))
+    before = cache.stats()['used_bytes']
+    index.sort_order('total_births')
+    cache.refresh(('explorer', 'v1'))
+    assert cache.stats()['used_bytes'] == before + len(df) * index._dtype().itemsize
+
+
+def test_builder_returning_none_is_cached():
+    cache = DatasetCache(max_bytes=10 ** 9)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_build(('disparity', 'v1'), build) is None
+    assert cache.get_or_build(('disparity', 'v1'), build) is None
+    assert len(calls) == 1
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
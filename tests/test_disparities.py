@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from disparities import build_disparity_cube, default_reference, disparity_index, disparity_table
+
+CDC = pd.DataFrame({
+    'state': ['AL', 'AL', 'GA', 'GA', 'AL', 'AL', 'GA', 'GA', 'GA'],
+    'year': [2020.0, 2020.0, 2020.0, 2020.0, 2021.0, 2021.0, 2021.0, 2021.0, 2021.0],
+    'race': ['White', 'Black', 'White', 'Black', 'White', 'Black', 'White', 'Black', 'Asian'],
+    'total_births': [100.0, 50.0, 200.0, 150.0, 120.0, 60.0, 180.0, 160.0, 20.0],
+    'prenatal_visits': [12.0, 9.0, 11.0, 8.0, 12.0, np.nan, 10.0, 9.0, 11.0],
+})
+HRSA = pd.DataFrame({'state': ['AL', 'AL', 'GA'], 'gap_score': [8.0, 12.0, 20.0]})
+
+
+def _expected(cdc, gap_by_state):
+    """按 地区 × 种族 用pandas直接汇总的参考结果（含所有地区合计）"""
+    df = cdc.assign(
+        exposure=cdc['total_births'] * cdc['state'].map(gap_by_state),
+        weighted=cdc['total_births'] * cdc['prenatal_visits'],
+        weight=cdc['total_births'].where(cdc['prenatal_visits'].notna()),
+    )
+    frames = [df, df.assign(state='All')]
+    sums = pd.concat(frames).groupby(['state', 'race'])[['total_births', 'exposure', 'weighted', 'weight']].sum()
+    sums['prenatal_visits'] = sums['weighted'] / sums['weight']
+    sums['exposure_rate'] = sums['exposure'] / sums['total_births']
+    sums['birth_share'] = sums['total_births'] / sums.groupby(level='state')['total_births'].transform('sum')
+    return sums
+
+
+def test_table_matches_pandas_aggregation():
+    cube = build_disparity_cube(CDC, HRSA)
+    assert list(cube.races) == ['Asian', 'Black', 'White']
+    assert cube.births.shape == (3, 2, 2)
+    assert default_reference(cube) == 'White'
+
+    table = disparity_table(cube, 'White').set_index(['geo', 'race'])
+    expected = _expected(CDC, {'AL': 10.0, 'GA': 20.0})
+    for key, row in expected.iterrows():
+        assert np.isclose(table.loc[key, 'births'], row['total_births'])
+        assert np.isclose(table.loc[key, 'birth_share'], row['birth_share'])
+        assert np.isclose(table.loc[key, 'prenatal_visits'], row['prenatal_visits'])
+        assert np.isclose(table.loc[key, 'exposure_rate'], row['exposure_rate'])
+        reference = expected.loc[(key[0], 'White')]
+        assert np.isclose(table.loc[key, 'prenatal_ratio'], row['prenatal_visits'] / reference['prenatal_visits'])
+        assert np.isclose(table.loc[key, 'exposure_ratio'], row['exposure_rate'] / reference['exposure_rate'])
+
+    # 没有出生记录的组合（AL的Asian）不参与比较
+    assert table.loc[('AL', 'Asian'), 'births'] == 0
+    assert table.loc[('AL', 'Asian'), ['prenatal_ratio', 'exposure_ratio', 'birth_share_ratio']].isna().all()
+
+
+def test_filters_and_year_aware_gap():
+    hrsa = pd.DataFrame({
+        'state': ['AL', 'GA'],
+        'gap_score': [10.0, 20.0],
+        'designation_date': pd.to_datetime(['2021-03-01', '2010-01-01']),
+    })
+    cube = build_disparity_cube(CDC, hrsa)
+    # AL的指定从2021年开始，2020年缺口为0
+    assert (cube.exposure[:, 0, 0] == 0).all()
+    assert np.allclose(cube.exposure[:, 0, 1], cube.births[:, 0, 1] * 10.0)
+
+    table = disparity_table(cube, 'White', states=['GA'], years=[2021.0]).set_index(['geo', 'race'])
+    assert sorted(set(table.index.get_level_values('geo'))) == ['All', 'GA']
+    assert table.loc[('All', 'Black'), 'births'] == 160.0
+
+
+def test_disparity_index_ranks_geos():
+    cube = build_disparity_cube(CDC, HRSA)
+    table = disparity_table(cube, 'White')
+    ranked = disparity_index(table, 'prenatal_ratio', 'White')
+    assert ranked['disparity_index'].is_monotonic_decreasing
+    by_geo = ranked.set_index('geo')
+
+    ratios = table[(table['race'] != 'White') & table['prenatal_ratio'].notna()].set_index(['geo', 'race'])['prenatal_ratio']
+    for geo in ('AL', 'GA', 'All'):
+        deviations = (ratios.loc[geo] - 1).abs() * 100
+        assert np.isclose(by_geo.loc[geo, 'disparity_index'], deviations.mean())
+        assert by_geo.loc[geo, 'groups_compared'] == len(deviations)
+        assert by_geo.loc[geo, 'most_divergent_race'] == deviations.idxmax()
+
+
+def test_missing_race_column_returns_none():
+    assert build_disparity_cube(CDC.drop(columns='race'), HRSA) is None
+    assert build_disparity_cube(CDC.iloc[0:0], HRSA) is None
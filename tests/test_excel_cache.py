@@ -0,0 +1,67 @@
+import pandas as pd
+
+import data_pipeline
+from mapping_profiles import save_profile
+
+
+def test_excel_cache_path_changes_with_mapping_rules_version(monkeypatch):
+    before = data_pipeline._excel_cache_path('ab' * 32, 'hrsa')
+    monkeypatch.setattr(data_pipeline, 'MAPPING_RULES_VERSION', data_pipeline.MAPPING_RULES_VERSION + 1)
+    after = data_pipeline._excel_cache_path('ab' * 32, 'hrsa')
+    assert before != after
+
+
+def test_pinning_invalidates_only_that_headers_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_pipeline, 'EXCEL_CACHE_DIR', str(tmp_path / 'excel'))
+    path = tmp_path / 'hrsa.xlsx'
+    pd.DataFrame({
+        'State': ['AL', 'GA'], 'HPSA Score': [12, 18], 'Alt Score': [1, 2], 'Notes': ['x', 'y'],
+    }).to_excel(path, index=False)
+
+    with open(path, 'rb') as f:
+        first = data_pipeline.load_data(f, 'excel', dataset='hrsa')
+    signature = first.attrs['mapping_signature']
+    assert first.attrs['mapping_revision'] == 0
+    assert 'Alt Score' not in first.columns
+
+    # 固定映射后该表头的缓存失效，按新映射重新读取工作簿
+    save_profile(signature, 'hrsa', first.attrs['source_columns'],
+                 {'state': 'State', 'hpsa_score': 'Alt Score'}, pinned=True)
+    with open(path, 'rb') as f:
+        second = data_pipeline.load_data(f, 'excel', dataset='hrsa')
+    assert second.attrs['mapping_revision'] == 1
+    assert 'Alt Score' in second.columns
+
+    # 再次加载命中列式缓存
+    with open(path, 'rb') as f:
+        third = data_pipeline.load_data(f, 'excel', dataset='hrsa')
+    assert third.attrs['mapping_revision'] == 1
+    assert list(third.columns) == list(second.columns)
+
+
+def test_excel_reads_mapped_sheet_and_hits_parquet_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'excel'
+    monkeypatch.setattr(data_pipeline, 'EXCEL_CACHE_DIR', str(cache_dir))
+    path = tmp_path / 'cdc.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Notes': ['about this file']}).to_excel(writer, sheet_name='README', index=False)
+        pd.DataFrame({
+            'State': ['AL', 'GA'], 'Year': [2020, 2021], 'Births': [100, 200], 'Comment': ['a', 'b'],
+        }).to_excel(writer, sheet_name='Data', index=False)
+
+    # 跳过无法映射的工作表，只读取映射到的列
+    with open(path, 'rb') as f:
+        first = data_pipeline.load_data(f, 'excel', dataset='cdc')
+    assert list(first.columns) == ['State', 'Year', 'Births']
+    assert first['State'].tolist() == ['AL', 'GA']
+    assert len(list(cache_dir.glob('*.parquet'))) == 1
+
+    # 同一内容再次加载时直接读取列式缓存，不再解析工作簿
+    def fail(*args, **kwargs):
+        raise AssertionError("workbook parsed again")
+
+    monkeypatch.setattr(data_pipeline.pd, 'read_excel', fail)
+    with open(path, 'rb') as f:
+        second = data_pipeline.load_data(f, 'excel', dataset='cdc')
+    pd.testing.assert_frame_equal(second, first)
+    assert second.attrs['field_map'] == first.attrs['field_map']
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from hpsa_intervals import DesignationIndex
+
+
+def _brute_force(hrsa, states, years):
+    """逐个 (州, 年份) 扫描所有指定：指定年份 <= year <= 撤销年份"""
+    start = pd.to_datetime(hrsa['designation_date'], errors='coerce').dt.year.fillna(0)
+    end = pd.to_datetime(hrsa['withdrawn_date'], errors='coerce').dt.year.fillna(9999)
+    end = np.maximum(end, start)
+    means, counts = [], []
+    for state, year in zip(states, years):
+        active = (hrsa['state'] == state) & (start <= year) & (end >= year) & hrsa['gap_score'].notna()
+        counts.append(int(active.sum()))
+        means.append(hrsa.loc[active, 'gap_score'].mean() if active.any() else np.nan)
+    return np.array(means), np.array(counts)
+
+
+def test_lookup_matches_brute_force():
+    rng = np.random.default_rng(3)
+    n = 400
+    designated = pd.to_datetime('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, n), unit='D')
+    withdrawn = designated + pd.to_timedelta(rng.integers(-400, 3000, n), unit='D')
+    hrsa = pd.DataFrame({
+        'state': rng.choice(['AL', 'GA', 'MS'], n),
+        'gap_score': rng.integers(0, 26, n).astype('float64'),
+        'designation_date': pd.Series(designated).where(rng.random(n) > 0.1),
+        'withdrawn_date': pd.Series(withdrawn).where(rng.random(n) > 0.5),
+    })
+    hrsa.loc[::37, 'gap_score'] = np.nan
+
+    states = np.repeat(['AL', 'GA', 'MS', 'TX'], 25)
+    years = np.tile(np.arange(2005, 2030), 4)
+    means, counts = DesignationIndex.from_frame(hrsa).lookup(states, years)
+    expected_means, expected_counts = _brute_force(hrsa, states, years)
+
+    assert np.array_equal(counts, expected_counts)
+    assert np.allclose(means, expected_means, equal_nan=True)
+    # 没有指定记录的州
+    assert (counts[states == 'TX'] == 0).all() and np.isnan(means[states == 'TX']).all()
+
+
+def test_year_granularity_and_missing_dates():
+    hrsa = pd.DataFrame({
+        'state': ['AL', 'AL', 'GA'],
+        'gap_score': [10.0, 20.0, 5.0],
+        'designation_date': ['2018-06-01', None, '2019-12-31'],
+        'withdrawn_date': ['2020-03-01', '2018-01-01', None],
+    })
+    index = DesignationIndex.from_frame(hrsa)
+    means, counts = index.lookup(['AL', 'AL', 'AL', 'AL', 'GA', 'GA'], [2017, 2018, 2020, 2021, 2018, 2040])
+    # 2018年内指定和撤销的记录都视为该年有效；缺少指定日期视为一直有效
+    assert counts.tolist() == [1, 2, 1, 0, 0, 1]
+    assert means[:3].tolist() == [20.0, 15.0, 10.0]
+    assert np.isnan(means[3]) and means[5] == 5.0
+
+
+def test_index_by_county_key():
+    hrsa = pd.DataFrame({
+        'county_fips': ['01001', '01001', '13001'],
+        'gap_score': [4.0, 8.0, 12.0],
+        'designation_date': ['2015-01-01', '2019-01-01', '2015-01-01'],
+    })
+    means, counts = DesignationIndex.from_frame(hrsa, key='county_fips').lookup(['01001', '01001', '13001'],
+                                                                                [2016, 2020, 2020])
+    assert counts.tolist() == [1, 2, 1]
+    assert means.tolist() == [4.0, 6.0, 12.0]
@@ -0,0 +1,40 @@
+import builtins
+import sys
+import threading
+
+from lazy_imports import is_loaded, lazy_import
+
+
+def test_first_access_from_many_threads_imports_once(tmp_path, monkeypatch):
+    # 模块导入较慢，且每次执行都会计数
+    (tmp_path / 'slow_module_for_lazy_test.py').write_text(
+        "import time\n"
+        "import builtins\n"
+        "builtins.slow_module_runs = getattr(builtins, 'slow_module_runs', 0) + 1\n"
+        "time.sleep(0.05)\n"
+        "VALUE = 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'slow_module_for_lazy_test', raising=False)
+
+    module = lazy_import('slow_module_for_lazy_test')
+    assert not is_loaded('slow_module_for_lazy_test')
+    assert lazy_import('slow_module_for_lazy_test') is module
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def read_value():
+        barrier.wait()
+        results.append(module.VALUE)
+
+    threads = [threading.Thread(target=read_value) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 8
+    assert builtins.slow_module_runs == 1
+    assert is_loaded('slow_module_for_lazy_test')
+    del builtins.slow_module_runs
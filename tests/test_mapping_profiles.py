@@ -0,0 +1,30 @@
+from mapping_profiles import delete_profile, get_profile, header_signature, profile_revision, save_profile
+
+
+def test_pinning_bumps_only_that_headers_revision():
+    cdc = header_signature(['State', 'Births'], 'cdc')
+    hrsa = header_signature(['State', 'HPSA Score'], 'hrsa')
+    assert profile_revision(cdc) == profile_revision(hrsa) == 0
+    assert profile_revision(None) == 0
+
+    # 自动解析的档案不改变修订号
+    save_profile(hrsa, 'hrsa', ['State', 'HPSA Score'], {'state': 'State'})
+    assert profile_revision(hrsa) == 0
+
+    save_profile(cdc, 'cdc', ['State', 'Births'], {'state': 'State', 'births': 'Births'}, pinned=True)
+    assert profile_revision(cdc) == 1
+    assert profile_revision(hrsa) == 0
+
+    # 取消固定再次递增，档案删除后修订号保留
+    delete_profile(cdc)
+    assert get_profile(cdc) is None
+    assert profile_revision(cdc) == 2
+    assert profile_revision(hrsa) == 0
+
+
+def test_auto_profile_does_not_overwrite_pinned():
+    signature = header_signature(['State', 'Score'], 'hrsa')
+    save_profile(signature, 'hrsa', ['State', 'Score'], {'hpsa_score': 'Score'}, pinned=True)
+    save_profile(signature, 'hrsa', ['State', 'Score'], {'state': 'State'})
+    assert get_profile(signature)['fields'] == {'hpsa_score': 'score'}
+    assert profile_revision(signature) == 1
@@ -0,0 +1,102 @@
+import importlib
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import regions
+from partitions import PartitionIndex, sort_into_partitions
+
+
+def _partitioned(n=2000):
+    rng = np.random.default_rng(21)
+    df = pd.DataFrame({
+        'state': rng.choice(['AL', 'FL', 'GA', 'MS', 'TX'], n),
+        'year': rng.choice([2019.0, 2020.0, 2021.0, np.nan], n),
+        'total_births': rng.random(n),
+    })
+    df.attrs['field_map'] = {'state': 'State'}
+    return sort_into_partitions(df)
+
+
+def test_sorted_partitions_are_contiguous():
+    df = _partitioned()
+    assert df.attrs['field_map'] == {'state': 'State'}
+    index = PartitionIndex(df)
+    # 每个 州 × 年份（含缺失年份）只有一个分区
+    assert index.n_partitions == df[['state', 'year']].drop_duplicates().shape[0] == 20
+    assert sort_into_partitions(df) is df
+
+
+@pytest.mark.parametrize('states, years', [
+    (['GA'], None),
+    (['AL', 'TX'], None),
+    (None, [2020.0]),
+    (['FL', 'MS'], [2019.0, 2021.0]),
+    (['GA'], [2020.0]),
+    (['ZZ'], None),
+])
+def test_positions_match_boolean_filter(states, years):
+    df = _partitioned()
+    index = PartitionIndex(df)
+    mask = np.ones(len(df), dtype=bool)
+    if states is not None:
+        mask &= df['state'].isin(states).to_numpy()
+    if years is not None:
+        mask &= df['year'].isin(years).to_numpy()
+    assert np.array_equal(index.positions(states, years), np.flatnonzero(mask))
+    pd.testing.assert_frame_equal(index.select(states, years), df[mask])
+
+
+def test_unfiltered_and_contiguous_selections_are_views():
+    df = _partitioned()
+    index = PartitionIndex(df)
+    assert index.positions() is None
+    assert index.select() is df
+    assert index.select(states=list(df['state'].unique())) is df
+    # 单个州的分区连续，返回切片
+    selected = index.select(states=['GA'])
+    assert np.shares_memory(selected['total_births'].to_numpy(), df['total_births'].to_numpy())
+    assert index.years(['GA']) == [2019, 2020, 2021]
+
+
+def test_index_without_partition_keys():
+    df = pd.DataFrame({'total_births': [1.0, 2.0]})
+    index = PartitionIndex(df)
+    assert index.n_partitions == 1
+    assert index.select(states=['AL']) is df
+    assert index.years() == []
+
+
+@pytest.fixture
+def reload_regions(monkeypatch):
+    yield monkeypatch
+    monkeypatch.undo()
+    importlib.reload(regions)
+
+
+def test_regions_file_adds_and_overrides_regions(tmp_path, reload_regions):
+    path = tmp_path / 'regions.json'
+    path.write_text(json.dumps({
+        'Gulf Coast': ['al', ' FL', 'LA', 'MS', 'TX', 'XX'],
+        'Southwest': ['AZ', 'NM'],
+        'Nowhere': ['XX'],
+    }))
+    reload_regions.setenv('FEMTECH_REGIONS_FILE', str(path))
+    reload_regions.setenv('FEMTECH_DEFAULT_REGION', 'Gulf Coast')
+    importlib.reload(regions)
+
+    # 未知州简称被忽略，没有有效州的地区不加入
+    assert regions.region_states('Gulf Coast') == ('AL', 'FL', 'LA', 'MS', 'TX')
+    assert regions.region_states('Southwest') == ('AZ', 'NM')
+    assert 'Nowhere' not in regions.REGIONS
+    assert regions.region_names()[0] == 'Gulf Coast'
+    assert regions.region_states('Unknown') == regions.region_states(regions.ALL_STATES)
+
+
+def test_invalid_regions_file_keeps_builtin_regions(tmp_path):
+    path = tmp_path / 'regions.json'
+    path.write_text('{not json')
+    assert regions.load_regions(str(path)) == regions.BUILTIN_REGIONS
+    assert regions.load_regions(str(tmp_path / 'missing.json')) == regions.BUILTIN_REGIONS
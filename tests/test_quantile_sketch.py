@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import RELATIVE_ACCURACY, PartitionSketches, QuantileSketch
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.8, 0.9, 0.99, 1.0]
+
+
+def _exact(values, q):
+    # 误差界针对的真实分位数：排序后第 floor(q·(n-1)) 个值，即np.quantile的'lower'方法
+    return np.quantile(values, q, method='lower')
+
+
+def test_quantiles_within_relative_error_bound():
+    rng = np.random.default_rng(1)
+    for size in (1, 10, 1000, 50000):
+        values = rng.lognormal(3, 2, size)
+        estimates = QuantileSketch.from_values(values).quantile(QUANTILES)
+        exact = _exact(values, QUANTILES)
+        assert np.all(np.abs(estimates - exact) <= RELATIVE_ACCURACY * np.abs(exact))
+
+
+def test_zero_and_negative_values():
+    rng = np.random.default_rng(2)
+    values = np.concatenate([-rng.lognormal(1, 1, 500), np.zeros(200), rng.lognormal(1, 1, 500)])
+    estimates = QuantileSketch.from_values(values).quantile(QUANTILES)
+    exact = _exact(values, QUANTILES)
+    assert np.all(np.abs(estimates - exact) <= RELATIVE_ACCURACY * np.abs(exact))
+    assert QuantileSketch.from_values(values).quantile(0.5) == 0.0
+    assert QuantileSketch.from_values(np.zeros(5)).quantile(0.9) == 0.0
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch.from_values([np.nan, np.inf])
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantile(0.5))
+    assert np.isnan(sketch.quantile([0.1, 0.9])).all()
+    merged = sketch.merge(QuantileSketch.from_values([3.0]))
+    assert merged.count == 1 and abs(merged.quantile(0.5) - 3.0) <= RELATIVE_ACCURACY * 3.0
+
+
+def test_merge_equals_sketch_of_union():
+    rng = np.random.default_rng(3)
+    left = rng.lognormal(0, 1, 300) - 0.5
+    right = rng.lognormal(5, 1, 700)
+    merged = QuantileSketch.from_values(left).merge(QuantileSketch.from_values(right))
+    union = QuantileSketch.from_values(np.concatenate([left, right]))
+    assert merged.count == union.count
+    assert np.array_equal(merged.quantile(QUANTILES), union.quantile(QUANTILES))
+
+
+def _partitioned(rng, n_rows=5000):
+    return pd.DataFrame({
+        'state': rng.choice(['AL', 'GA', 'MS', 'TX'], n_rows),
+        'year': rng.choice([2019, 2020, 2021], n_rows),
+        'value': np.where(rng.random(n_rows) < 0.05, 0.0, rng.normal(10, 20, n_rows)),
+    })
+
+
+def test_partition_combine_equals_sketch_of_selected_rows():
+    df = _partitioned(np.random.default_rng(4))
+    sketches = PartitionSketches(df, 'value')
+    for states, years in [(None, None), (['AL'], None), (['GA', 'TX'], [2020]), (None, [2019, 2021])]:
+        sketch, maximum = sketches.combine(states, years)
+        rows = df
+        if states is not None:
+            rows = rows[rows['state'].isin(states)]
+        if years is not None:
+            rows = rows[rows['year'].isin(years)]
+        direct = QuantileSketch.from_values(rows['value'])
+        assert sketch.count == len(rows)
+        assert np.array_equal(sketch.quantile(QUANTILES), direct.quantile(QUANTILES))
+        assert maximum == rows['value'].max()
+
+
+def test_partition_combine_with_no_matching_partition():
+    df = _partitioned(np.random.default_rng(5), 100)
+    sketch, maximum = PartitionSketches(df, 'value').combine(['WY'], None)
+    assert sketch.count == 0
+    assert np.isnan(sketch.quantile(0.5)) and np.isnan(maximum)
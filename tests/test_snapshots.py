@@ -0,0 +1,78 @@
+import pandas as pd
+
+from snapshots import SnapshotStore, diff_frames, diff_keys
+
+
+def _hrsa(rows):
+    return pd.DataFrame(rows, columns=['state', 'designation_date', 'gap_score'])
+
+
+def test_added_removed_and_changed_rows():
+    old = _hrsa([('AL', '2020-01-01', 10), ('GA', '2020-01-01', 12), ('MS', '2020-01-01', 14)])
+    new = _hrsa([('AL', '2020-01-01', 10), ('GA', '2020-01-01', 15), ('TX', '2021-06-01', 9)])
+    diff = diff_frames(old, new, ['state', 'designation_date'])
+
+    assert diff['added']['state'].tolist() == ['TX']
+    assert diff['removed']['state'].tolist() == ['MS']
+    assert diff['changed_rows'] == 1
+    assert diff['unchanged_rows'] == 1
+    changed = diff['changed'].iloc[0]
+    assert (changed['state'], changed['field'], changed['old'], changed['new']) == ('GA', 'gap_score', 12, 15)
+
+
+def test_duplicate_keys_do_not_change_row_identity():
+    # 新版本中出现重复键时，原有的行仍匹配为未变化，只多出一行新增
+    old = _hrsa([('AL', '2020-01-01', 10), ('AL', '2020-01-01', 11), ('GA', '2020-01-01', 12)])
+    new = _hrsa([('AL', '2020-01-01', 10), ('AL', '2020-01-01', 11), ('GA', '2020-01-01', 12)])
+    diff = diff_frames(old.iloc[[0, 2]], new, ['state', 'designation_date'])
+    assert len(diff['added']) == 1 and len(diff['removed']) == 0
+    assert diff['unchanged_rows'] == 2
+
+    diff = diff_frames(old, new, ['state', 'designation_date'])
+    assert len(diff['added']) == 0 and len(diff['removed']) == 0
+    assert diff['unchanged_rows'] == 3
+
+
+def test_reordered_duplicate_keys_are_unchanged():
+    old = _hrsa([('AL', '2020-01-01', 10), ('AL', '2020-01-01', 11), ('GA', '2020-01-01', 12)])
+    new = old.iloc[[2, 1, 0]].reset_index(drop=True)
+    diff = diff_frames(old, new, ['state', 'designation_date'])
+    assert len(diff['added']) == 0 and len(diff['removed']) == 0
+    assert diff['changed_rows'] == 0
+    assert diff['unchanged_rows'] == 3
+
+
+def test_hrsa_rows_are_matched_by_hpsa_id_when_present():
+    old = pd.DataFrame({
+        'hpsa_id': ['101', '102', '103'],
+        'state': ['AL', 'AL', 'GA'],
+        'designation_date': ['2020-01-01', '2020-01-01', '2020-01-01'],
+        'gap_score': [10, 11, 12],
+    })
+    # 重新导出的文件行顺序不同，且102的分数变化
+    new = old.iloc[[2, 1, 0]].reset_index(drop=True)
+    new.loc[new['hpsa_id'] == '102', 'gap_score'] = 16
+    key_cols = diff_keys('hrsa', old, new)
+    assert key_cols == ['hpsa_id']
+
+    diff = diff_frames(old, new, key_cols)
+    assert len(diff['added']) == 0 and len(diff['removed']) == 0
+    assert diff['changed']['hpsa_id'].tolist() == ['102']
+    assert diff['unchanged_rows'] == 2
+
+
+def test_hrsa_falls_back_to_state_and_designation_date():
+    old = _hrsa([('AL', '2020-01-01', 10)])
+    new = old.assign(hpsa_id='101')
+    assert diff_keys('hrsa', old, new) == ['state', 'designation_date']
+
+
+def test_snapshot_store_evicts_oldest_snapshots_over_memory_limit():
+    frame = _hrsa([('AL', '2020-01-01', 10)] * 100)
+    store = SnapshotStore(max_bytes=1)
+    store.record('a', 'v1', 'first', frame, frame)
+    store.record('b', 'v2', 'second', frame, frame)
+    # 超过上限时只保留刚记录的快照
+    assert store.history('a') == []
+    assert [snapshot.version for snapshot in store.history('b')] == ['v2']
+    assert store.used_bytes == store.history('b')[0].nbytes
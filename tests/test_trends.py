@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from trends import build_trend_engine, compute_trends, state_year_matrix
+
+
+def _merged():
+    rng = np.random.default_rng(5)
+    rows = []
+    for state, slope in (('AL', 40.0), ('GA', -15.0), ('MS', 0.0)):
+        for year in range(2012, 2023):
+            if state == 'MS' and year in (2014, 2018):
+                continue  # 缺失年份
+            rows.append({'state': state, 'year': float(year),
+                         'total_births': 1000 + slope * (year - 2012) + rng.normal(0, 20)})
+    rows.append({'state': 'LA', 'year': 2020.0, 'total_births': 500.0})  # 只有一个数据点
+    return pd.DataFrame(rows)
+
+
+def _reference(series, horizon):
+    """逐州的参考实现：pandas滚动平均 + numpy最小二乘和预测区间"""
+    series = series.dropna()
+    years = series.index.to_numpy(dtype='float64')
+    values = series.to_numpy()
+    slope, intercept = np.polyfit(years, values, 1)
+    n = len(values)
+    residual_se = np.sqrt(((values - (intercept + slope * years)) ** 2).sum() / (n - 2))
+    future = years.max() + np.arange(1, horizon + 1)
+    t_critical = {7: 2.365, 9: 2.262}[n - 2]
+    margin = t_critical * residual_se * np.sqrt(1 + 1 / n + (future - years.mean()) ** 2 / ((years - years.mean()) ** 2).sum())
+    predicted = intercept + slope * future
+    return slope, predicted, predicted - margin, predicted + margin
+
+
+def test_vectorized_trends_match_per_state_reference():
+    merged = _merged()
+    matrix = state_year_matrix(merged, 'total_births', 'sum')
+    assert list(matrix.columns) == list(range(2012, 2023))
+    summary, history, forecast = compute_trends(matrix, window=3, horizon=2)
+    summary = summary.set_index('state')
+
+    for state in ('AL', 'GA', 'MS'):
+        series = matrix.loc[state]
+        slope, predicted, lower, upper = _reference(series, 2)
+        row = summary.loc[state]
+        assert np.isclose(row['trend_slope'], slope)
+        assert np.isclose(row['forecast_next'], predicted[0])
+        assert np.isclose(row['forecast_lower'], lower[0]) and np.isclose(row['forecast_upper'], upper[0])
+
+        rows = forecast[forecast['state'] == state]
+        assert rows['year'].tolist() == [2023.0, 2024.0]
+        assert np.allclose(rows['lower'], lower) and np.allclose(rows['upper'], upper)
+
+        # 滚动平均忽略缺失年份，同比变化与上一年比较
+        expected_rolling = series.rolling(3, min_periods=1).mean().dropna()
+        state_history = history[history['state'] == state].set_index('year')
+        assert np.allclose(state_history['rolling_avg'], expected_rolling.loc[state_history.index])
+        assert np.isclose(row['yoy_change'], (series[2022] - series[2021]) / abs(series[2021]))
+        assert np.isclose(row['cagr'], (series[2022] / series[2012]) ** (1 / 10) - 1)
+
+    # 预测区间随预测年份变宽
+    al = forecast[forecast['state'] == 'AL']
+    assert ((al['upper'] - al['lower']).diff().dropna() > 0).all()
+
+
+def test_single_point_state_has_no_forecast():
+    summary, _, forecast = compute_trends(state_year_matrix(_merged(), 'total_births', 'sum'))
+    la = summary.set_index('state').loc['LA']
+    assert la['points'] == 1 and la['latest_value'] == 500.0
+    assert np.isnan(la['forecast_next']) and np.isnan(la['trend_slope'])
+    assert 'LA' not in set(forecast['state'])
+
+
+def test_engine_skips_missing_metrics_and_invalid_years():
+    merged = _merged()
+    merged.loc[0, 'year'] = np.nan
+    results = build_trend_engine(merged)
+    assert list(results) == ['total_births']
+    assert build_trend_engine(pd.DataFrame()) == {}
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+# 趋势与预测引擎：把每个指标整理成 州×年份 矩阵，对所有州同时计算
+# 同比变化、滚动平均、CAGR和线性趋势预测（含预测区间），不按州循环。
+
+# 指标 -> 按州×年份聚合方式
+TREND_METRICS = {
+    'total_births': 'sum',
+    'prenatal_visits': 'mean',
+    'gap_score': 'mean',
+}
+
+ROLLING_WINDOW = 3
+FORECAST_HORIZON = 3
+
+# 95%双侧t分布临界值（自由度1-30），自由度更大时使用正态近似1.96
+_T_CRITICAL_95 = np.array([
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+])
+
+
+def state_year_matrix(merged, metric, how='mean'):
+    """返回 州×年份 矩阵（DataFrame，行=州，列=连续年份，缺失为NaN）"""
+    data = merged[merged['year'].notna() & (merged['year'] > 0) & (merged['year'] < 3000)]
+    matrix = data.groupby(['state', 'year'])[metric].agg(how).unstack('year')
+    if matrix.empty:
+        return matrix
+    years = np.arange(int(matrix.columns.min()), int(matrix.columns.max()) + 1)
+    return matrix.reindex(columns=years.astype(matrix.columns.dtype)).astype('float64')
+
+
+def _t_critical(dof):
+    """按自由度查t临界值（向量化）"""
+    dof = np.asarray(dof)
+    index = np.clip(dof, 1, len(_T_CRITICAL_95)) - 1
+    return np.where(dof > len(_T_CRITICAL_95), 1.96, _T_CRITICAL_95[index])
+
+
+def _first_last(values):
+    """每行第一个和最后一个非缺失值及其列位置"""
+    valid = ~np.isnan(values)
+    has_any = valid.any(axis=1)
+    first_pos = valid.argmax(axis=1)
+    last_pos = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    rows = np.arange(values.shape[0])
+    first = np.where(has_any, values[rows, first_pos], np.nan)
+    last = np.where(has_any, values[rows, last_pos], np.nan)
+    return first, last, first_pos, last_pos, has_any
+
+
+def compute_trends(matrix, window=ROLLING_WINDOW, horizon=FORECAST_HORIZON):
+    """对矩阵每一行（一个州的时间序列）同时计算趋势指标（矩阵非空，horizon >= 1）
+
+    返回:
+    (summary, history, forecast)
+    summary: 每个州一行，包含最新值、同比变化、滚动平均、CAGR和下一年预测及区间
+    history: 实际值及逐年同比变化、滚动平均（长表）
+    forecast: 每个州未来horizon年的预测值和95%预测区间（长表）
+    """
+    states = matrix.index
+    years = matrix.columns.to_numpy(dtype='float64')
+    values = matrix.to_numpy(dtype='float64')
+
+    # 同比变化：与上一年相比的百分比变化
+    with np.errstate(invalid='ignore', divide='ignore'):
+        yoy = np.full_like(values, np.nan)
+        yoy[:, 1:] = (values[:, 1:] - values[:, :-1]) / np.abs(values[:, :-1])
+
+    # 滚动平均（忽略缺失值）：用累积和计算窗口内的和与个数
+    valid = ~np.isnan(values)
+    csum = np.concatenate([np.zeros((len(values), 1)), np.cumsum(np.where(valid, values, 0.0), axis=1)], axis=1)
+    ccount = np.concatenate([np.zeros((len(values), 1)), np.cumsum(valid, axis=1)], axis=1)
+    right = np.arange(1, values.shape[1] + 1)
+    left = np.maximum(right - window, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        window_counts = ccount[:, right] - ccount[:, left]
+        rolling = np.where(window_counts > 0, (csum[:, right] - csum[:, left]) / window_counts, np.nan)
+
+    # CAGR：首尾非缺失值之间的复合年增长率
+    first, last, first_pos, last_pos, has_any = _first_last(values)
+    periods = years[last_pos] - years[first_pos]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cagr = np.where((periods > 0) & (first > 0) & (last >= 0), (last / first) ** (1.0 / np.maximum(periods, 1)) - 1, np.nan)
+
+    # 线性趋势（最小二乘）：对每一行只使用非缺失点
+    x = np.where(valid, years[None, :], 0.0)
+    y = np.where(valid, values, 0.0)
+    n = valid.sum(axis=1).astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(valid, years[None, :] - x_mean[:, None], 0.0)
+        dy = np.where(valid, values - y_mean[:, None], 0.0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * dy).sum(axis=1) / sxx, 0.0)
+        intercept = y_mean - slope * x_mean
+        residuals = np.where(valid, values - (intercept[:, None] + slope[:, None] * years[None, :]), 0.0)
+        dof = n - 2
+        resid_se = np.where(dof > 0, np.sqrt((residuals ** 2).sum(axis=1) / np.maximum(dof, 1)), np.nan)
+
+        # 预测未来horizon年及95%预测区间
+        future_years = years[-1] + np.arange(1, horizon + 1)
+        predicted = intercept[:, None] + slope[:, None] * future_years[None, :]
+        se_pred = resid_se[:, None] * np.sqrt(
+            1 + 1 / n[:, None] + (future_years[None, :] - x_mean[:, None]) ** 2 / np.where(sxx > 0, sxx, np.nan)[:, None]
+        )
+        margin = _t_critical(np.maximum(dof, 1).astype(int))[:, None] * se_pred
+
+    summary = pd.DataFrame({
+        'state': states,
+        'latest_year': np.where(has_any, years[last_pos], np.nan),
+        'latest_value': last,
+        'yoy_change': yoy[np.arange(len(values)), last_pos],
+        'rolling_avg': rolling[np.arange(len(values)), last_pos],
+        'cagr': cagr,
+        'trend_slope': np.where(n >= 2, slope, np.nan),
+        'forecast_next': predicted[:, 0],
+        'forecast_lower': (predicted - margin)[:, 0],
+        'forecast_upper': (predicted + margin)[:, 0],
+        'points': n.astype(int),
+    })
+    # 数据点少于2个时无法拟合趋势
+    summary.loc[summary['points'] < 2, ['forecast_next', 'forecast_lower', 'forecast_upper']] = np.nan
+
+    forecast = pd.DataFrame({
+        'state': np.repeat(states.to_numpy(), horizon),
+        'year': np.tile(future_years, len(states)),
+        'forecast': predicted.ravel(),
+        'lower': (predicted - margin).ravel(),
+        'upper': (predicted + margin).ravel(),
+    })
+    forecast = forecast[np.repeat(n >= 2, horizon)].reset_index(drop=True)
+
+    history = pd.DataFrame({
+        'state': np.repeat(states.to_numpy(), len(years)),
+        'year': np.tile(years, len(states)),
+        'value': values.ravel(),
+        'yoy_change': yoy.ravel(),
+        'rolling_avg': rolling.ravel(),
+    }).dropna(subset=['value']).reset_index(drop=True)
+
+    return summary, history, forecast
+
+
+def build_trend_engine(merged, metrics=None, window=ROLLING_WINDOW, horizon=FORECAST_HORIZON):
+    """为所有可用指标计算趋势，返回 {指标: (summary, history, forecast)}"""
+    results = {}
+    if merged.empty or 'year' not in merged.columns or 'state' not in merged.columns:
+        return results
+    for metric, how in (metrics or TREND_METRICS).items():
+        if metric not in merged.columns:
+            continue
+        matrix = state_year_matrix(merged, metric, how)
+        if matrix.empty:
+            continue
+        results[metric] = compute_trends(matrix, window=window, horizon=horizon)
+    return results